@@ -1,34 +1,40 @@
+from API import codec
+
+
 class Alert:
     """A class to represent an alert."""
 
-    def __init__(self):
+    __slots__ = ("sender", "receivers", "latitude", "longitude", "smoke", "temperature", "date", "recent")
+
+    def __init__(self, sender=None, receivers=None, latitude=None, longitude=None, smoke=None, temperature=None,
+                 date=None, recent=None):
         """Initializes an Alert object."""
-        self.sender = None
-        self.receivers = None
-        self.latitude = None
-        self.longitude = None
-        self.smoke = None
-        self.temperature = None
-        self.date = None
-        self.recent = None
+        self.sender = sender
+        self.receivers = receivers
+        self.latitude = latitude
+        self.longitude = longitude
+        self.smoke = smoke
+        self.temperature = temperature
+        self.date = date
+        self.recent = recent
+
+    def to_dict(self):
+        """
+        Returns the fields of the Alert object.
+
+        Returns:
+            dict: Field name -> value.
+        """
+        return {field: getattr(self, field) for field in self.__slots__}
 
     def serialize(self):
         """
-        Serializes the Alert object into a string.
+        Serializes the Alert object into JSON.
 
         Returns:
-            str: A string representation of the Alert object.
+            str: A JSON representation of the Alert object.
         """
-        return str({
-            "sender": self.sender,
-            "receivers": self.receivers,
-            "latitude": self.latitude,
-            "longitude": self.longitude,
-            "smoke": self.smoke,
-            "temperature": self.temperature,
-            "date": self.date,
-            "recent": self.recent
-        })
+        return codec.dumps(self.to_dict()).decode()
 
     def __str__(self):
         """
@@ -38,3 +44,20 @@ class Alert:
             str: A string representation of the Alert object.
         """
         return self.serialize()
+
+
+class AlertFactory:
+    """A factory class to create Alert objects."""
+
+    @staticmethod
+    def create_alert(alert_info):
+        """
+        Creates an Alert object from the provided alert_info dictionary.
+
+        Args:
+            alert_info (dict): A dictionary containing alert information.
+
+        Returns:
+            Alert: An Alert object initialized with the provided information.
+        """
+        return Alert(*(alert_info.get(field) for field in Alert.__slots__))
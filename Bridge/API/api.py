@@ -1,45 +1,93 @@
-import json
-from configparser import ConfigParser
+import threading
+import time
 
 import requests
 
+from API import codec
+from API.alerts import AlertFactory
+from API.transport import HTTPTransport
 from API.vehicle import VehicleFactory
 
 
+def iter_pages(transport, url, endpoint, page_size, cursor=None):
+    """
+    Follows the keyset pagination of a list endpoint.
+
+    Yields:
+        dict: Every object of every page.
+
+    Raises:
+        requests.HTTPError: If a page request fails.
+    """
+    while True:
+        params = {"limit": page_size}
+        if cursor is not None:
+            params["cursor"] = cursor
+        response = transport.request("GET", url, endpoint, params=params)
+        response.raise_for_status()
+        page = codec.loads(response.content)
+        yield from page["results"]
+        cursor = page["next"]
+        if cursor is None:
+            return
+
+
 class VehicleAPI:
     """A class to interact with the vehicle API."""
 
-    def __init__(self):
-        """Initializes VehicleAPI."""
-        # Reads server configuration from an ini file
-        config_object = ConfigParser()
-        config_object.read("config.ini")
-
-        # Extracts fields from the config file
-        self.FIELDS = []
-        if "VEHICLE_FIELDS" in config_object:
-            fields_section = config_object["VEHICLE_FIELDS"]
-            self.FIELDS = [fields_section[field] for field in fields_section]
-        if "SERVERCONFIG" in config_object:
-            # Builds the URI for API requests using config values
-            server = config_object["SERVERCONFIG"]
-            self.url = 'http://' + server["HOST"] + ':' + server["PORT"] + '/' + server["VEHICLES_ENDPOINT"]
+    def __init__(self, transport=None):
+        """
+        Initializes VehicleAPI.
+
+        Args:
+            transport (HTTPTransport, optional): Transport used for every request. Defaults to the
+                process-wide transport built from config.ini.
+        """
+        self.transport = transport or HTTPTransport.default()
+        # Extracts fields and endpoint from the configuration parsed by the transport
+        self.FIELDS = self.transport.fields("VEHICLE_FIELDS")
+        self.url = self.transport.url(self.transport.config.get("SERVERCONFIG", "VEHICLES_ENDPOINT",
+                                                                fallback="api/vehicles/"))
 
     def get_all_vehicles(self):
         """
         Retrieves all vehicles from the API.
 
+        The server streams the vehicles as JSON lines and they are parsed one at a time, so
+        memory does not grow with the fleet. The response is consumed while iterating.
+
         Returns:
-            Tuple: A tuple containing status_code and vehicle objects, or (status_code, None).
+            Tuple: A tuple containing status_code and an iterator of vehicle objects, or (status_code, None).
         """
-        response = requests.get(url=self.url)
+        response = self.transport.request("GET", self.url, "GET vehicles", params={"stream": 1}, stream=True)
         if response.status_code == 200:
-            vehicles_info = response.json()
-            vehicles = [VehicleFactory.create_vehicle(vehicle_info) for vehicle_info in vehicles_info]
-            return response.status_code, vehicles
+            return response.status_code, self.iter_lines(response)
         else:
+            response.close()
             return response.status_code, None
 
+    @staticmethod
+    def iter_lines(response):
+        """Yields a vehicle object for every line of a JSON-lines response, then releases the connection."""
+        with response:
+            for line in response.iter_lines():
+                if line:
+                    yield VehicleFactory.create_vehicle(codec.loads(line))
+
+    def iter_vehicles(self, page_size=100, cursor=None):
+        """
+        Iterates over all vehicles, one page request at a time.
+
+        Args:
+            page_size (int): Vehicles per request (at most 1000).
+            cursor (int, optional): Cursor returned by the server to resume after a page.
+
+        Yields:
+            Vehicle: Every vehicle, in ID order.
+        """
+        for vehicle_info in iter_pages(self.transport, self.url, "GET vehicles", page_size, cursor):
+            yield VehicleFactory.create_vehicle(vehicle_info)
+
     def get_vehicle_by_id(self, vehicle_id):
         """
         Retrieves a specific vehicle from the API by its ID.
@@ -51,9 +99,9 @@ class VehicleAPI:
             Tuple: A tuple containing status_code and JSON object of the vehicle, or (status_code, None).
         """
         specific_url = f"{self.url}{vehicle_id}/"
-        response = requests.get(url=specific_url)
+        response = self.transport.request("GET", specific_url, "GET vehicle")
         if response.status_code == 200:
-            vehicle_info = response.json()
+            vehicle_info = codec.loads(response.content)
             vehicle = VehicleFactory.create_vehicle(vehicle_info)
             return response.status_code, vehicle
         else:
@@ -70,7 +118,7 @@ class VehicleAPI:
             int: Status code.
         """
         specific_url = f"{self.url}{vehicle_id}/"
-        response = requests.delete(url=specific_url)
+        response = self.transport.request("DELETE", specific_url, "DELETE vehicle")
         return response.status_code
 
     def create_vehicle(self, data):
@@ -85,8 +133,7 @@ class VehicleAPI:
         """
         if set(data.keys()) != set(self.FIELDS):
             raise Exception("Error in data format. The dictionary must include these fields:" + str(self.FIELDS))
-        headers = {'Content-Type': 'application/json'}
-        response = requests.post(url=self.url, data=json.dumps(data), headers=headers)
+        response = self.transport.request("POST", self.url, "POST vehicles", data=codec.dumps(data))
         if response.status_code == 201:
             return response.status_code, VehicleFactory.create_vehicle(data)
         else:
@@ -106,32 +153,146 @@ class VehicleAPI:
         if set(data.keys()) != set(self.FIELDS):
             raise Exception("Error in data format. The dictionary must include these fields:" + str(self.FIELDS))
         specific_url = f"{self.url}{vehicle_id}/"
-        response = requests.put(url=specific_url, data=json.dumps(data), headers={'Content-Type': 'application/json'})
+        response = self.transport.request("PUT", specific_url, "PUT vehicle", data=codec.dumps(data))
         if response.status_code == 200:
             return response.status_code, VehicleFactory.create_vehicle(data)
         else:
             return response.status_code, None
 
+    def update_vehicles(self, vehicles):
+        """
+        Creates or updates many vehicles in one request to the batch endpoint.
+
+        Args:
+            vehicles (list): Dictionaries of data, one per vehicle, including its id.
+
+        Returns:
+            int: Status code.
+        """
+        for data in vehicles:
+            if set(data.keys()) != set(self.FIELDS):
+                raise Exception("Error in data format. The dictionary must include these fields:" + str(self.FIELDS))
+        # A batch is an upsert of whole states: sending it twice is harmless
+        response = self.transport.request("POST", f"{self.url}batch/", "POST vehicles batch",
+                                          idempotent=True, data=codec.dumps(vehicles))
+        return response.status_code
+
+
+class VehicleBatcher:
+    """
+    Batching client of VehicleAPI.update_vehicles.
+
+    Vehicle states are buffered, only the latest one per vehicle, and sent in a single request
+    when `max_items` vehicles are buffered or `max_delay` seconds after the first one was buffered,
+    whichever comes first. Batches are sent in the order they were formed.
+    """
+
+    def __init__(self, api, max_items=100, max_delay=0.05):
+        """
+        Initializes VehicleBatcher.
+
+        Args:
+            api (VehicleAPI): Client used to send the batches.
+            max_items (int): Number of buffered vehicles that triggers a flush.
+            max_delay (float): Maximum seconds a state waits in the buffer.
+        """
+        self.api = api
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self.pending = {}
+        self.deadline = None
+        self.condition = threading.Condition()
+        # Held while a batch is taken and sent, so batches cannot overtake each other
+        self.send_lock = threading.Lock()
+        self.thread = None
+        self.batches = 0
+        self.failures = 0
+
+    @classmethod
+    def from_config(cls, api, config):
+        """
+        Builds the batcher described by the [BATCHING] section.
+
+        Returns:
+            VehicleBatcher: The batcher, or None if MAX_ITEMS is 0.
+        """
+        max_items = config.getint("BATCHING", "MAX_ITEMS", fallback=0)
+        if max_items <= 0:
+            return None
+        return cls(api, max_items, config.getfloat("BATCHING", "MAX_DELAY", fallback=0.05))
+
+    def add(self, data):
+        """Buffers the state of a vehicle, replacing the one still buffered for it."""
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True, name="vehicle-batcher")
+                self.thread.start()
+            if not self.pending:
+                self.deadline = time.monotonic() + self.max_delay
+            self.pending[data["id"]] = data
+            full = len(self.pending) >= self.max_items
+            self.condition.notify()
+        if full:
+            self.flush()
+
+    def discard(self, vehicle_id):
+        """Drops the state still buffered for a vehicle, if any."""
+        with self.condition:
+            self.pending.pop(vehicle_id, None)
+
+    def flush(self):
+        """
+        Sends the buffered states now.
+
+        Returns:
+            int: Status code, or None if nothing was sent or the request failed.
+        """
+        with self.send_lock:
+            with self.condition:
+                batch, self.pending = list(self.pending.values()), {}
+            if not batch:
+                return None
+            self.batches += 1
+            try:
+                status_code = self.api.update_vehicles(batch)
+            except requests.RequestException as e:
+                self.failures += 1
+                print("Unable to send a batch of", len(batch), "vehicles:", e)
+                return None
+            if status_code != 200:
+                self.failures += 1
+                print("Batch of", len(batch), "vehicles rejected with status", status_code)
+            return status_code
+
+    def run(self):
+        """Timer thread body: flushes the buffer when its deadline expires."""
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                remaining = self.deadline - time.monotonic()
+                if remaining > 0:
+                    self.condition.wait(remaining)
+                    continue
+            self.flush()
+
 
 class AlertsAPI:
     """A class to interact with the alerts API."""
 
-    def __init__(self):
-        """Initializes AlertsAPI."""
-        # Reads server configuration from an ini file
-        config_object = ConfigParser()
-        config_object.read("config.ini")
-
-        # Extracts fields from the config file
-        self.FIELDS = []
-        if "ALERT_FIELDS" in config_object:
-            fields_section = config_object["ALERT_FIELDS"]
-            self.FIELDS = [fields_section[field] for field in fields_section]
+    def __init__(self, transport=None):
+        """
+        Initializes AlertsAPI.
 
-        if "SERVERCONFIG" in config_object:
-            # Builds the URI for API requests using config values
-            server = config_object["SERVERCONFIG"]
-            self.url = 'http://' + server["HOST"] + ':' + server["PORT"] + '/' + server["ALERTS_ENDPOINT"]
+        Args:
+            transport (HTTPTransport, optional): Transport used for every request. Defaults to the
+                process-wide transport built from config.ini.
+        """
+        self.transport = transport or HTTPTransport.default()
+        # Extracts fields and endpoint from the configuration parsed by the transport
+        self.FIELDS = self.transport.fields("ALERT_FIELDS")
+        self.url = self.transport.url(self.transport.config.get("SERVERCONFIG", "ALERTS_ENDPOINT",
+                                                                fallback="api/alerts/"))
 
     def create_alert(self, data):
         """
@@ -145,24 +306,86 @@ class AlertsAPI:
         """
         if set(data.keys()) != set(self.FIELDS):
             raise Exception("Error in data format. The dictionary must include these fields:" + str(self.FIELDS))
-        headers = {'Content-Type': 'application/json'}
-        response = requests.post(url=self.url, data=json.dumps(data), headers=headers)
+        response = self.transport.request("POST", self.url, "POST alerts", data=codec.dumps(data))
         return response.status_code
 
+    def iter_alerts(self, page_size=100, cursor=None):
+        """
+        Iterates over all alerts, one page request at a time, so memory does not grow with the history.
+
+        Args:
+            page_size (int): Alerts per request (at most 1000).
+            cursor (int, optional): Cursor returned by the server to resume after a page.
+
+        Yields:
+            Alert: Every alert, oldest first.
+        """
+        for alert_info in iter_pages(self.transport, self.url, "GET alerts", page_size, cursor):
+            yield AlertFactory.create_alert(alert_info)
+
+
+class ReportAPI:
+    """A class to interact with the report API, which handles a whole frame in one request."""
+
+    def __init__(self, transport=None):
+        """
+        Initializes ReportAPI.
+
+        Args:
+            transport (HTTPTransport, optional): Transport used for every request. Defaults to the
+                process-wide transport built from config.ini.
+        """
+        self.transport = transport or HTTPTransport.default()
+        self.FIELDS = self.transport.fields("VEHICLE_FIELDS") + ["s", "t", "u"]
+        self.url = self.transport.url(self.transport.config.get("SERVERCONFIG", "REPORT_ENDPOINT",
+                                                                fallback="api/report/"))
+
+    @classmethod
+    def from_config(cls, transport):
+        """
+        Builds the client if [SERVERCONFIG] REPORT_ENDPOINT is set.
+
+        Returns:
+            ReportAPI: The client, or None if the endpoint is disabled.
+        """
+        if not transport.config.get("SERVERCONFIG", "REPORT_ENDPOINT", fallback=""):
+            return None
+        return cls(transport)
+
+    def report(self, data):
+        """
+        Upserts the vehicle and evaluates its alert flags in a single request.
+
+        Args:
+            data (dict): Decoded frame: vehicle fields plus the s, t and u flags.
+
+        Returns:
+            Tuple: status_code, alert outcome ("none", "created", "suppressed" or "replayed")
+            and the IDs of the vehicles to warn, or (status_code, None, None).
+        """
+        if set(data.keys()) != set(self.FIELDS):
+            raise Exception("Error in data format. The dictionary must include these fields:" + str(self.FIELDS))
+        # The server recognises a repeated report, so it can be retried like a PUT
+        response = self.transport.request("POST", self.url, "POST report", idempotent=True, data=codec.dumps(data))
+        if response.status_code in (200, 201):
+            outcome = codec.loads(response.content)
+            return response.status_code, outcome["alert"], outcome["receivers"]
+        return response.status_code, None, None
+
 
 class NeighboringVehiclesAPI:
     """A class to interact with the neighboring vehicles API."""
 
-    def __init__(self):
-        """Initializes NeighboringVehiclesAPI."""
-        # Reads server configuration from an ini file
-        config_object = ConfigParser()
-        config_object.read("config.ini")
+    def __init__(self, transport=None):
+        """
+        Initializes NeighboringVehiclesAPI.
 
-        if "SERVERCONFIG" in config_object:
-            # Builds the URI for API requests using config values
-            server = config_object["SERVERCONFIG"]
-            self.url = 'http://' + server["HOST"] + ':' + server["PORT"] + '/api/neighboring-vehicles/'
+        Args:
+            transport (HTTPTransport, optional): Transport used for every request. Defaults to the
+                process-wide transport built from config.ini.
+        """
+        self.transport = transport or HTTPTransport.default()
+        self.url = self.transport.url('api/neighboring-vehicles/')
 
     def get_neighboring_vehicles(self, vehicle_id):
         """
@@ -175,9 +398,9 @@ class NeighboringVehiclesAPI:
             Tuple: A tuple containing status_code and neighboring vehicle IDs, or (status_code, None).
         """
         specific_url = f"{self.url}{vehicle_id}/"
-        response = requests.get(url=specific_url)
+        response = self.transport.request("GET", specific_url, "GET neighboring-vehicles")
         if response.status_code == 200:
-            neighboring_vehicles = response.json()
+            neighboring_vehicles = codec.loads(response.content)
             return response.status_code, neighboring_vehicles.get("neighboring_vehicle_ids", [])
         else:
             return response.status_code, None
@@ -0,0 +1,166 @@
+from API import codec
+from API.api import VehicleAPI, AlertsAPI, NeighboringVehiclesAPI, ReportAPI
+from API.vehicle import VehicleFactory
+
+
+class AsyncVehicleAPI(VehicleAPI):
+    """Non-blocking counterpart of VehicleAPI, built on a shared aiohttp session."""
+
+    def __init__(self, session=None, transport=None):
+        """
+        Initializes AsyncVehicleAPI.
+
+        Args:
+            session (aiohttp.ClientSession, optional): Session used for every request. It can be
+                assigned later, since an aiohttp session must be created inside the running event loop.
+            transport (HTTPTransport, optional): Source of the parsed configuration (URL and fields).
+        """
+        super().__init__(transport)
+        self.session = session
+
+    async def get_vehicle_by_id(self, vehicle_id):
+        """
+        Retrieves a specific vehicle from the API by its ID.
+
+        Args:
+            vehicle_id (str): Vehicle's ID.
+
+        Returns:
+            Tuple: A tuple containing status_code and the vehicle, or (status_code, None).
+        """
+        async with self.session.get(f"{self.url}{vehicle_id}/") as response:
+            if response.status == 200:
+                return response.status, VehicleFactory.create_vehicle(await response.json(loads=codec.loads))
+            return response.status, None
+
+    async def create_vehicle(self, data):
+        """
+        Creates a new vehicle in the API.
+
+        Args:
+            data (dict): Dictionary of data.
+
+        Returns:
+            Tuple: A tuple containing status_code and vehicle.
+        """
+        if set(data.keys()) != set(self.FIELDS):
+            raise Exception("Error in data format. The dictionary must include these fields:" + str(self.FIELDS))
+        async with self.session.post(self.url, json=data) as response:
+            if response.status == 201:
+                return response.status, VehicleFactory.create_vehicle(data)
+            return response.status, None
+
+    async def update_vehicle(self, vehicle_id, data):
+        """
+        Updates a specific vehicle in the API by its ID.
+
+        Args:
+            vehicle_id (str): Vehicle's ID.
+            data (dict): Dictionary of data to update.
+
+        Returns:
+            Tuple: A tuple containing status_code and vehicle.
+        """
+        if set(data.keys()) != set(self.FIELDS):
+            raise Exception("Error in data format. The dictionary must include these fields:" + str(self.FIELDS))
+        async with self.session.put(f"{self.url}{vehicle_id}/", json=data) as response:
+            if response.status == 200:
+                return response.status, VehicleFactory.create_vehicle(data)
+            return response.status, None
+
+
+class AsyncAlertsAPI(AlertsAPI):
+    """Non-blocking counterpart of AlertsAPI, built on a shared aiohttp session."""
+
+    def __init__(self, session=None, transport=None):
+        """
+        Initializes AsyncAlertsAPI.
+
+        Args:
+            session (aiohttp.ClientSession, optional): Session used for every request. It can be
+                assigned later, since an aiohttp session must be created inside the running event loop.
+            transport (HTTPTransport, optional): Source of the parsed configuration (URL and fields).
+        """
+        super().__init__(transport)
+        self.session = session
+
+    async def create_alert(self, data):
+        """
+        Creates a new alert in the API.
+
+        Args:
+            data (dict): Dictionary of data.
+
+        Returns:
+            int: Status code.
+        """
+        if set(data.keys()) != set(self.FIELDS):
+            raise Exception("Error in data format. The dictionary must include these fields:" + str(self.FIELDS))
+        async with self.session.post(self.url, json=data) as response:
+            return response.status
+
+
+class AsyncReportAPI(ReportAPI):
+    """Non-blocking counterpart of ReportAPI, built on a shared aiohttp session."""
+
+    def __init__(self, session=None, transport=None):
+        """
+        Initializes AsyncReportAPI.
+
+        Args:
+            session (aiohttp.ClientSession, optional): Session used for every request. It can be
+                assigned later, since an aiohttp session must be created inside the running event loop.
+            transport (HTTPTransport, optional): Source of the parsed configuration (URL and fields).
+        """
+        super().__init__(transport)
+        self.session = session
+
+    async def report(self, data):
+        """
+        Upserts the vehicle and evaluates its alert flags in a single request.
+
+        Args:
+            data (dict): Decoded frame: vehicle fields plus the s, t and u flags.
+
+        Returns:
+            Tuple: status_code, alert outcome and the IDs of the vehicles to warn, or (status_code, None, None).
+        """
+        if set(data.keys()) != set(self.FIELDS):
+            raise Exception("Error in data format. The dictionary must include these fields:" + str(self.FIELDS))
+        async with self.session.post(self.url, json=data) as response:
+            if response.status in (200, 201):
+                outcome = await response.json(loads=codec.loads)
+                return response.status, outcome["alert"], outcome["receivers"]
+            return response.status, None, None
+
+
+class AsyncNeighboringVehiclesAPI(NeighboringVehiclesAPI):
+    """Non-blocking counterpart of NeighboringVehiclesAPI, built on a shared aiohttp session."""
+
+    def __init__(self, session=None, transport=None):
+        """
+        Initializes AsyncNeighboringVehiclesAPI.
+
+        Args:
+            session (aiohttp.ClientSession, optional): Session used for every request. It can be
+                assigned later, since an aiohttp session must be created inside the running event loop.
+            transport (HTTPTransport, optional): Source of the parsed configuration (URL and fields).
+        """
+        super().__init__(transport)
+        self.session = session
+
+    async def get_neighboring_vehicles(self, vehicle_id):
+        """
+        Retrieves neighboring vehicles from the API given a vehicle ID.
+
+        Args:
+            vehicle_id (str): ID of the vehicle.
+
+        Returns:
+            Tuple: A tuple containing status_code and neighboring vehicle IDs, or (status_code, None).
+        """
+        async with self.session.get(f"{self.url}{vehicle_id}/") as response:
+            if response.status == 200:
+                neighboring_vehicles = await response.json(loads=codec.loads)
+                return response.status, neighboring_vehicles.get("neighboring_vehicle_ids", [])
+            return response.status, None
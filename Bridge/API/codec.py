@@ -0,0 +1,52 @@
+# codec.py
+"""
+JSON encoding and decoding shared by the serial frames, the REST bodies, the outbox and MQTT.
+
+orjson is used when installed, then msgspec, then the standard library. Whatever the backend,
+`dumps` returns compact UTF-8 bytes and `loads` accepts bytes or str.
+"""
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if orjson is not None:
+    BACKEND = "orjson"
+    DecodeError = orjson.JSONDecodeError
+
+    def dumps(obj):
+        """Encodes an object into JSON bytes."""
+        return orjson.dumps(obj)
+
+    loads = orjson.loads
+
+elif msgspec is not None:
+    BACKEND = "msgspec"
+    DecodeError = (msgspec.DecodeError, UnicodeDecodeError)
+    _encoder = msgspec.json.Encoder()
+    _decoder = msgspec.json.Decoder()
+
+    def dumps(obj):
+        """Encodes an object into JSON bytes."""
+        return _encoder.encode(obj)
+
+    loads = _decoder.decode
+
+else:
+    import json
+
+    BACKEND = "json"
+    DecodeError = (json.JSONDecodeError, UnicodeDecodeError)
+    _encoder = json.JSONEncoder(separators=(',', ':'))
+
+    def dumps(obj):
+        """Encodes an object into JSON bytes."""
+        return _encoder.encode(obj).encode()
+
+    loads = json.loads
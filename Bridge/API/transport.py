@@ -0,0 +1,167 @@
+import random
+import threading
+import time
+from configparser import ConfigParser
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+# Methods that can be sent again after a read timeout or a gateway error without side effects
+IDEMPOTENT_METHODS = {"GET", "PUT", "DELETE", "HEAD", "OPTIONS"}
+RETRY_STATUS_CODES = {502, 503, 504}
+
+
+def never_sent(error):
+    """
+    Tells whether a failed request certainly never reached the server.
+
+    Only a connect timeout or a refused/unreachable connection qualify: a connection aborted or
+    reset later may have been dropped after the server read the request.
+    """
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class EndpointStats:
+    """Latency and error counters of a single endpoint."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "mean_latency": self.total_latency / self.requests if self.requests else 0.0,
+            "max_latency": self.max_latency,
+        }
+
+
+class HTTPTransport:
+    """
+    HTTP transport shared by all the API clients of a process.
+
+    It keeps a pool of keep-alive connections to the server, applies the configured timeouts,
+    retries failed requests with jittered exponential backoff, and counts requests, errors and
+    latency per endpoint. It also holds the parsed configuration, so config.ini is read once.
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, config):
+        """
+        Initializes the transport.
+
+        Args:
+            config (ConfigParser): Parsed configuration, [SERVERCONFIG] in particular.
+        """
+        self.config = config
+        server = config["SERVERCONFIG"] if "SERVERCONFIG" in config else {}
+        self.base_url = 'http://' + server.get("HOST", "127.0.0.1") + ':' + server.get("PORT", "8080") + '/'
+        self.timeout = (config.getfloat("SERVERCONFIG", "CONNECT_TIMEOUT", fallback=3.05),
+                        config.getfloat("SERVERCONFIG", "TIMEOUT", fallback=10))
+        self.retries = config.getint("SERVERCONFIG", "RETRIES", fallback=2)
+        self.backoff = config.getfloat("SERVERCONFIG", "BACKOFF", fallback=0.2)
+        pool_size = config.getint("SERVERCONFIG", "POOL_SIZE", fallback=10)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    @classmethod
+    def default(cls):
+        """Returns the process-wide transport, built from config.ini on first use."""
+        with cls._default_lock:
+            if cls._default is None:
+                config = ConfigParser()
+                config.read("config.ini")
+                cls._default = cls(config)
+            return cls._default
+
+    def fields(self, section):
+        """Returns the list of field names declared in a *_FIELDS section of the configuration."""
+        if section not in self.config:
+            return []
+        fields_section = self.config[section]
+        return [fields_section[field] for field in fields_section]
+
+    def url(self, path):
+        """Builds the absolute URL of a server path."""
+        return self.base_url + path
+
+    def record(self, endpoint, latency=None, error=False, retry=False):
+        with self.lock:
+            stats = self.stats.setdefault(endpoint, EndpointStats())
+            if retry:
+                stats.retries += 1
+                return
+            stats.requests += 1
+            if error:
+                stats.errors += 1
+            if latency is not None:
+                stats.total_latency += latency
+                stats.max_latency = max(stats.max_latency, latency)
+
+    def request(self, method, url, endpoint, idempotent=None, **kwargs):
+        """
+        Sends a request through the connection pool.
+
+        Idempotent requests are retried on any connection failure, read timeout or gateway error.
+        The others only when the connection could not be opened at all (see `never_sent`), so an
+        alert is never created twice.
+
+        Args:
+            method (str): HTTP method.
+            url (str): Absolute URL.
+            endpoint (str): Label under which the request is counted, e.g. "PUT vehicles".
+            idempotent (bool, optional): Whether the request can safely be sent twice. Defaults to
+                True for GET, PUT, DELETE, HEAD and OPTIONS.
+
+        Returns:
+            requests.Response: The response of the last attempt.
+
+        Raises:
+            requests.RequestException: If the last attempt failed without a response.
+        """
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last or not (idempotent or never_sent(e)):
+                    self.record(endpoint, time.perf_counter() - start, error=True)
+                    raise
+            else:
+                if last or not (idempotent and response.status_code in RETRY_STATUS_CODES):
+                    self.record(endpoint, time.perf_counter() - start, error=response.status_code >= 500)
+                    return response
+            self.record(endpoint, retry=True)
+            # Full jitter: a random delay up to an exponentially growing bound
+            time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def get_stats(self):
+        """
+        Returns the counters of every endpoint.
+
+        Returns:
+            dict: endpoint -> dict of requests, errors, retries, mean_latency and max_latency (seconds).
+        """
+        with self.lock:
+            return {endpoint: stats.as_dict() for endpoint, stats in self.stats.items()}
@@ -1,28 +1,37 @@
+from API import codec
+
+
 class Vehicle:
     """A class to represent a vehicle."""
 
-    def __init__(self):
+    __slots__ = ("id", "latitude", "longitude", "smoke", "temperature", "humidity")
+
+    def __init__(self, id=None, latitude=None, longitude=None, smoke=None, temperature=None, humidity=None):
         """Initializes a Vehicle object."""
-        self.id = None
-        self.latitude = None
-        self.longitude = None
-        self.smoke = None
-        self.temperature = None
+        self.id = id
+        self.latitude = latitude
+        self.longitude = longitude
+        self.smoke = smoke
+        self.temperature = temperature
+        self.humidity = humidity
+
+    def to_dict(self):
+        """
+        Returns the fields of the Vehicle object.
+
+        Returns:
+            dict: Field name -> value.
+        """
+        return {field: getattr(self, field) for field in self.__slots__}
 
     def serialize(self):
         """
-        Serializes the Vehicle object into a string.
+        Serializes the Vehicle object into JSON.
 
         Returns:
-            str: A string representation of the Vehicle object.
+            str: A JSON representation of the Vehicle object.
         """
-        return str({
-            "id": self.id,
-            "latitude": self.latitude,
-            "longitude": self.longitude,
-            "smoke": self.smoke,
-            "temperature": self.temperature
-        })
+        return codec.dumps(self.to_dict()).decode()
 
     def __str__(self):
         """
@@ -48,10 +57,5 @@ class VehicleFactory:
         Returns:
             Vehicle: A Vehicle object initialized with the provided information.
         """
-        vehicle = Vehicle()
-        vehicle.id = vehicle_info.get("id")
-        vehicle.latitude = vehicle_info.get("latitude")
-        vehicle.longitude = vehicle_info.get("longitude")
-        vehicle.smoke = vehicle_info.get("smoke")
-        vehicle.temperature = vehicle_info.get("temperature")
-        return vehicle
+        return Vehicle(vehicle_info.get("id"), vehicle_info.get("latitude"), vehicle_info.get("longitude"),
+                       vehicle_info.get("smoke"), vehicle_info.get("temperature"), vehicle_info.get("humidity"))
@@ -4,11 +4,34 @@ from configparser import ConfigParser
 
 import paho.mqtt.client as mqtt
 
+from API import codec
+
+
+def alert_topic(prefix, vehicle_id):
+    """Returns the topic on which the alerts for a vehicle are published, e.g. alerts/7."""
+    return f"{prefix}/{vehicle_id}"
+
+
+def vehicle_from_topic(topic):
+    """
+    Returns the vehicle ID of an alert topic.
+
+    Returns:
+        int: The vehicle ID, or None if the topic does not end with one.
+    """
+    try:
+        return int(topic.rsplit('/', 1)[-1])
+    except ValueError:
+        return None
+
 
 class MQTTClient:
     def __init__(self, bridge=None):
         """
         Initializes the MQTT client.
+
+        Alerts are published on one topic per receiving vehicle, `<Topic>/<vehicle ID>`, and
+        the client only subscribes to the topics of the vehicles attached to its bridge.
         """
         self.config = ConfigParser()
         self.config.read('config.ini')
@@ -19,27 +42,43 @@ class MQTTClient:
         self.server_address = self.config.get("MQTT", "Server", fallback="localhost")
         self.server_port = self.config.getint("MQTT", "Port", fallback=1883)
         self.clientMQTT.connect(self.server_address, self.server_port, 60)
-        self.topic = self.config.get("MQTT", "Topicc", fallback="alerts")
+        self.topic = self.config.get("MQTT", "Topic", fallback="alerts")
+        vehicle_ids = bridge.local_vehicles() if bridge is not None else []
+        self.topics = [alert_topic(self.topic, vehicle_id) for vehicle_id in vehicle_ids]
         self.clientMQTT.loop_start()
 
     def on_connect(self, client, userdata, flags, rc, *args, **kwargs):
         """
         Callback function for when the client connects to the MQTT broker.
         """
-        self.clientMQTT.subscribe(self.topic)
-        print("Subscribed to " + self.topic)
+        self.subscribe()
+        print("Subscribed to " + ", ".join(self.topics))
 
     def on_message(self, client, userdata, message):
         """
         Callback function for when a message is received.
         """
-        self.bridge.handle_alert(message.payload)
+        vehicle_id = vehicle_from_topic(message.topic)
+        if vehicle_id is not None:
+            self.bridge.handle_alert(vehicle_id, message.payload)
 
-    def publish(self, payload):
+    def publish(self, payload, topic=None):
+        """
+        Publishes a message to the MQTT broker, on the base topic unless another one is given.
         """
-        Publishes a message to the MQTT broker.
+        self.clientMQTT.publish(topic or self.topic, payload)
+
+    def publish_alert(self, receivers, alert):
+        """
+        Publishes an alert once on the topic of every receiving vehicle.
+
+        Args:
+            receivers (list): IDs of the vehicles to alarm.
+            alert (dict): Alert metadata (sender, position, readings and flags), sent as JSON.
         """
-        self.clientMQTT.publish(self.topic, payload)
+        payload = codec.dumps(alert)
+        for vehicle_id in receivers:
+            self.clientMQTT.publish(alert_topic(self.topic, vehicle_id), payload)
 
     def disconnect(self):
         """
@@ -49,6 +88,7 @@ class MQTTClient:
 
     def subscribe(self):
         """
-        Subscribes the MQTT client to the specified topic.
+        Subscribes the MQTT client to the alert topics of the local vehicles.
         """
-        self.clientMQTT.subscribe(self.topic)
+        if self.topics:
+            self.clientMQTT.subscribe([(topic, 0) for topic in self.topics])
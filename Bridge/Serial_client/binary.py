@@ -0,0 +1,101 @@
+# binary.py
+"""
+Compact, versioned binary frame format.
+
+A binary frame replaces the `$ {json} !` text frame on slow serial links. All fields are
+little endian:
+
+    offset 0     SYNC_BYTE (0xA5), never present in the ASCII JSON frames
+    offset 1     format version
+    offset 2     frame type
+    offset 3     payload, with the fixed layout registered in FORMATS for (version, type)
+    last byte    checksum: sum of every byte from the version to the end of the payload, mod 256
+
+Version 1 telemetry payload (23 bytes, 27 with header and checksum, against ~130 for JSON):
+
+    uint16 id, float32 latitude, float32 longitude, float32 smoke, float32 temperature,
+    float32 humidity, uint8 flags (bit 0 = s, bit 1 = t, bit 2 = u)
+"""
+
+import struct
+
+SYNC_BYTE = 0xA5
+HEADER_SIZE = 3
+TELEMETRY = 0x01
+
+FORMATS = {
+    (1, TELEMETRY): struct.Struct('<HfffffB'),
+}
+FIELDS = ("id", "latitude", "longitude", "smoke", "temperature", "humidity")
+FLAGS = (("s", 0x01), ("t", 0x02), ("u", 0x04))
+
+
+def frame_length(buffer, start):
+    """
+    Returns the total length of the binary frame starting at `start`.
+
+    Args:
+        buffer (bytearray): Receive buffer.
+        start (int): Offset of the sync byte.
+
+    Returns:
+        int: The frame length, None if the header is not complete yet, or 0 if the
+            version/type pair is unknown.
+    """
+    if len(buffer) - start < HEADER_SIZE:
+        return None
+    layout = FORMATS.get((buffer[start + 1], buffer[start + 2]))
+    return HEADER_SIZE + layout.size + 1 if layout else 0
+
+
+def checksum(data):
+    """Checksum of the version, type and payload bytes."""
+    return sum(data) & 0xFF
+
+
+def is_valid(frame):
+    """Returns True if the trailing checksum of a complete frame matches its content."""
+    return checksum(frame[1:-1]) == frame[-1]
+
+
+def decode_frame(frame):
+    """
+    Decodes a complete binary frame, straight from its bytes.
+
+    Args:
+        frame (bytes): The frame, sync byte and checksum included.
+
+    Returns:
+        dict: The decoded frame, with the same keys as the JSON one.
+
+    Raises:
+        ValueError: If the version/type pair is unknown.
+    """
+    layout = FORMATS.get((frame[1], frame[2]))
+    if layout is None:
+        raise ValueError(f"Unknown binary frame version {frame[1]} type {frame[2]}")
+    values = layout.unpack_from(frame, HEADER_SIZE)
+    data = dict(zip(FIELDS, values))
+    flags = values[-1]
+    for name, mask in FLAGS:
+        data[name] = 1 if flags & mask else 0
+    return data
+
+
+def encode_frame(data, version=1, frame_type=TELEMETRY):
+    """
+    Reference encoder, used to build fixtures and by simulators of the MCU.
+
+    Args:
+        data (dict): A frame with the same keys as the JSON one.
+
+    Returns:
+        bytes: The complete binary frame.
+    """
+    flags = 0
+    for name, mask in FLAGS:
+        if data.get(name):
+            flags |= mask
+    body = bytes((version, frame_type)) + FORMATS[(version, frame_type)].pack(
+        *(data.get(field, 0) for field in FIELDS), flags)
+    return bytes((SYNC_BYTE,)) + body + bytes((checksum(body),))
@@ -0,0 +1,125 @@
+# capture.py
+"""
+Recording and replay of the raw serial byte stream.
+
+A capture file starts with MAGIC and holds one record per chunk read from the port:
+a little endian float64 timestamp (seconds since the start of the capture), a uint32
+length and the bytes themselves.
+"""
+
+import struct
+import time
+
+import serial
+
+MAGIC = b'AGCAP1\n'
+RECORD_HEADER = struct.Struct('<dI')
+
+
+class CaptureWriter:
+    """Appends timestamped chunks to a capture file."""
+
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.start = time.monotonic()
+
+    def write(self, chunk):
+        self.file.write(RECORD_HEADER.pack(time.monotonic() - self.start, len(chunk)))
+        self.file.write(chunk)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_capture(path):
+    """
+    Reads a capture file.
+
+    Yields:
+        tuple: (timestamp, chunk) for every recorded read.
+    """
+    with open(path, 'rb') as capture:
+        if capture.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a serial capture file")
+        while True:
+            header = capture.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            timestamp, length = RECORD_HEADER.unpack(header)
+            yield timestamp, capture.read(length)
+
+
+class RecordingSerial:
+    """Wraps a serial.Serial and records every chunk read from it."""
+
+    def __init__(self, ser, writer):
+        self.ser = ser
+        self.writer = writer
+
+    def read(self, size=1):
+        chunk = self.ser.read(size)
+        if chunk:
+            self.writer.write(chunk)
+        return chunk
+
+    def __getattr__(self, name):
+        # in_waiting, write, fileno, close... go straight to the real port
+        return getattr(self.ser, name)
+
+
+class ReplaySerial:
+    """
+    In-memory serial port that plays a capture back.
+
+    With speed 1 the chunks become readable with their original timing, with speed N the
+    gaps are N times shorter, and with speed 0 everything is available immediately.
+    Bytes written to the port (alarms) are kept in `written`. Once the capture is over,
+    reads raise serial.SerialException, as a disconnected port would.
+    """
+
+    def __init__(self, path, speed=1.0):
+        self.records = list(read_capture(path))
+        self.speed = speed
+        self.index = 0
+        self.pending = b''
+        self.written = bytearray()
+        self.start = None
+
+    def due(self, timestamp):
+        """Seconds to wait before the chunk recorded at `timestamp` is readable."""
+        if not self.speed:
+            return 0
+        if self.start is None:
+            self.start = time.monotonic() - timestamp / self.speed
+        return self.start + timestamp / self.speed - time.monotonic()
+
+    def release(self, wait):
+        """Moves the due records to the pending bytes, waiting at most `wait` seconds for the next one."""
+        if not self.pending and self.index < len(self.records):
+            delay = self.due(self.records[self.index][0])
+            if delay > 0 and wait > 0:
+                time.sleep(min(delay, wait))
+        while self.index < len(self.records) and self.due(self.records[self.index][0]) <= 0:
+            self.pending += self.records[self.index][1]
+            self.index += 1
+
+    @property
+    def in_waiting(self):
+        self.release(0)
+        return len(self.pending)
+
+    def read(self, size=1):
+        self.release(1.0)
+        if not self.pending and self.index >= len(self.records):
+            raise serial.SerialException("end of capture")
+        chunk, self.pending = self.pending[:size], self.pending[size:]
+        return chunk
+
+    def write(self, data):
+        self.written += data
+        return len(data)
+
+    def close(self):
+        pass
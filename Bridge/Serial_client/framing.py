@@ -0,0 +1,88 @@
+# framing.py
+
+import re
+
+from Serial_client import binary
+
+START_BYTE = b'$'
+END_BYTE = b'!'
+SYNC_BYTE = bytes((binary.SYNC_BYTE,))
+# First byte of either a JSON text frame or a binary frame
+FRAME_START = re.compile(b'[' + re.escape(START_BYTE) + re.escape(SYNC_BYTE) + b']')
+
+
+class FrameDecoder:
+    """
+    Incremental decoder for the `$ ... !` framed serial protocol.
+
+    Bytes are accumulated in a single reusable bytearray; every call to `feed`
+    scans the buffer once and returns all the complete frames found so far.
+    Binary frames (see Serial_client.binary) can be interleaved with text frames:
+    they are returned whole, starting with their sync byte. A sync byte starts a binary
+    frame only between frames; inside a text frame it is part of the payload.
+    """
+
+    def __init__(self, max_frame_size=4096):
+        """
+        Initializes the decoder.
+
+        Args:
+            max_frame_size (int): Maximum number of bytes buffered for a single frame.
+                A frame growing past this size is considered garbage and dropped.
+        """
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray()
+        self.dropped = 0
+
+    def feed(self, chunk):
+        """
+        Appends a chunk of raw serial bytes and extracts the complete frames.
+
+        Args:
+            chunk (bytes): Bytes read from the serial port.
+
+        Returns:
+            list: The payloads (bytes, without the `$`/`!` delimiters) of every complete text frame,
+                and every complete binary frame, in order of arrival.
+        """
+        buffer = self.buffer
+        buffer += chunk
+        frames = []
+        position = 0
+        while True:
+            match = FRAME_START.search(buffer, position)
+            if match is None:
+                # No frame in progress: nothing before the next frame start is worth keeping
+                position = len(buffer)
+                break
+            start = match.start()
+            if buffer[start] == binary.SYNC_BYTE:
+                length = binary.frame_length(buffer, start)
+                if length is None or start + length > len(buffer):
+                    position = start
+                    break
+                frame = bytes(buffer[start:start + length])
+                if length and binary.is_valid(frame):
+                    frames.append(frame)
+                    position = start + length
+                else:
+                    # Not a real frame start: resynchronize on the next byte
+                    position = start + 1
+                continue
+            end = buffer.find(END_BYTE, start + 1)
+            if end < 0:
+                position = start
+                break
+            # A '$' inside the frame restarts it, as the original byte-by-byte loop did
+            start = buffer.rfind(START_BYTE, start, end)
+            frames.append(bytes(buffer[start + 1:end]))
+            position = end + 1
+        del buffer[:position]
+        if len(buffer) > self.max_frame_size:
+            buffer.clear()
+            self.dropped += 1
+        return frames
+
+    def reset(self):
+        """Discards any partially received frame."""
+        self.buffer.clear()
@@ -0,0 +1,70 @@
+import json
+import unittest
+
+from Serial_client import binary
+from Serial_client.framing import FrameDecoder
+
+FRAME = {"id": 7, "latitude": 44.5, "longitude": 10.25, "smoke": 120.0, "temperature": 25.5, "humidity": 40.0,
+         "s": 0, "t": 1, "u": 0}
+
+
+def text_frame(payload):
+    return b'$' + payload + b'\r\n!'
+
+
+class FrameDecoderTest(unittest.TestCase):
+    def setUp(self):
+        self.decoder = FrameDecoder()
+        self.payload = json.dumps(FRAME).encode()
+        self.binary = binary.encode_frame(FRAME)
+
+    def feed_bytewise(self, data):
+        frames = []
+        for i in range(len(data)):
+            frames += self.decoder.feed(data[i:i + 1])
+        return frames
+
+    def test_text_frame(self):
+        self.assertEqual(self.decoder.feed(text_frame(self.payload)), [self.payload + b'\r\n'])
+
+    def test_frames_split_across_chunks(self):
+        data = text_frame(self.payload) + self.binary + text_frame(b'{}')
+        self.assertEqual(self.feed_bytewise(data), [self.payload + b'\r\n', self.binary, b'{}\r\n'])
+        self.assertEqual(len(self.decoder.buffer), 0)
+
+    def test_several_frames_in_one_chunk(self):
+        frames = self.decoder.feed(text_frame(b'1') + text_frame(b'2') + self.binary + self.binary)
+        self.assertEqual(frames, [b'1\r\n', b'2\r\n', self.binary, self.binary])
+
+    def test_garbage_between_frames_is_skipped(self):
+        data = b'boot\r\n' + text_frame(b'1') + b'\x00\xff noise' + self.binary + b'!!' + text_frame(b'2')
+        self.assertEqual(self.decoder.feed(data), [b'1\r\n', self.binary, b'2\r\n'])
+
+    def test_dollar_restarts_a_text_frame(self):
+        self.assertEqual(self.decoder.feed(b'$trunc' + text_frame(b'2')), [b'2\r\n'])
+
+    def test_sync_byte_inside_a_text_frame_is_payload(self):
+        payload = b'{"name": "\xa5\x01\x01"}'
+        self.assertEqual(self.feed_bytewise(text_frame(payload) + self.binary), [payload + b'\r\n', self.binary])
+
+    def test_binary_frame_with_bad_checksum_is_dropped(self):
+        corrupted = self.binary[:-1] + bytes(((self.binary[-1] + 1) % 256,))
+        self.assertEqual(self.decoder.feed(corrupted + text_frame(b'1')), [b'1\r\n'])
+
+    def test_unknown_binary_format_is_skipped(self):
+        self.assertEqual(self.decoder.feed(b'\xa5\x09\x09' + self.binary), [self.binary])
+
+    def test_binary_frame_decodes(self):
+        data = binary.decode_frame(self.decoder.feed(self.binary)[0])
+        self.assertEqual((data["id"], data["t"], data["s"]), (7, 1, 0))
+        self.assertAlmostEqual(data["latitude"], 44.5)
+
+    def test_oversized_frame_is_dropped(self):
+        decoder = FrameDecoder(max_frame_size=64)
+        self.assertEqual(decoder.feed(b'$' + b'x' * 100), [])
+        self.assertEqual(decoder.dropped, 1)
+        self.assertEqual(decoder.feed(text_frame(b'1')), [b'1\r\n'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+# async_bridge.py
+
+import asyncio
+
+import aiohttp
+import serial
+import serial_asyncio
+
+from API import codec
+from API.async_api import AsyncVehicleAPI, AsyncAlertsAPI, AsyncNeighboringVehiclesAPI, AsyncReportAPI
+from bridge import Bridge
+from pipeline import is_alert
+
+
+class AsyncBridge(Bridge):
+    """
+    Asyncio runtime of the Bridge.
+
+    Serial reads, REST calls and alarm writes share one event loop. Every decoded frame is
+    queued on a lane owned by its vehicle, so the serial reader never waits for the server
+    while the requests of a single vehicle keep their order.
+    MQTT stays on paho's network thread: publishing only enqueues the message, and alerts
+    received from the broker are handed back to the event loop.
+    """
+
+    def __init__(self):
+        self.event_loop = None
+        self.writer = None
+        # vehicle ID -> (queue of frames, task draining it)
+        self.lanes = {}
+        super().__init__()
+        self.vehicle_api = AsyncVehicleAPI(transport=self.transport)
+        self.alert_api = AsyncAlertsAPI(transport=self.transport)
+        self.neighbors_api = AsyncNeighboringVehiclesAPI(transport=self.transport)
+        if self.report_api:
+            self.report_api = AsyncReportAPI(transport=self.transport)
+
+    def setup_workers(self):
+        """Vehicle lanes already decouple ingestion from the server: no pipeline, outbox or batcher."""
+        self.batcher = None
+        self.pipeline = None
+        self.outbox = None
+
+    def setup_serial(self):
+        """Reads the port name; the port itself is opened by run(), on the event loop."""
+        self.portname = self.config.get("SERIAL", "PORTNAME", fallback="COM1")
+
+    def loop(self):
+        """Runs the Bridge until the serial port is closed."""
+        asyncio.run(self.run())
+
+    async def run(self):
+        """Main coroutine: opens the REST session and the serial port, then reads frames forever."""
+        self.event_loop = asyncio.get_running_loop()
+        timeout = aiohttp.ClientTimeout(total=self.config.getfloat("SERVERCONFIG", "TIMEOUT", fallback=10))
+        json_serialize = lambda obj: codec.dumps(obj).decode()
+        async with aiohttp.ClientSession(timeout=timeout, json_serialize=json_serialize) as session:
+            for api in (self.vehicle_api, self.alert_api, self.neighbors_api, self.report_api):
+                if api:
+                    api.session = session
+            try:
+                print("\nConnecting to " + self.portname + '\n')
+                reader, self.writer = await serial_asyncio.open_serial_connection(url=self.portname, baudrate=9600)
+            except serial.SerialException:
+                print(f'\033[91mSetup failed: Unable to connect to {self.portname}. \nPlease check the port and '
+                      f'update the "PORTNAME" in the config.ini file if necessary.\n\033[0m')
+                self.print_available_ports()
+                return
+            while True:
+                chunk = await reader.read(4096)
+                if not chunk:
+                    break
+                for frame in self.decoder.feed(chunk):
+                    self.use_data(frame)
+
+    def use_data(self, data):
+        """Decodes a frame and queues it on the lane of its vehicle."""
+        data = self.decode(data)
+        if data is None or (self.coalescer and not self.coalescer.should_send(data)):
+            return
+        if self.telemetry_topic and not is_alert(data):
+            # Publishing only queues the message on paho's thread
+            self.publish_telemetry(data)
+            return
+        if data["id"] not in self.lanes:
+            lane = asyncio.Queue()
+            self.lanes[data["id"]] = (lane, self.event_loop.create_task(self.drain_lane(lane)))
+        self.lanes[data["id"]][0].put_nowait(data)
+
+    async def drain_lane(self, lane):
+        """Processes the frames of a single vehicle, one at a time."""
+        while True:
+            data = await lane.get()
+            try:
+                await self.process(data)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print("Error while contacting the server:", e)
+            except Exception as e:
+                # The lane must outlive a bad frame, or the vehicle would never be processed again
+                print("Error while processing frame:", e)
+
+    async def process(self, data):
+        """Creates or updates the vehicle and checks the alert flags."""
+        if self.report_api:
+            await self.report(data)
+            return
+        if data["id"] not in self.known_vehicles:
+            status_code, vehicle = await self.vehicle_api.create_vehicle(self.solve_format_data(data))
+            if 200 <= status_code < 300:
+                self.known_vehicles.add(data["id"])
+        status_code, vehicle = await self.vehicle_api.update_vehicle(data["id"], self.solve_format_data(data))
+        if 200 <= status_code < 300:
+            # The vehicle exists, also when its creation was refused because it already did
+            self.known_vehicles.add(data["id"])
+        await self.check_alert(data)
+
+    async def report(self, data):
+        """Sends a frame with the report API and warns the receivers of a newly created alert."""
+        status_code, outcome, receivers = await self.report_api.report(data)
+        if outcome == "created" and not self.server_fanout:
+            print("i miei vicini sono: " + str(receivers))
+            self.client.publish_alert(receivers, self.alert_message(data))
+
+    async def check_alert(self, data):
+        """Checks for alerts based on data."""
+        data["sender"] = data.pop("id")
+        if data["t"] == 1 or data["s"] == 1 or data["u"] == 1:
+            if await self.alert_api.create_alert(data) == 201 and not self.server_fanout:
+                neighbors = await self.get_neighbors(data["sender"])
+                print("i miei vicini sono: " + str(neighbors))
+                self.client.publish_alert(neighbors or [], self.alert_message(data))
+
+    async def get_neighbors(self, vehicle_id=None):
+        # ritorna una lista di id dei vicini
+        status_code, neighbors = await self.neighbors_api.get_neighboring_vehicles(
+            str(vehicle_id if vehicle_id is not None else self.ID))
+        return neighbors
+
+    def handle_alert(self, vehicle_id, payload):
+        """
+        Handles an alert message received from MQTT, on paho's network thread.
+        """
+        alert = self.parse_alert(payload)
+        if alert is not None and vehicle_id == self.ID and self.writer is not None:
+            self.event_loop.call_soon_threadsafe(self.sendAlarm)
+
+    def sendAlarm(self, vehicle_id=None):
+        self.writer.write(b'$')
@@ -0,0 +1,110 @@
+# codec_benchmark.py
+"""
+Micro-benchmark of the JSON codec on the Bridge hot path.
+
+For every frame the Bridge decodes the serial payload, builds the REST body and, for an
+alert, encodes the MQTT payload (a JSON object, see Bridge.alert_message) that the receiving
+Bridges decode again. The legacy path used json.loads / json.dumps, str() for MQTT and
+eval() on the way back; the codec path
+uses API.codec. The benchmark reports CPU time per frame for both, the size of the REST
+body, and the memory held by vehicle records with and without __slots__.
+
+Usage (from the Bridge directory):
+    python -m benchmarks.codec_benchmark [--frames 50000] [--records 10000]
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from API import codec
+from API.vehicle import VehicleFactory
+from bridge import Bridge
+
+
+class LegacyVehicle:
+    """The dict-backed Vehicle record used before the codec layer."""
+
+    def __init__(self):
+        self.id = None
+        self.latitude = None
+        self.longitude = None
+        self.smoke = None
+        self.temperature = None
+
+
+def legacy_create_vehicle(vehicle_info):
+    vehicle = LegacyVehicle()
+    vehicle.id = vehicle_info.get("id")
+    vehicle.latitude = vehicle_info.get("latitude")
+    vehicle.longitude = vehicle_info.get("longitude")
+    vehicle.smoke = vehicle_info.get("smoke")
+    vehicle.temperature = vehicle_info.get("temperature")
+    return vehicle
+
+
+def sample_frames(count):
+    """Serial payloads shaped like the output of the MCU sketch."""
+    return [json.dumps({"id": i % 20, "latitude": 44.6 + i * 1e-5, "longitude": 10.9, "smoke": 120 + i % 7,
+                        "humidity": 40, "temperature": 25.5, "s": 0, "u": 0, "t": 0}).encode() + b'\r\n'
+            for i in range(count)]
+
+
+def legacy_path(frame):
+    data = json.loads(frame)
+    body = {key: value for key, value in data.items() if key not in ("s", "t", "u")}
+    json.dumps(body)
+    eval(str(Bridge.alert_message(data)))
+    return len(json.dumps(body))
+
+
+def codec_path(frame):
+    data = codec.loads(frame)
+    body = {key: value for key, value in data.items() if key not in ("s", "t", "u")}
+    codec.dumps(body)
+    Bridge.parse_alert(codec.dumps(Bridge.alert_message(data)))
+    return len(codec.dumps(body))
+
+
+def run(name, path, frames):
+    cpu = time.process_time()
+    size = 0
+    for frame in frames:
+        size = path(frame)
+    cpu = time.process_time() - cpu
+    print(f"{name:<8} cpu/frame={cpu / len(frames) * 1e6:>7.2f} us  REST body={size} bytes")
+    return cpu
+
+
+def record_memory(name, create, records):
+    """Bytes held per record while `records` vehicle records are alive."""
+    infos = [{"id": i, "latitude": 44.6, "longitude": 10.9, "smoke": 120.0, "temperature": 25.5}
+             for i in range(records)]
+    tracemalloc.start()
+    vehicles = [create(info) for info in infos]
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<8} {held / len(vehicles):>6.1f} bytes/record")
+    return held
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=50000)
+    parser.add_argument("--records", type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"codec backend: {codec.BACKEND}")
+    frames = sample_frames(args.frames)
+    legacy = run("legacy", legacy_path, frames)
+    fast = run("codec", codec_path, frames)
+    print(f"speedup: {legacy / fast:.1f}x\n")
+
+    legacy = record_memory("legacy", legacy_create_vehicle, args.records)
+    slotted = record_memory("slots", VehicleFactory.create_vehicle, args.records)
+    print(f"memory: {slotted / legacy:.0%} of legacy")
+
+
+if __name__ == '__main__':
+    main()
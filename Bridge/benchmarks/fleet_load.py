@@ -0,0 +1,342 @@
+# fleet_load.py
+"""
+End-to-end fleet load generator, for capacity planning and regression checks.
+
+`--vehicles` virtual MCUs write frames shaped like the output of progettofinito.ino
+("$" + compact JSON + CRLF + "!") to pty ports, at `--rate` frames/sec each. They move
+in a random walk at `--speed` m/s inside a `--area` km square, and each frame is an anomaly
+(smoke, temperature or humidity above the sketch thresholds) with probability
+`--alert-probability`. Positions carry 6 decimals so that every frame can be recognised
+in the database. The ports are served by real Bridge instances (Gateways when
+`--per-bridge` > 1) running in this process, against a running Django server and MQTT
+broker, with the configuration of config.ini plus `--option` overrides.
+
+Measured latencies, from the write of a frame on the serial line:
+    frame-to-DB      until the vehicle row holds the frame, observed by polling the fleet's rows
+                     (GET /api/vehicles/?cursor=&limit= from `--first-id`) every `--poll` seconds
+                     (that is the resolution); frames superseded before being observed are not
+                     counted. The polls load the server under test too: their count, duration and
+                     rows are reported with the results
+    alert-to-decision  until the Bridge gets the answer of POST /api/report/, only measured with
+                     --option SERVERCONFIG.REPORT_ENDPOINT=api/report/
+    alert-to-alarm   until a receiving vehicle's port gets the alarm byte
+
+Usage (from the Bridge directory, POSIX only, server and broker running):
+    python -m benchmarks.fleet_load --server 127.0.0.1:8080 --broker 127.0.0.1:1883
+        [--vehicles 50] [--per-bridge 10] [--rate 1] [--alert-probability 0.02]
+        [--duration 30] [--option SECTION.KEY=VALUE ...]
+"""
+
+import argparse
+import math
+import os
+import random
+import select
+import threading
+import time
+from collections import defaultdict, deque
+
+import requests
+import serial
+
+from API import codec
+from benchmarks.stubs import build_bridge
+from bridge import Bridge
+from gateway import Gateway
+
+# progettofinito.ino thresholds
+SMOKE_THRESHOLD = 400
+TEMPERATURE_THRESHOLD = 50
+HUMIDITY_THRESHOLD = 90
+METRES_PER_DEGREE = 111320.0
+
+
+def frame_key(vehicle_id, latitude):
+    return vehicle_id, round(latitude, 6)
+
+
+def percentiles(values):
+    """Returns a summary of latencies in milliseconds: count, p50, p95, p99 and max."""
+    if not values:
+        return "n=0"
+    values = sorted(values)
+
+    def pick(fraction):
+        return values[min(int(len(values) * fraction), len(values) - 1)] * 1000
+
+    return (f"n={len(values):<6} p50={pick(0.50):8.1f} ms  p95={pick(0.95):8.1f} ms  p99={pick(0.99):8.1f} ms"
+            f"  max={values[-1] * 1000:8.1f} ms")
+
+
+class VirtualMCU:
+    """A simulated vehicle writing frames to the master side of a pty."""
+
+    def __init__(self, vehicle_id, args, rng):
+        self.id = vehicle_id
+        self.args = args
+        self.rng = rng
+        self.master, slave = os.openpty()
+        self.port = os.ttyname(slave)
+        self.latitude = 44.6 + rng.uniform(0, args.area * 1000) / METRES_PER_DEGREE
+        self.longitude = 10.9 + rng.uniform(0, args.area * 1000) / METRES_PER_DEGREE
+        self.heading = rng.uniform(0, 2 * math.pi)
+
+    def move(self, seconds):
+        """Random walk: turns a little and advances at the configured speed."""
+        self.heading += self.rng.gauss(0, 0.3)
+        distance = self.args.speed * seconds
+        self.latitude += distance * math.cos(self.heading) / METRES_PER_DEGREE
+        self.longitude += distance * math.sin(self.heading) / (METRES_PER_DEGREE * math.cos(math.radians(self.latitude)))
+
+    def frame(self):
+        """
+        Builds the next frame.
+
+        Returns:
+            tuple: (frame bytes, True if the frame carries an alert flag)
+        """
+        rng = self.rng
+        smoke, temperature, humidity = rng.randint(100, 300), rng.randint(15, 35), rng.randint(30, 70)
+        if rng.random() < self.args.alert_probability:
+            kind = rng.choice(("s", "t", "u"))
+            if kind == "s":
+                smoke = rng.randint(SMOKE_THRESHOLD + 1, 1000)
+            elif kind == "t":
+                temperature = rng.randint(TEMPERATURE_THRESHOLD + 1, 90)
+            else:
+                humidity = rng.randint(HUMIDITY_THRESHOLD + 1, 100)
+        flags = (int(smoke > SMOKE_THRESHOLD), int(humidity > HUMIDITY_THRESHOLD), int(temperature > TEMPERATURE_THRESHOLD))
+        payload = (f'{{"id":{self.id},"latitude":{self.latitude:.6f},"longitude":{self.longitude:.6f},'
+                   f'"smoke":{smoke},"humidity":{humidity},"temperature":{temperature},'
+                   f'"s":{flags[0]},"u":{flags[1]},"t":{flags[2]}}}')
+        return b'$' + payload.encode() + b'\r\n!', any(flags)
+
+
+class Recorder:
+    """Collects the send, decision, database and alarm times of every frame."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = {}
+        # vehicle ID -> deque of (latitude, send time) not yet seen in the database
+        self.pending = defaultdict(deque)
+        # vehicle ID -> send times of the alerts it should be alarmed for / alarm times not yet matched
+        self.expected_alarms = defaultdict(deque)
+        self.early_alarms = defaultdict(deque)
+        self.frames = 0
+        self.alerts = 0
+        self.outcomes = defaultdict(int)
+        self.frame_to_db = []
+        self.alert_to_decision = []
+        self.alert_to_alarm = []
+
+    def frame_sent(self, vehicle_id, latitude, alert, now):
+        key = frame_key(vehicle_id, latitude)
+        with self.lock:
+            self.frames += 1
+            self.alerts += alert
+            self.sent[key] = now
+            self.pending[vehicle_id].append((key[1], now))
+
+    def decided(self, data, outcome, receivers, now):
+        with self.lock:
+            sent = self.sent.get(frame_key(data["id"], data["latitude"]))
+            self.outcomes[outcome] += 1
+            if sent is None:
+                return
+            self.alert_to_decision.append(now - sent)
+            if outcome != "created":
+                return
+            for vehicle_id in receivers:
+                if self.early_alarms[vehicle_id]:
+                    self.alert_to_alarm.append(self.early_alarms[vehicle_id].popleft() - sent)
+                else:
+                    self.expected_alarms[vehicle_id].append(sent)
+
+    def alarmed(self, vehicle_id, now):
+        with self.lock:
+            if self.expected_alarms[vehicle_id]:
+                self.alert_to_alarm.append(now - self.expected_alarms[vehicle_id].popleft())
+            else:
+                # The MQTT message can arrive before the Bridge reads the HTTP response
+                self.early_alarms[vehicle_id].append(now)
+
+    def stored(self, vehicle_id, latitude, now):
+        latitude = round(latitude, 6)
+        with self.lock:
+            pending = self.pending.get(vehicle_id)
+            if not pending or all(sent_latitude != latitude for sent_latitude, sent in pending):
+                return
+            while pending:
+                sent_latitude, sent = pending.popleft()
+                if sent_latitude == latitude:
+                    self.frame_to_db.append(now - sent)
+                    return
+
+
+class TimedReportAPI:
+    """Wraps the ReportAPI of a Bridge to record when each alert decision comes back."""
+
+    def __init__(self, report_api, recorder):
+        self.report_api = report_api
+        self.recorder = recorder
+
+    def report(self, data):
+        status_code, outcome, receivers = self.report_api.report(data)
+        if outcome is not None and (data["s"] or data["t"] or data["u"]):
+            self.recorder.decided(data, outcome, receivers, time.perf_counter())
+        return status_code, outcome, receivers
+
+
+def run_until_closed(bridge):
+    """Runs the Bridge loop, which ends with an error once its ptys are closed."""
+    try:
+        bridge.loop()
+    except (serial.SerialException, OSError):
+        pass
+
+
+def start_bridges(mcus, args, recorder):
+    host, port = args.server.rsplit(':', 1)
+    broker_host, broker_port = args.broker.rsplit(':', 1)
+    options = [("MQTT", "Server", broker_host), ("MQTT", "Port", broker_port)]
+    for option in args.option:
+        name, value = option.split('=', 1)
+        section, key = name.split('.', 1)
+        options.append((section, key, value))
+    bridges = []
+    for start in range(0, len(mcus), args.per_bridge):
+        group = mcus[start:start + args.per_bridge]
+        if args.per_bridge == 1:
+            bridge = build_bridge(Bridge, (host, int(port)), group[0].port,
+                                  options + [("SERIAL", "VEHICLE_ID", str(group[0].id))])
+        else:
+            ports = ", ".join(f"{mcu.port}:{mcu.id}" for mcu in group)
+            bridge = build_bridge(Gateway, (host, int(port)), options=options + [("GATEWAY", "PORTS", ports)])
+        if bridge.report_api:
+            bridge.report_api = TimedReportAPI(bridge.report_api, recorder)
+        threading.Thread(target=run_until_closed, args=(bridge,), daemon=True).start()
+        bridges.append(bridge)
+    return bridges
+
+
+def read_alarms(mcus, recorder, stop):
+    """Reads the alarm bytes written by the Bridges to the ports."""
+    by_fd = {mcu.master: mcu for mcu in mcus}
+    while not stop.is_set():
+        ready, _, _ = select.select(list(by_fd), [], [], 0.1)
+        now = time.perf_counter()
+        for fd in ready:
+            try:
+                data = os.read(fd, 1024)
+            except OSError:
+                continue
+            for _ in range(data.count(b'$')):
+                recorder.alarmed(by_fd[fd].id, now)
+
+
+class PollStats:
+    """Load put on the server by the database polls."""
+
+    def __init__(self):
+        self.polls = 0
+        self.requests = 0
+        self.rows = 0
+        self.seconds = 0.0
+
+    def summary(self):
+        if not self.polls:
+            return "no poll"
+        return (f"{self.polls} polls, {self.requests / self.polls:.1f} requests and {self.rows / self.polls:.0f} rows "
+                f"each, {self.seconds / self.polls * 1000:.1f} ms mean")
+
+
+def poll_database(args, recorder, stop, stats):
+    """Follows the rows of the fleet, and only them, through the keyset pages of the list endpoint."""
+    session = requests.Session()
+    url = f"http://{args.server}/api/vehicles/"
+    last_id = args.first_id + args.vehicles - 1
+    while not stop.is_set():
+        started = time.perf_counter()
+        cursor = args.first_id - 1
+        try:
+            while cursor is not None and cursor < last_id:
+                response = session.get(url, params={"cursor": cursor, "limit": min(last_id - cursor, 1000)},
+                                       timeout=10)
+                now = time.perf_counter()
+                stats.requests += 1
+                if response.status_code != 200:
+                    print("Poll failed with status", response.status_code)
+                    break
+                page = codec.loads(response.content)
+                for vehicle in page["results"]:
+                    recorder.stored(vehicle["id"], vehicle["latitude"], now)
+                stats.rows += len(page["results"])
+                cursor = page["next"]
+        except (requests.RequestException, codec.DecodeError) as e:
+            print("Poll failed:", e)
+        stats.polls += 1
+        stats.seconds += time.perf_counter() - started
+        stop.wait(max(args.poll - (time.perf_counter() - started), 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", required=True, help="HOST:PORT of the Django server")
+    parser.add_argument("--broker", required=True, help="HOST:PORT of the MQTT broker")
+    parser.add_argument("--vehicles", type=int, default=50)
+    parser.add_argument("--per-bridge", type=int, default=10, help="ports per Bridge; above 1 Gateways are used")
+    parser.add_argument("--first-id", type=int, default=1000, help="ID of the first virtual vehicle")
+    parser.add_argument("--rate", type=float, default=1, help="frames/sec sent by each vehicle")
+    parser.add_argument("--alert-probability", type=float, default=0.02, help="probability of an anomaly per frame")
+    parser.add_argument("--speed", type=float, default=15, help="vehicle speed in m/s")
+    parser.add_argument("--area", type=float, default=10, help="side in km of the square the fleet moves in")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of traffic")
+    parser.add_argument("--drain", type=float, default=5, help="seconds allowed to drain the backlog")
+    parser.add_argument("--poll", type=float, default=0.5, help="seconds between two database polls")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--option", action="append", default=[], help="config.ini override, SECTION.KEY=VALUE")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    mcus = [VirtualMCU(args.first_id + i, args, rng) for i in range(args.vehicles)]
+    start_bridges(mcus, args, recorder)
+    stop = threading.Event()
+    threading.Thread(target=read_alarms, args=(mcus, recorder, stop), daemon=True).start()
+    poll_stats = PollStats()
+    threading.Thread(target=poll_database, args=(args, recorder, stop, poll_stats), daemon=True).start()
+    time.sleep(1)
+
+    interval = 1 / (args.rate * args.vehicles)
+    started = time.perf_counter()
+    deadline = started + args.duration
+    next_send = started
+    index = 0
+    while time.perf_counter() < deadline:
+        mcu = mcus[index % len(mcus)]
+        index += 1
+        mcu.move(1 / args.rate)
+        frame, alert = mcu.frame()
+        recorder.frame_sent(mcu.id, mcu.latitude, alert, time.perf_counter())
+        os.write(mcu.master, frame)
+        next_send += interval
+        time.sleep(max(next_send - time.perf_counter(), 0))
+    elapsed = time.perf_counter() - started
+    time.sleep(args.drain)
+    stop.set()
+
+    print(f"\n{args.vehicles} vehicles on {math.ceil(args.vehicles / args.per_bridge)} bridges, "
+          f"{args.rate} frames/sec each, alert probability {args.alert_probability}")
+    print(f"sent {recorder.frames} frames ({recorder.frames / elapsed:.1f}/sec), {recorder.alerts} alerts; "
+          f"decisions: {dict(recorder.outcomes)}")
+    print(f"frame-to-DB        {percentiles(recorder.frame_to_db)}  (poll resolution {args.poll * 1000:.0f} ms)")
+    print(f"alert-to-decision  {percentiles(recorder.alert_to_decision)}")
+    print(f"alert-to-alarm     {percentiles(recorder.alert_to_alarm)}")
+    print(f"database polls     {poll_stats.summary()}")
+    for mcu in mcus:
+        os.close(mcu.master)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+# framing_benchmark.py
+"""
+Micro-benchmark of the serial framing engine.
+
+Compares the legacy byte-by-byte loop of Bridge.loop with FrameDecoder on the same
+in-memory byte stream and reports frames/sec and CPU time per frame. It then compares
+framing plus decoding of JSON text frames with binary frames, and the frame rate each
+format allows on a 9600 baud link.
+
+Usage (from the Bridge directory):
+    python -m benchmarks.framing_benchmark [--frames 20000] [--burst 64]
+"""
+
+import argparse
+import json
+import time
+
+from Serial_client import binary
+from Serial_client.framing import FrameDecoder
+
+# 8N1 serial framing: 10 bits on the wire per byte
+BAUD_BYTES_PER_SEC = 9600 / 10
+
+
+class BurstSerial:
+    """In-memory stand-in for serial.Serial that makes data available `burst` bytes at a time."""
+
+    def __init__(self, data, burst):
+        self.data = data
+        self.burst = burst
+        self.position = 0
+        self.available = 0
+
+    @property
+    def in_waiting(self):
+        if self.available == 0:
+            # Emulates the driver receiving the next burst from the MCU
+            self.available = min(self.burst, len(self.data) - self.position)
+        return self.available
+
+    def read(self, size=1):
+        size = min(size, self.in_waiting)
+        chunk = self.data[self.position:self.position + size]
+        self.position += size
+        self.available -= size
+        return chunk
+
+    def exhausted(self):
+        return self.position >= len(self.data)
+
+
+def sample_frame(i):
+    return {"id": i % 20, "latitude": 44.64, "longitude": 10.92, "smoke": 120,
+            "humidity": 40, "temperature": 25, "s": 0, "u": 0, "t": 0}
+
+
+def build_stream(frames):
+    """Builds a byte stream shaped like the output of the MCU sketch."""
+    stream = bytearray()
+    for i in range(frames):
+        stream += b'$' + json.dumps(sample_frame(i)).encode() + b'\r\n!'
+    return bytes(stream)
+
+
+def build_binary_stream(frames):
+    """Builds the same stream with binary frames."""
+    return b''.join(binary.encode_frame(sample_frame(i)) for i in range(frames))
+
+
+def legacy_loop(ser):
+    """The byte-by-byte loop that Bridge.loop used before FrameDecoder."""
+    count = 0
+    inbuffer = []
+    while not ser.exhausted():
+        if ser.in_waiting > 0:
+            lastchar = ser.read(1)
+            if lastchar == b'$':
+                inbuffer = []
+            elif lastchar == b'!':
+                b''.join(inbuffer).decode()
+                count += 1
+                inbuffer = []
+            else:
+                inbuffer.append(lastchar)
+    return count
+
+
+def decoder_loop(ser):
+    """The chunked loop used by Bridge.loop."""
+    count = 0
+    decoder = FrameDecoder()
+    while not ser.exhausted():
+        chunk = ser.read(ser.in_waiting or 1)
+        if chunk:
+            count += len(decoder.feed(chunk))
+    return count
+
+
+def decoding_loop(ser):
+    """Framing plus decoding of every frame into a dict, as Bridge.decode does."""
+    count = 0
+    decoder = FrameDecoder()
+    while not ser.exhausted():
+        chunk = ser.read(ser.in_waiting or 1)
+        for frame in decoder.feed(chunk):
+            if frame[0] == binary.SYNC_BYTE:
+                binary.decode_frame(frame)
+            else:
+                json.loads(frame)
+            count += 1
+    return count
+
+
+def run(name, loop, stream, burst):
+    ser = BurstSerial(stream, burst)
+    wall, cpu = time.perf_counter(), time.process_time()
+    count = loop(ser)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    print(f"{name:<10} frames={count:<8} frames/sec={count / wall:>12.0f} cpu/frame={cpu / count * 1e6:>8.2f} us")
+    return wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--burst", type=int, default=64, help="bytes made available by the driver per read")
+    args = parser.parse_args()
+
+    stream = build_stream(args.frames)
+    legacy = run("legacy", legacy_loop, stream, args.burst)
+    chunked = run("decoder", decoder_loop, stream, args.burst)
+    print(f"speedup: {legacy / chunked:.1f}x\n")
+
+    binary_stream = build_binary_stream(args.frames)
+    for name, data in (("json", stream), ("binary", binary_stream)):
+        size = len(data) / args.frames
+        print(f"{name:<10} bytes/frame={size:<6.1f} max frames/sec at 9600 baud={BAUD_BYTES_PER_SEC / size:.1f}")
+    text = run("json", decoding_loop, stream, args.burst)
+    packed = run("binary", decoding_loop, binary_stream, args.burst)
+    print(f"speedup: {text / packed:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
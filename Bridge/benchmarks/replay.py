@@ -0,0 +1,156 @@
+# replay.py
+"""
+Replays a serial capture through the Bridge, for reproducible throughput and latency measures.
+
+The capture (recorded with [SERIAL] CAPTURE) is fed through an in-memory port to the same
+Bridge.loop / use_data / process path used in the field, with the configuration of config.ini.
+REST calls go to a local stub server unless --server is given, and MQTT is always stubbed.
+The latency of a frame is the time from its decoding to the end of the request carrying it:
+Bridge.process, or the batch request for the telemetry that the outbox or the batcher send to
+the batch endpoint.
+
+Usage (from the Bridge directory):
+    python -m benchmarks.replay capture.bin [--speed 1] [--delay 0.0] [--server HOST:PORT]
+
+    --speed 1 replays in real time, --speed N N times faster, --speed 0 as fast as possible.
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+from collections import defaultdict, deque
+
+import serial
+
+from benchmarks.stubs import StubAPIServer, StubMQTTClient, build_bridge
+from bridge import Bridge
+from pipeline import is_alert
+from Serial_client.capture import ReplaySerial
+
+
+def frame_key(data):
+    """Identifies a frame by its vehicle state, the only part of it a batch request carries."""
+    return json.dumps({key: value for key, value in data.items() if key not in ("s", "t", "u")}, sort_keys=True)
+
+
+class TimedVehicleAPI:
+    """Wraps the VehicleAPI of a ReplayBridge to time the frames sent in batch requests."""
+
+    def __init__(self, vehicle_api, bridge):
+        self.vehicle_api = vehicle_api
+        self.bridge = bridge
+
+    def update_vehicles(self, vehicles):
+        status_code = self.vehicle_api.update_vehicles(vehicles)
+        self.bridge.sent(vehicles)
+        return status_code
+
+    def __getattr__(self, name):
+        return getattr(self.vehicle_api, name)
+
+
+class ReplayBridge(Bridge):
+    """Bridge reading from a ReplaySerial, with MQTT stubbed and per-frame latency tracking."""
+
+    capture = None
+    speed = 0
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # frame key -> decoding times; frames may be re-created from JSON by the outbox before being sent
+        self.decoded = defaultdict(deque)
+        self.latencies = []
+        self.frames = 0
+        super().__init__()
+
+    def setup_serial(self):
+        self.ser = ReplaySerial(self.capture, self.speed)
+
+    def setup_mqtt(self):
+        self.client = StubMQTTClient()
+
+    def setup_workers(self):
+        # Before the batcher and the outbox get hold of the VehicleAPI
+        self.vehicle_api = TimedVehicleAPI(self.vehicle_api, self)
+        super().setup_workers()
+
+    def decode(self, data):
+        data = super().decode(data)
+        self.frames += 1
+        if data is not None:
+            with self.lock:
+                self.decoded[frame_key(data)].append(time.perf_counter())
+        return data
+
+    def process(self, data):
+        # Copied first: check_alert renames the "id" of the frame
+        frame = dict(data)
+        super().process(data)
+        if not (self.batcher and not is_alert(frame)):
+            # Buffered telemetry is timed when its batch is sent
+            self.sent([frame])
+
+    def sent(self, frames):
+        """Records the latency of frames whose request just completed."""
+        now = time.perf_counter()
+        with self.lock:
+            for frame in frames:
+                times = self.decoded.get(frame_key(frame))
+                if times:
+                    self.latencies.append(now - times.popleft())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="capture file recorded with [SERIAL] CAPTURE")
+    parser.add_argument("--speed", type=float, default=1, help="replay speed factor, 0 = as fast as possible")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds the stub server waits on every request")
+    parser.add_argument("--server", help="HOST:PORT of a real REST server to use instead of the stub")
+    args = parser.parse_args()
+
+    ReplayBridge.capture = args.capture
+    ReplayBridge.speed = args.speed
+    server = None
+    if args.server:
+        host, port = args.server.rsplit(':', 1)
+        address = (host, int(port))
+    else:
+        server = StubAPIServer(args.delay).start()
+        address = server.server_address
+    bridge = build_bridge(ReplayBridge, address)
+
+    start = time.perf_counter()
+    try:
+        bridge.loop()
+    except serial.SerialException:
+        pass
+    # Waits for the background stages to send what is still queued
+    if bridge.outbox:
+        bridge.outbox.join()
+    elif bridge.pipeline:
+        bridge.pipeline.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(bridge.latencies)
+    # Telemetry replaced by a newer frame of its vehicle before being sent
+    superseded = sum(len(times) for times in bridge.decoded.values())
+    print(f"frames decoded={bridge.frames}  sent={len(latencies)}  superseded={superseded}  elapsed={elapsed:.2f} s  "
+          f"throughput={len(latencies) / elapsed:.1f} frames/sec")
+    if latencies:
+        p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+        print(f"latency p50={statistics.median(latencies) * 1000:.2f} ms  p95={p95 * 1000:.2f} ms  "
+              f"max={latencies[-1] * 1000:.2f} ms")
+    if server:
+        print("requests: " + ", ".join(f"{method}={count}" for method, count in sorted(server.requests.items())))
+    if bridge.outbox:
+        print(f"outbox: sent={bridge.outbox.sent} failures={bridge.outbox.failures}")
+    elif bridge.pipeline:
+        print(f"pipeline: coalesced={bridge.pipeline.queue.coalesced} dropped={bridge.pipeline.queue.dropped}")
+    if bridge.coalescer:
+        print(f"coalescer: sent={bridge.coalescer.sent} suppressed={bridge.coalescer.suppressed}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# runtime_latency.py
+"""
+Latency comparison between the blocking Bridge and AsyncBridge under a slow server.
+
+A local HTTP server emulates the REST API, sleeping `--delay` seconds on every request.
+Frames from `--vehicles` virtual MCUs are written to a pty at `--rate` frames/sec each,
+and the latency of a frame is the time between its write on the serial line and the
+arrival of the matching PUT at the server. MQTT is replaced by a stub, and coalescing is
+disabled so that every frame reaches the server. Every run sets its stages explicitly, so the
+results do not depend on config.ini; the inline run is the legacy path, with one request per
+call and no pipeline, outbox, batching or report endpoint.
+
+Usage (from the Bridge directory, POSIX only):
+    python -m benchmarks.runtime_latency [--delay 0.05] [--vehicles 10] [--rate 2] [--duration 10]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+
+import serial
+
+from benchmarks.stubs import StubAPIServer, StubMQTTClient, build_bridge
+
+# Stages of the legacy synchronous Bridge, which the other runs turn on one by one
+LEGACY = (("PIPELINE", "WORKERS", "0"), ("OUTBOX", "PATH", ""), ("BATCHING", "MAX_ITEMS", "0"),
+          ("SERVERCONFIG", "REPORT_ENDPOINT", ""))
+PIPELINE = ("PIPELINE", "WORKERS", "4")
+OUTBOX = ("OUTBOX", "PATH", "outbox.sqlite3")
+BATCHING = ("BATCHING", "MAX_ITEMS", "100")
+REPORT = ("SERVERCONFIG", "REPORT_ENDPOINT", "api/report/")
+
+
+def run_until_closed(bridge):
+    """Runs the Bridge loop, which ends with an error once the pty is closed."""
+    try:
+        bridge.loop()
+    except (serial.SerialException, OSError):
+        pass
+
+
+def measure(name, bridge_class, args, options=()):
+    server = StubAPIServer(args.delay).start()
+    master, slave = os.openpty()
+    options = (("COALESCING", "ENABLED", "no"),) + LEGACY + tuple(options)
+    bridge = build_bridge(bridge_class, server.server_address, os.ttyname(slave), options)
+    threading.Thread(target=run_until_closed, args=(bridge,), daemon=True).start()
+    time.sleep(0.5)
+
+    sent = {}
+    interval = 1 / (args.rate * args.vehicles)
+    seq = 0
+    deadline = time.perf_counter() + args.duration
+    while time.perf_counter() < deadline:
+        seq += 1
+        vehicle_id = seq % args.vehicles + 1
+        # The frame sequence number travels in the temperature field
+        frame = {"id": vehicle_id, "latitude": 44.64, "longitude": 10.92, "smoke": 100, "humidity": 40,
+                 "temperature": seq, "s": 0, "u": 0, "t": 0}
+        sent[(vehicle_id, seq)] = time.perf_counter()
+        os.write(master, b'$' + json.dumps(frame).encode() + b'\r\n!')
+        time.sleep(interval)
+    # Leaves time to drain the backlog before collecting the results
+    time.sleep(args.drain)
+    server.shutdown()
+    os.close(master)
+
+    latencies = sorted(server.arrivals[key] - sent[key] for key in sent if key in server.arrivals)
+    if not latencies:
+        print(f"{name:<18} no frame reached the server")
+        return
+    p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+    print(f"{name:<18} delivered={len(latencies)}/{len(sent)}  p50={statistics.median(latencies) * 1000:8.1f} ms"
+          f"  p95={p95 * 1000:8.1f} ms  max={latencies[-1] * 1000:8.1f} ms"
+          f"  requests={sum(server.requests.values())}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--delay", type=float, default=0.05, help="seconds the server waits on every request")
+    parser.add_argument("--vehicles", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=2, help="frames/sec sent by each vehicle")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of traffic")
+    parser.add_argument("--drain", type=float, default=3, help="seconds allowed to drain the backlog")
+    args = parser.parse_args()
+
+    from async_bridge import AsyncBridge
+    from bridge import Bridge
+
+    class StubbedBridge(Bridge):
+        def setup_mqtt(self):
+            self.client = StubMQTTClient()
+
+    class StubbedAsyncBridge(AsyncBridge):
+        def setup_mqtt(self):
+            self.client = StubMQTTClient()
+
+    print(f"server delay={args.delay * 1000:.0f} ms, {args.vehicles} vehicles x {args.rate} frames/sec")
+    measure("Bridge (inline)", StubbedBridge, args)
+    measure("Bridge (pipeline)", StubbedBridge, args, (PIPELINE, BATCHING, REPORT))
+    measure("Bridge (outbox)", StubbedBridge, args, (OUTBOX, BATCHING, REPORT))
+    measure("Bridge (unbatched)", StubbedBridge, args, (PIPELINE, REPORT))
+    measure("AsyncBridge", StubbedAsyncBridge, args, (REPORT,))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# stubs.py
+"""Local stand-ins for the REST server and the MQTT broker, shared by the benchmarks."""
+
+import configparser
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BRIDGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StubAPIServer(ThreadingHTTPServer):
+    """
+    Emulates the REST API on a local port, answering every request after `delay` seconds.
+
+    The arrival time of every vehicle update, sent alone, in a batch or in a report, is stored in `arrivals`,
+    keyed by (vehicle id, temperature), and `requests` counts the requests by method.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, delay=0.0):
+        super().__init__(('127.0.0.1', 0), StubAPIHandler)
+        self.delay = delay
+        self.arrivals = {}
+        self.requests = Counter()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class StubAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status_code, body=b''):
+        self.server.requests[self.command] += 1
+        time.sleep(self.server.delay)
+        self.send_response(status_code)
+        if body:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        return json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+
+    def do_PUT(self):
+        data = self.read_json()
+        self.server.arrivals[(data["id"], data["temperature"])] = time.perf_counter()
+        self.reply(200)
+
+    def do_POST(self):
+        data = self.read_json()
+        if self.path.endswith('/batch/'):
+            now = time.perf_counter()
+            for vehicle in data:
+                self.server.arrivals[(vehicle["id"], vehicle["temperature"])] = now
+            self.reply(200, json.dumps({"count": len(data)}).encode())
+            return
+        if self.path.endswith('/report/'):
+            self.server.arrivals[(data["id"], data["temperature"])] = time.perf_counter()
+            if data["s"] or data["t"] or data["u"]:
+                self.reply(201, json.dumps({"alert": "created", "receivers": []}).encode())
+            else:
+                self.reply(200, json.dumps({"alert": "none", "receivers": []}).encode())
+            return
+        self.reply(201)
+
+    def do_GET(self):
+        self.reply(200, json.dumps({"neighboring_vehicle_ids": []}).encode())
+
+
+class StubMQTTClient:
+    """Stand-in for MQTT_client.client.MQTTClient that keeps the published alerts."""
+
+    def __init__(self):
+        self.published = []
+
+    def publish(self, payload, topic=None):
+        self.published.append((topic, payload))
+
+    def publish_alert(self, receivers, alert):
+        for vehicle_id in receivers:
+            self.published.append((vehicle_id, alert))
+
+    def subscribe(self):
+        pass
+
+
+def build_bridge(bridge_class, address, portname="stub", options=()):
+    """
+    Instantiates a Bridge class against a given REST server, usually a StubAPIServer.
+
+    The Bridge reads config.ini from the working directory, so the real configuration is copied
+    to a temporary directory with the server address and the port name replaced.
+
+    Args:
+        address (tuple): (host, port) of the REST server.
+        options (iterable): Extra (section, option, value) settings to override.
+    """
+    config = configparser.ConfigParser()
+    config.read(os.path.join(BRIDGE_DIR, 'config.ini'))
+    for section, option, value in options:
+        if not config.has_section(section):
+            config.add_section(section)
+        config.set(section, option, value)
+    config.set("SERIAL", "PORTNAME", portname)
+    if config.get("OUTBOX", "PATH", fallback=""):
+        # A fresh outbox, so that frames left by a previous run are not replayed
+        config.set("OUTBOX", "PATH", os.path.join(tempfile.mkdtemp(), "outbox.sqlite3"))
+    config.set("SERVERCONFIG", "HOST", address[0])
+    config.set("SERVERCONFIG", "PORT", str(address[1]))
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'config.ini'), 'w') as config_file:
+            config.write(config_file)
+        os.chdir(directory)
+        try:
+            return bridge_class()
+        finally:
+            os.chdir(cwd)
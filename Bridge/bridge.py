@@ -1,29 +1,58 @@
 # bridge.py
 
 import configparser
-import json
+import time
 
 import serial
 import serial.tools.list_ports
 
-from API.api import VehicleAPI, AlertsAPI, NeighboringVehiclesAPI
+from API import codec
+from API.api import VehicleAPI, AlertsAPI, NeighboringVehiclesAPI, ReportAPI, VehicleBatcher
+from API.transport import HTTPTransport
 from MQTT_client.client import MQTTClient
+from Serial_client import binary
+from Serial_client.capture import CaptureWriter, RecordingSerial
+from Serial_client.framing import FrameDecoder
+from coalescer import TelemetryCoalescer
+from outbox import Outbox
+from pipeline import Pipeline, is_alert
 
 
 class Bridge:
     def __init__(self):
-        self.ID = 1
+        self.config = configparser.ConfigParser()
+        self.config.read('config.ini')
+        self.ID = self.config.getint("SERIAL", "VEHICLE_ID", fallback=1)
         self.client = None
         self.portname = None
-        self.inbuffer = []
+        self.decoder = FrameDecoder()
         self.ser = None
-        self.first = True
-        self.config = configparser.ConfigParser()
-        self.config.read('config.ini')
+        # Vehicles already created on the server by this process
+        self.known_vehicles = set()
         self.setup_serial()
         self.setup_mqtt()
-        self.vehicle_api = VehicleAPI()
-        self.alert_api = AlertsAPI()
+        # One connection pool and one parsed configuration for every API client
+        self.transport = HTTPTransport(self.config)
+        self.vehicle_api = VehicleAPI(self.transport)
+        self.alert_api = AlertsAPI(self.transport)
+        self.neighbors_api = NeighboringVehiclesAPI(self.transport)
+        self.report_api = ReportAPI.from_config(self.transport)
+        # The server publishes created alerts to their receivers itself
+        self.server_fanout = self.config.getboolean("MQTT", "SERVER_FANOUT", fallback=False)
+        # Topic prefix of the telemetry published over MQTT, empty to send it over HTTP
+        self.telemetry_topic = self.config.get("TELEMETRY", "TOPIC", fallback="")
+        self.coalescer = TelemetryCoalescer.from_config(self.config)
+        self.setup_workers()
+
+    def setup_workers(self):
+        """Builds the stages configured between the serial reader and the server."""
+        self.batcher = VehicleBatcher.from_config(self.vehicle_api, self.config)
+        self.pipeline = Pipeline.from_config(self, self.config)
+        self.outbox = Outbox.from_config(self, self.config)
+        if self.pipeline and self.outbox:
+            message = "[PIPELINE] WORKERS and [OUTBOX] PATH are both set: the outbox replaces the worker pipeline"
+            print(f'\033[91mSetup failed: {message}. Set WORKERS = 0 or leave PATH empty.\033[0m')
+            raise ValueError(message)
 
     def setup_mqtt(self):
         """Sets up MQTT client."""
@@ -34,77 +63,218 @@ class Bridge:
         """Sets up serial connection."""
         self.ser = None
         self.portname = None
+        # A real read timeout lets the loop block in the driver instead of polling in_waiting
+        timeout = self.config.getfloat("SERIAL", "TIMEOUT", fallback=0.1)
         if self.config.get("SERIAL", "PORTNAME", fallback="COM1"):
             self.portname = self.config.get("SERIAL", "PORTNAME", fallback="COM1")
         try:
             if self.portname:
                 print("\nConnecting to " + self.portname + '\n')
-                self.ser = serial.Serial(self.portname, 9600, timeout=0)
+                self.ser = self.open_capture(serial.Serial(self.portname, 9600, timeout=timeout))
         except:
             self.ser = None
             print(f'\033[91mSetup failed: Unable to connect to {self.portname}. \nPlease check the port and update '
                   f'the "PORTNAME" in the config.ini file if necessary.\n\033[0m')
             self.print_available_ports()
 
+    def open_capture(self, ser, suffix=''):
+        """
+        Wraps a freshly opened port so that its byte stream is recorded, if [SERIAL] CAPTURE is set.
+
+        Returns:
+            The port to read from.
+        """
+        path = self.config.get("SERIAL", "CAPTURE", fallback="")
+        if not path:
+            return ser
+        print("Recording the serial stream to " + path + suffix)
+        return RecordingSerial(ser, CaptureWriter(path + suffix))
+
     def loop(self):
         """Main loop for data processing."""
         if self.ser:
+            self.start_workers()
             while True:
-                if self.ser and self.ser.in_waiting > 0:
-                    lastchar = self.ser.read(1)
-                    if lastchar == b'$':
-                        self.inbuffer = []
-                    elif lastchar == b'!':
-                        data = b''.join(self.inbuffer)
-                        self.use_data(data.decode())
-                        self.inbuffer = []
-                    else:
-                        self.inbuffer.append(lastchar)
+                # Reads everything already buffered by the driver, or blocks for at most TIMEOUT seconds
+                chunk = self.ser.read(self.ser.in_waiting or 1)
+                if chunk:
+                    for frame in self.decoder.feed(chunk):
+                        self.use_data(frame)
         else:
             print('\033[91mError on main loop: the serial connection has not been established.\033[0m\n')
 
+    def start_workers(self):
+        """Starts the background stages configured between the serial reader and the server."""
+        if self.outbox:
+            self.outbox.start()
+        elif self.pipeline:
+            self.pipeline.start()
+
     def check_alert(self, data):
-        """Checks for alerts based on data."""
+        """
+        Checks for alerts based on data.
+
+        Returns:
+            int: Status code of the alert creation, or None if no alert flag is set.
+        """
         data["sender"] = data.pop("id")
         # se risponde 200 ==> i vicini hanno stessi valori ==> no alert
         # se risponde 201 ==> l'alert creato
         if data["t"] == 1 or data["s"] == 1 or data["u"] == 1:
-            if self.alert_api.create_alert(data) == 201:
-                neighbors = self.get_neighbors()
+            status_code = self.alert_api.create_alert(data)
+            if status_code == 201 and not self.server_fanout:
+                neighbors = self.get_neighbors(data["sender"])
                 print("i miei vicini sono: " + str(neighbors))
                 # allerto i vicini
                 print("allerto i vicini")
-                self.client.publish(payload=str(neighbors))
+                self.client.publish_alert(neighbors or [], self.alert_message(data))
+            return status_code
+        return None
+
+    def report(self, data):
+        """
+        Sends a frame with the report API and warns the receivers of a newly created alert.
+
+        Returns:
+            int: Status code of the report.
+        """
+        status_code, outcome, receivers = self.report_api.report(data)
+        if outcome == "created" and not self.server_fanout:
+            print("i miei vicini sono: " + str(receivers))
+            print("allerto i vicini")
+            self.client.publish_alert(receivers, self.alert_message(data))
+        return status_code
+
+    def publish_telemetry(self, data):
+        """Publishes the state of a vehicle on <TOPIC>/<vehicle ID>, stamped with its sending time."""
+        state = self.solve_format_data(data)
+        state["sent"] = time.time()
+        self.client.publish(codec.dumps(state), topic=f"{self.telemetry_topic}/{data['id']}")
 
     def use_data(self, data):
-        """Processes incoming data."""
+        """Processes incoming data, inline, through the durable outbox or through the worker pipeline."""
+        data = self.decode(data)
+        if data is None or (self.coalescer and not self.coalescer.should_send(data)):
+            return
+        if self.telemetry_topic and not is_alert(data):
+            self.publish_telemetry(data)
+            return
+        if self.outbox:
+            self.outbox.put(data)
+        elif self.pipeline:
+            self.pipeline.submit(data)
+        else:
+            self.process(data)
+
+    @staticmethod
+    def decode(data):
+        """
+        Decodes the payload of a frame, either JSON text or binary.
+
+        Returns:
+            dict: The decoded frame, or None if the payload is malformed.
+        """
+        if data and data[0] == binary.SYNC_BYTE:
+            try:
+                return binary.decode_frame(data)
+            except ValueError as e:
+                print("Error during binary frame decoding:", e)
+                return None
         try:
-            data = json.loads(data)
-            # print(data)
-            if self.first:
-                self.vehicle_api.create_vehicle(self.solve_format_data(data))
-                self.first = False
-            self.vehicle_api.update_vehicle(data["id"], self.solve_format_data(data))
-            self.check_alert(data)
-        except json.JSONDecodeError as e:
+            return codec.loads(data)
+        except codec.DecodeError as e:
             print("Error during JSON string parsing:", e)
+            return None
+
+    def process(self, data):
+        """
+        Sends a decoded frame to the server: creates or updates the vehicle and checks the alert flags.
+
+        Every step is checked before the next one, so that the alert is never created when the
+        vehicle could not be written: the frame is then sent again from the start.
+
+        Raises:
+            ConnectionError: If the server answered with a 5xx status, so that the outbox keeps
+                the frame and sends it again.
+        """
+        if self.report_api and (is_alert(data) or not self.batcher):
+            if self.batcher:
+                # The report carries a newer state than the one still buffered
+                self.batcher.discard(data["id"])
+            self.check_status(self.report(data))
+        elif self.batcher:
+            # The batch endpoint upserts, so no separate creation is needed
+            self.batcher.add(self.solve_format_data(data))
+            if is_alert(data):
+                # The alert refers to the vehicle: it must be on the server first
+                self.check_status(self.batcher.flush())
+            self.check_status(self.check_alert(data))
+        else:
+            if data["id"] not in self.known_vehicles:
+                status_code, vehicle = self.vehicle_api.create_vehicle(self.solve_format_data(data))
+                self.check_status(status_code)
+                self.known_vehicles.add(data["id"])
+            self.check_status(self.vehicle_api.update_vehicle(data["id"], self.solve_format_data(data))[0])
+            self.check_status(self.check_alert(data))
+
+    @staticmethod
+    def check_status(status_code):
+        """Raises ConnectionError if the server answered with a 5xx status; None is no request."""
+        if status_code is not None and status_code >= 500:
+            raise ConnectionError(f"server answered with status {status_code}")
+
+    def local_vehicles(self):
+        """Returns the IDs of the vehicles attached to this Bridge, whose alert topics it subscribes to."""
+        return [self.ID]
+
+    @staticmethod
+    def alert_message(data):
+        """
+        Builds the MQTT alert message of a frame.
+
+        Args:
+            data (dict): The decoded frame, with the vehicle ID in "id" or, after check_alert, in "sender".
 
-    def handle_alert(self, payload):
+        Returns:
+            dict: Sender, position, readings and flags of the alert.
         """
-        Handles an alert message received from MQTT.
+        message = {"sender": data.get("sender", data.get("id"))}
+        for field in ("latitude", "longitude", "smoke", "temperature", "humidity", "s", "t", "u"):
+            message[field] = data.get(field)
+        return message
+
+    def handle_alert(self, vehicle_id, payload):
+        """
+        Handles an alert message received from MQTT on the topic of a local vehicle.
         """
-        # il payload contiene la lista che è una stringa
-        ids = eval(payload)
-        if self.ID in ids:
+        alert = self.parse_alert(payload)
+        if alert is not None and vehicle_id == self.ID:
             self.sendAlarm()
 
-    def get_neighbors(self):
+    @staticmethod
+    def parse_alert(payload):
+        """
+        Decodes an alert message: a JSON object describing the alert.
+
+        Returns:
+            dict: The alert, or None if the payload is malformed.
+        """
+        try:
+            alert = codec.loads(payload)
+        except codec.DecodeError as e:
+            print("Error during alert message parsing:", e)
+            return None
+        if not isinstance(alert, dict):
+            print("Error during alert message parsing: not an object")
+            return None
+        return alert
+
+    def get_neighbors(self, vehicle_id=None):
         # ritorna una lista di id dei vicini
-        api = NeighboringVehiclesAPI()
-        status_code, neighbors = api.get_neighboring_vehicles(str(self.ID))
+        status_code, neighbors = self.neighbors_api.get_neighboring_vehicles(str(vehicle_id if vehicle_id is not None else self.ID))
         return neighbors
 
-    def sendAlarm(self):
+    def sendAlarm(self, vehicle_id=None):
         # bisogna mandare all'arduino qualcosa per dirgli oh bello accenditi.
         self.ser.write(b'$')
 
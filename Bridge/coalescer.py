@@ -0,0 +1,91 @@
+# coalescer.py
+
+import math
+import time
+
+from pipeline import is_alert
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def distance_m(lat1, lon1, lat2, lon2):
+    """Haversine distance in metres, accurate enough to compare against a movement threshold."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class TelemetryCoalescer:
+    """
+    Suppresses telemetry frames that do not carry new information.
+
+    The last state sent for each vehicle is kept; a new frame is sent only if it moved the vehicle
+    or changed a sensor reading by more than the configured deltas, or if nothing was sent for
+    `max_age` seconds (heartbeat). Frames with an alert flag always go through.
+    """
+
+    def __init__(self, min_distance=10.0, min_temperature=1.0, min_smoke=20.0, min_humidity=5.0, max_age=60.0):
+        """
+        Initializes the coalescer.
+
+        Args:
+            min_distance (float): Movement in metres that triggers an update.
+            min_temperature (float): Temperature change in degrees that triggers an update.
+            min_smoke (float): Smoke change in ppm that triggers an update.
+            min_humidity (float): Humidity change in percentage points that triggers an update.
+            max_age (float): Seconds after which an update is sent even if nothing changed.
+        """
+        self.min_distance = min_distance
+        self.min_temperature = min_temperature
+        self.min_smoke = min_smoke
+        self.min_humidity = min_humidity
+        self.max_age = max_age
+        # vehicle ID -> (last state sent, time it was sent)
+        self.last_sent = {}
+        self.sent = 0
+        self.suppressed = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds the coalescer described by the [COALESCING] section.
+
+        Returns:
+            TelemetryCoalescer: The coalescer, or None if coalescing is disabled.
+        """
+        if not config.getboolean("COALESCING", "ENABLED", fallback=False):
+            return None
+        return cls(min_distance=config.getfloat("COALESCING", "MIN_DISTANCE", fallback=10.0),
+                   min_temperature=config.getfloat("COALESCING", "MIN_TEMPERATURE", fallback=1.0),
+                   min_smoke=config.getfloat("COALESCING", "MIN_SMOKE", fallback=20.0),
+                   min_humidity=config.getfloat("COALESCING", "MIN_HUMIDITY", fallback=5.0),
+                   max_age=config.getfloat("COALESCING", "MAX_AGE", fallback=60.0))
+
+    def should_send(self, data):
+        """
+        Decides whether a decoded frame must be sent to the server, and records it if so.
+
+        Args:
+            data (dict): Decoded frame.
+
+        Returns:
+            bool: True if the frame must be sent.
+        """
+        now = time.monotonic()
+        last = self.last_sent.get(data["id"])
+        if last is None or is_alert(data) or now - last[1] >= self.max_age or self.changed(last[0], data):
+            self.last_sent[data["id"]] = (data.copy(), now)
+            self.sent += 1
+            return True
+        self.suppressed += 1
+        return False
+
+    def changed(self, previous, data):
+        """Returns True if any reading moved past its threshold since the previous state."""
+        return (abs(data["temperature"] - previous["temperature"]) >= self.min_temperature
+                or abs(data["smoke"] - previous["smoke"]) >= self.min_smoke
+                or abs(data.get("humidity", 0) - previous.get("humidity", 0)) >= self.min_humidity
+                or distance_m(previous["latitude"], previous["longitude"],
+                              data["latitude"], data["longitude"]) >= self.min_distance)
@@ -0,0 +1,101 @@
+# gateway.py
+
+import selectors
+
+import serial
+
+from bridge import Bridge
+from Serial_client.framing import FrameDecoder
+
+
+def parse_ports(value):
+    """
+    Parses the [GATEWAY] PORTS option.
+
+    Args:
+        value (str): Comma separated list of PORTNAME:VEHICLE_ID pairs, e.g. "/dev/ttyUSB0:1, /dev/ttyUSB1:2".
+
+    Returns:
+        dict: Mapping from port name to vehicle ID.
+    """
+    ports = {}
+    for entry in value.replace('\n', ',').split(','):
+        entry = entry.strip()
+        if entry:
+            portname, vehicle_id = entry.rsplit(':', 1)
+            ports[portname.strip()] = int(vehicle_id)
+    return ports
+
+
+class SerialDevice:
+    """A serial port served by the gateway, together with its framing state."""
+
+    def __init__(self, portname, vehicle_id, ser):
+        self.portname = portname
+        self.vehicle_id = vehicle_id
+        self.ser = ser
+        self.decoder = FrameDecoder()
+
+    def read_frames(self):
+        """Reads everything available on the port and returns the complete frames."""
+        chunk = self.ser.read(self.ser.in_waiting or 1)
+        return self.decoder.feed(chunk) if chunk else []
+
+
+class Gateway(Bridge):
+    """
+    A Bridge serving many serial devices from a single process.
+
+    All ports are multiplexed with a selector, while the REST clients and the MQTT
+    connection are shared. Each port is mapped to the ID of the vehicle connected to it,
+    so alarms received over MQTT are written to the right port.
+    """
+
+    def __init__(self):
+        self.devices = {}
+        self.selector = selectors.DefaultSelector()
+        super().__init__()
+
+    def setup_serial(self):
+        """Opens every port listed in [GATEWAY] PORTS and registers it with the selector."""
+        ports = parse_ports(self.config.get("GATEWAY", "PORTS", fallback=""))
+        for portname, vehicle_id in ports.items():
+            try:
+                print("\nConnecting to " + portname + " (vehicle " + str(vehicle_id) + ")\n")
+                ser = self.open_capture(serial.Serial(portname, 9600, timeout=0), '.' + str(vehicle_id))
+            except serial.SerialException:
+                print(f'\033[91mSetup failed: Unable to connect to {portname}. \nPlease check the port and update '
+                      f'the "PORTS" in the config.ini file if necessary.\n\033[0m')
+                continue
+            device = SerialDevice(portname, vehicle_id, ser)
+            self.devices[vehicle_id] = device
+            self.selector.register(ser.fileno(), selectors.EVENT_READ, device)
+        if len(self.devices) < len(ports):
+            self.print_available_ports()
+
+    def loop(self):
+        """Main loop: waits on all the ports at once and processes the frames of the ready ones."""
+        if self.devices:
+            self.start_workers()
+            while True:
+                for key, events in self.selector.select():
+                    for frame in key.data.read_frames():
+                        self.use_data(frame)
+        else:
+            print('\033[91mError on main loop: no serial connection has been established.\033[0m\n')
+
+    def local_vehicles(self):
+        """Returns the IDs of the vehicles of every port."""
+        return list(self.devices)
+
+    def handle_alert(self, vehicle_id, payload):
+        """
+        Handles an alert message received from MQTT, alarming the local vehicle it is addressed to.
+        """
+        alert = self.parse_alert(payload)
+        if alert is not None and vehicle_id in self.devices:
+            self.sendAlarm(vehicle_id)
+
+    def sendAlarm(self, vehicle_id=None):
+        """Writes the alarm signal to the port of the given vehicle."""
+        self.devices[vehicle_id].ser.write(b'$')
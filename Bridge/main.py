@@ -1,5 +1,18 @@
+import configparser
+
 from bridge import Bridge
+from gateway import Gateway
 
 if __name__ == '__main__':
-    bridge = Bridge()
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    # Gateway mode serves every port listed in [GATEWAY] PORTS from this single process
+    if config.get("GATEWAY", "PORTS", fallback="").strip():
+        bridge = Gateway()
+    elif config.get("BRIDGE", "RUNTIME", fallback="sync") == "async":
+        from async_bridge import AsyncBridge
+
+        bridge = AsyncBridge()
+    else:
+        bridge = Bridge()
     bridge.loop()
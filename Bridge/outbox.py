@@ -0,0 +1,191 @@
+# outbox.py
+
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from API import codec
+from pipeline import is_alert
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    vehicle_id INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_telemetry ON outbox (vehicle_id) WHERE kind = 'telemetry';
+CREATE INDEX IF NOT EXISTS outbox_alert ON outbox (seq) WHERE kind = 'alert';
+"""
+# The kinds are literals so that SQLite uses the partial indexes
+OLDEST_ALERTS = "SELECT seq, kind, payload FROM outbox WHERE kind = 'alert' ORDER BY seq LIMIT ?"
+OLDEST_TELEMETRY = "SELECT seq, kind, payload FROM outbox WHERE kind = 'telemetry' ORDER BY seq LIMIT ?"
+
+
+class Outbox:
+    """
+    Durable store-and-forward queue between the serial reader and the REST API.
+
+    Decoded frames are first written to a SQLite database in WAL mode, so they survive a server
+    outage or a Bridge restart. A background thread drains them in batches and deletes them once
+    sent, or once rejected as invalid: a 5xx answer or a network error keeps them queued. Alerts
+    are sent first, as soon as they are queued; telemetry follows in arrival order and waits up
+    to one interval so that it is sent in batches. Every frame supersedes the telemetry frame
+    still queued for the same vehicle, while alerts are always kept. When the server fails the
+    drain backs off with jitter, and after recovery it sends at most one batch per interval
+    instead of flooding the API.
+    """
+
+    def __init__(self, bridge, path, batch_size=50, interval=0.1, max_backoff=30.0):
+        """
+        Initializes the outbox.
+
+        Args:
+            bridge (Bridge): Bridge whose `process` method sends a frame to the server.
+            path (str): Path of the SQLite database.
+            batch_size (int): Maximum number of frames sent per batch.
+            interval (float): Seconds between two batches.
+            max_backoff (float): Upper bound, in seconds, of the retry delay after a failure.
+        """
+        self.bridge = bridge
+        self.path = os.path.abspath(path)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.local = threading.local()
+        self.wakeup = threading.Event()
+        self.alert_queued = threading.Event()
+        self.thread = None
+        self.sent = 0
+        self.failures = 0
+        self.connection().executescript(SCHEMA)
+
+    @classmethod
+    def from_config(cls, bridge, config):
+        """
+        Builds the outbox described by the [OUTBOX] section.
+
+        Returns:
+            Outbox: The outbox, or None if no PATH is configured.
+        """
+        path = config.get("OUTBOX", "PATH", fallback="")
+        if not path:
+            return None
+        return cls(bridge, path,
+                   batch_size=config.getint("OUTBOX", "BATCH_SIZE", fallback=50),
+                   interval=config.getfloat("OUTBOX", "INTERVAL", fallback=0.1),
+                   max_backoff=config.getfloat("OUTBOX", "MAX_BACKOFF", fallback=30.0))
+
+    def connection(self):
+        """Returns the SQLite connection of the calling thread."""
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def put(self, data):
+        """
+        Durably queues a decoded frame, replacing the telemetry frame still queued for its vehicle.
+
+        An alert replaces it too: it carries a newer state, and as it is sent first, that older
+        telemetry would otherwise overwrite it on the server.
+        """
+        kind = "alert" if is_alert(data) else "telemetry"
+        connection = self.connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("DELETE FROM outbox WHERE kind = 'telemetry' AND vehicle_id = ?", (data["id"],))
+            connection.execute("INSERT INTO outbox (kind, vehicle_id, payload, created) VALUES (?, ?, ?, ?)",
+                               (kind, data["id"], codec.dumps(data), time.time()))
+        if kind == "alert":
+            self.alert_queued.set()
+        self.wakeup.set()
+
+    def pending(self):
+        """Returns the number of queued frames."""
+        return self.connection().execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def start(self):
+        """Starts the drain thread."""
+        self.thread = threading.Thread(target=self.drain, daemon=True, name="outbox-drain")
+        self.thread.start()
+
+    def send_batch(self):
+        """
+        Sends the queued alerts, then the oldest telemetry frames, stopping at the first failure.
+
+        When the Bridge batches vehicle updates, the telemetry frames are sent together to the
+        batch endpoint, synchronously, so that they are only deleted once stored.
+
+        Returns:
+            tuple: (number of frames sent, True if a frame failed).
+        """
+        connection = self.connection()
+        rows = connection.execute(OLDEST_ALERTS, (self.batch_size,)).fetchall()
+        rows += connection.execute(OLDEST_TELEMETRY, (self.batch_size - len(rows),)).fetchall()
+        done = []
+        telemetry = []
+        failed = False
+        try:
+            for seq, kind, payload in rows:
+                data = codec.loads(payload)
+                if kind == "telemetry" and self.bridge.batcher:
+                    telemetry.append((seq, data))
+                    continue
+                # Raises on a 5xx answer: the frame stays queued
+                self.bridge.process(data)
+                done.append((seq,))
+            self.send_telemetry(telemetry, done)
+        except Exception as e:
+            print("Outbox: unable to send frame, will retry:", e)
+            failed = True
+        if done:
+            with connection:
+                connection.execute("BEGIN")
+                connection.executemany("DELETE FROM outbox WHERE seq = ?", done)
+        return len(done), failed
+
+    def send_telemetry(self, telemetry, done):
+        """Sends the collected telemetry frames in one batch request and marks them as done."""
+        if not telemetry:
+            return
+        status_code = self.bridge.vehicle_api.update_vehicles(
+            [self.bridge.solve_format_data(data) for seq, data in telemetry])
+        if status_code >= 500:
+            raise ConnectionError(f"batch rejected with status {status_code}")
+        if status_code != 200:
+            # Invalid states would be rejected forever: they are dropped
+            print("Outbox: batch of", len(telemetry), "frames rejected with status", status_code)
+        done.extend((seq,) for seq, data in telemetry)
+        telemetry.clear()
+
+    def drain(self):
+        """Drain thread body."""
+        backoff = self.interval
+        while True:
+            self.wakeup.clear()
+            self.alert_queued.clear()
+            sent, failed = self.send_batch()
+            self.sent += sent
+            if failed:
+                self.failures += 1
+                # Full jitter spreads the retries of many Bridges reconnecting at the same time
+                time.sleep(random.uniform(0, backoff))
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            backoff = self.interval
+            if sent < self.batch_size:
+                self.wakeup.wait()
+            # Telemetry waits for the interval to be batched, an alert cuts it short
+            self.alert_queued.wait(self.interval)
+
+    def join(self, poll=0.05):
+        """Blocks until the outbox is empty."""
+        while self.pending():
+            time.sleep(poll)
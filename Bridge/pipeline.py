@@ -0,0 +1,159 @@
+# pipeline.py
+
+import threading
+from collections import OrderedDict, defaultdict, deque
+
+BLOCK = "block"
+DROP_OLDEST = "drop-oldest"
+
+
+def is_alert(data):
+    """Returns True if the frame carries at least one alert flag."""
+    return data.get("s") == 1 or data.get("t") == 1 or data.get("u") == 1
+
+
+class FrameQueue:
+    """
+    Bounded queue of decoded frames with a priority lane for alerts.
+
+    Alert frames are always served before telemetry and are never dropped: when their lane is
+    full the producer waits. The telemetry lane holds at most one frame per vehicle: a newer frame
+    replaces the queued one, keeping its place in line. When the telemetry lane is full the producer
+    either waits (BLOCK) or discards the oldest queued telemetry frame (DROP_OLDEST).
+    """
+
+    def __init__(self, maxsize=100, policy=DROP_OLDEST):
+        if policy not in (BLOCK, DROP_OLDEST):
+            raise ValueError(f"Unknown back-pressure policy: {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.alerts = deque()
+        # vehicle ID -> latest telemetry frame not yet sent
+        self.telemetry = OrderedDict()
+        self.dropped = 0
+        self.coalesced = 0
+        # Frames queued or being processed
+        self.unfinished = 0
+        self.lock = threading.Lock()
+        self.not_full = threading.Condition(self.lock)
+        self.not_empty = threading.Condition(self.lock)
+        self.all_done = threading.Condition(self.lock)
+
+    def put(self, data):
+        """Queues a decoded frame, applying the back-pressure policy of its lane."""
+        alert = is_alert(data)
+        lane = self.alerts if alert else self.telemetry
+        with self.lock:
+            if not alert and data.get("id") in self.telemetry:
+                self.telemetry[data.get("id")] = data
+                self.coalesced += 1
+                return
+            if len(lane) >= self.maxsize:
+                if alert or self.policy == BLOCK:
+                    while len(lane) >= self.maxsize:
+                        self.not_full.wait()
+                else:
+                    self.telemetry.popitem(last=False)
+                    self.dropped += 1
+                    self.unfinished -= 1
+            self.unfinished += 1
+            if alert:
+                self.alerts.append(data)
+            else:
+                self.telemetry[data.get("id")] = data
+            self.not_empty.notify_all()
+
+    def get(self, alerts_only=False):
+        """
+        Removes and returns the next frame, alerts first.
+
+        Args:
+            alerts_only (bool): If True, waits for an alert frame and ignores telemetry.
+        """
+        with self.lock:
+            while not self.alerts and (alerts_only or not self.telemetry):
+                self.not_empty.wait()
+            data = self.alerts.popleft() if self.alerts else self.telemetry.popitem(last=False)[1]
+            self.not_full.notify_all()
+            return data
+
+    def task_done(self):
+        """Marks a frame returned by get as processed."""
+        with self.lock:
+            self.unfinished -= 1
+            if not self.unfinished:
+                self.all_done.notify_all()
+
+    def join(self):
+        """Blocks until every queued frame has been processed."""
+        with self.lock:
+            while self.unfinished:
+                self.all_done.wait()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.alerts) + len(self.telemetry)
+
+
+class Pipeline:
+    """
+    Worker stage between the serial reader and the REST dispatch.
+
+    The serial loop only decodes frames and puts them in a FrameQueue; a pool of worker threads
+    runs Bridge.process on them. Dedicated alert workers only serve the alert lane, so an alert
+    never waits behind a backlog of slow telemetry updates.
+    """
+
+    def __init__(self, bridge, workers=4, alert_workers=1, queue_size=100, policy=DROP_OLDEST):
+        self.bridge = bridge
+        self.workers = workers
+        self.alert_workers = alert_workers
+        self.queue = FrameQueue(queue_size, policy)
+        self.threads = []
+        # Frames of the same vehicle are never processed concurrently
+        self.vehicle_locks = defaultdict(threading.Lock)
+
+    @classmethod
+    def from_config(cls, bridge, config):
+        """
+        Builds the pipeline described by the [PIPELINE] section.
+
+        Returns:
+            Pipeline: The pipeline, or None if WORKERS is 0 and frames are processed inline.
+        """
+        workers = config.getint("PIPELINE", "WORKERS", fallback=0)
+        if workers <= 0:
+            return None
+        return cls(bridge, workers=workers,
+                   alert_workers=config.getint("PIPELINE", "ALERT_WORKERS", fallback=1),
+                   queue_size=config.getint("PIPELINE", "QUEUE_SIZE", fallback=100),
+                   policy=config.get("PIPELINE", "POLICY", fallback=DROP_OLDEST))
+
+    def start(self):
+        """Starts the worker threads."""
+        for i in range(self.workers + self.alert_workers):
+            alerts_only = i >= self.workers
+            thread = threading.Thread(target=self.work, args=(alerts_only,), daemon=True,
+                                      name=("alert-worker-" if alerts_only else "worker-") + str(i))
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, data):
+        """Queues a decoded frame; called by the serial reader."""
+        self.queue.put(data)
+
+    def join(self):
+        """Blocks until every submitted frame has been processed."""
+        self.queue.join()
+
+    def work(self, alerts_only):
+        """Worker thread body."""
+        while True:
+            data = self.queue.get(alerts_only)
+            try:
+                with self.vehicle_locks[data.get("id")]:
+                    self.bridge.process(data)
+            except Exception as e:
+                print("Error while processing frame:", e)
+            finally:
+                self.queue.task_done()
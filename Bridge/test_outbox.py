@@ -0,0 +1,121 @@
+import os
+import tempfile
+import unittest
+
+from outbox import Outbox
+
+
+def frame(vehicle_id, temperature, alert=False):
+    return {"id": vehicle_id, "latitude": 44.6, "longitude": 10.9, "smoke": 100, "temperature": temperature,
+            "humidity": 40, "s": int(alert), "t": 0, "u": 0}
+
+
+class StubBridge:
+    """Stands in for the Bridge and its REST clients, recording what the outbox sends."""
+
+    def __init__(self):
+        self.batcher = None
+        self.vehicle_api = self
+        self.processed = []
+        self.batches = []
+        self.batch_status = 200
+        # Number of frames processed before `process` fails like a 5xx answer, None to never fail
+        self.fail_after = None
+
+    def process(self, data):
+        if self.fail_after is not None and len(self.processed) >= self.fail_after:
+            raise ConnectionError("server answered with status 503")
+        self.processed.append(data)
+
+    def solve_format_data(self, data):
+        return {key: value for key, value in data.items() if key not in ("s", "t", "u")}
+
+    def update_vehicles(self, states):
+        self.batches.append(states)
+        return self.batch_status
+
+
+class OutboxTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "outbox.sqlite3")
+        self.bridge = StubBridge()
+        self.outbox = Outbox(self.bridge, self.path, batch_size=10)
+
+    def queued(self, outbox=None):
+        rows = (outbox or self.outbox).connection().execute("SELECT kind, vehicle_id FROM outbox ORDER BY seq")
+        return rows.fetchall()
+
+    def test_telemetry_supersedes_queued_telemetry_of_the_same_vehicle(self):
+        self.outbox.put(frame(1, 20))
+        self.outbox.put(frame(2, 20))
+        self.outbox.put(frame(1, 21))
+        self.assertEqual(self.queued(), [("telemetry", 2), ("telemetry", 1)])
+        self.outbox.send_batch()
+        self.assertEqual([(data["id"], data["temperature"]) for data in self.bridge.processed], [(2, 20), (1, 21)])
+
+    def test_alerts_are_kept_and_replace_queued_telemetry(self):
+        self.outbox.put(frame(1, 20))
+        self.outbox.put(frame(1, 90, alert=True))
+        self.outbox.put(frame(1, 91, alert=True))
+        self.outbox.put(frame(1, 22))
+        self.assertEqual(self.queued(), [("alert", 1), ("alert", 1), ("telemetry", 1)])
+
+    def test_alerts_are_sent_before_older_telemetry(self):
+        self.outbox.put(frame(1, 20))
+        self.outbox.put(frame(2, 20))
+        self.outbox.put(frame(3, 90, alert=True))
+        self.outbox.put(frame(4, 91, alert=True))
+        self.assertEqual(self.outbox.send_batch(), (4, False))
+        self.assertEqual([data["id"] for data in self.bridge.processed], [3, 4, 1, 2])
+        self.assertEqual(self.outbox.pending(), 0)
+
+    def test_alerts_fill_the_batch_first(self):
+        outbox = Outbox(self.bridge, self.path, batch_size=2)
+        outbox.put(frame(1, 20))
+        outbox.put(frame(2, 90, alert=True))
+        outbox.put(frame(3, 91, alert=True))
+        outbox.send_batch()
+        self.assertEqual([data["id"] for data in self.bridge.processed], [2, 3])
+        self.assertEqual(self.queued(outbox), [("telemetry", 1)])
+
+    def test_failed_frames_stay_queued_and_are_replayed_after_a_restart(self):
+        self.outbox.put(frame(1, 90, alert=True))
+        self.outbox.put(frame(2, 20))
+        self.outbox.put(frame(3, 20))
+        self.bridge.fail_after = 1
+        self.assertEqual(self.outbox.send_batch(), (1, True))
+        self.assertEqual(self.queued(), [("telemetry", 2), ("telemetry", 3)])
+
+        # A new Bridge process opens the same database and sends what the previous one left
+        self.outbox.connection().close()
+        bridge = StubBridge()
+        restarted = Outbox(bridge, self.path, batch_size=10)
+        self.assertEqual(restarted.pending(), 2)
+        self.assertEqual(restarted.send_batch(), (2, False))
+        self.assertEqual([data["id"] for data in bridge.processed], [2, 3])
+        self.assertEqual(restarted.pending(), 0)
+
+    def test_batched_telemetry_is_deleted_only_once_stored(self):
+        self.bridge.batcher = object()
+        self.outbox.put(frame(1, 20))
+        self.outbox.put(frame(2, 90, alert=True))
+        self.bridge.batch_status = 503
+        self.assertEqual(self.outbox.send_batch(), (1, True))
+        self.assertEqual(self.queued(), [("telemetry", 1)])
+        self.bridge.batch_status = 200
+        self.assertEqual(self.outbox.send_batch(), (1, False))
+        self.assertEqual([[state["id"] for state in batch] for batch in self.bridge.batches], [[1], [1]])
+        self.assertEqual(self.outbox.pending(), 0)
+
+    def test_batch_rejected_as_invalid_is_dropped(self):
+        self.bridge.batcher = object()
+        self.bridge.batch_status = 400
+        self.outbox.put(frame(1, 20))
+        self.assertEqual(self.outbox.send_batch(), (1, False))
+        self.assertEqual(self.outbox.pending(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+import itertools
+
+from django.core.cache.backends.filebased import FileBasedCache
+
+# Writes between two checks of the number of entries
+CULL_EVERY = 1000
+
+
+class SharedFileCache(FileBasedCache):
+    """
+    File-based cache shared by the processes of a host, for the neighbor cache.
+
+    FileBasedCache lists its whole directory on every write to check MAX_ENTRIES, which takes
+    longer than the write itself once it holds an entry per vehicle. This one checks it every
+    CULL_EVERY writes of a process, so a cache can exceed MAX_ENTRIES by that many writes per
+    process before it is culled.
+    """
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._writes = itertools.count(1)
+
+    def _cull(self):
+        if next(self._writes) % CULL_EVERY == 0:
+            super()._cull()
@@ -0,0 +1,38 @@
+import paho.mqtt.client as mqtt
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from REST.telemetry import TelemetryConsumer
+
+
+class Command(BaseCommand):
+    help = "Consumes the vehicle telemetry published over MQTT and writes it to the database in micro-batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default=settings.MQTT_SERVER, help="MQTT broker address")
+        parser.add_argument('--port', type=int, default=settings.MQTT_PORT, help="MQTT broker port")
+        parser.add_argument('--topic', default=settings.TELEMETRY_TOPIC,
+                            help="Telemetry topic prefix; the command subscribes to <topic>/+")
+        parser.add_argument('--batch-size', type=int, default=500, help="Maximum messages written per batch")
+        parser.add_argument('--interval', type=float, default=0.2, help="Maximum seconds between two batches")
+        parser.add_argument('--report-every', type=float, default=10,
+                            help="Seconds between two stats lines (throughput, backlog and lag)")
+
+    def handle(self, *args, **options):
+        consumer = TelemetryConsumer(options['batch_size'], options['interval'])
+        topic = options['topic'] + '/+'
+
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        # Subscribing on every (re)connection keeps the subscription after a broker restart
+        client.on_connect = lambda client, userdata, flags, rc, properties=None: client.subscribe(topic, qos=1)
+        client.on_message = consumer.on_message
+        client.connect(options['host'], options['port'], 60)
+        client.loop_start()
+        self.stdout.write(f"Consuming {topic} from {options['host']}:{options['port']}")
+        try:
+            consumer.run(report_every=options['report_every'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            client.loop_stop()
+            client.disconnect()
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 04:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('REST', '0018_rename_umidity_alert_humidity_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='cell',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+    ]
@@ -0,0 +1,34 @@
+import math
+
+from django.db import migrations
+
+# The grid of REST/spatial.py when the `cell` column was added, frozen here so that a later
+# change of the grid does not change what this migration wrote
+CELL_SIZE = 0.1
+ROWS = 1800
+COLUMNS = 3600
+
+
+def cell_of(latitude, longitude):
+    row = min(max(math.floor((latitude + 90) / CELL_SIZE), 0), ROWS - 1)
+    column = math.floor(((longitude + 180) % 360) / CELL_SIZE) % COLUMNS
+    return row * COLUMNS + column
+
+
+def populate_cells(apps, schema_editor):
+    Vehicle = apps.get_model('REST', 'Vehicle')
+    vehicles = list(Vehicle.objects.only('id', 'latitude', 'longitude'))
+    for vehicle in vehicles:
+        vehicle.cell = cell_of(vehicle.latitude, vehicle.longitude)
+    Vehicle.objects.bulk_update(vehicles, ['cell'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('REST', '0019_vehicle_cell'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_cells, migrations.RunPython.noop),
+    ]
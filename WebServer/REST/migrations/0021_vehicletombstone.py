@@ -0,0 +1,22 @@
+# Generated by Django 5.0.2 on 2026-10-18 04:32
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('REST', '0020_populate_vehicle_cell'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VehicleTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vehicle_id', models.IntegerField()),
+                ('deleted_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
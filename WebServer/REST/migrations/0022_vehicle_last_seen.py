@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-18 04:42
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('REST', '0021_vehicletombstone'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='vehicle',
+            name='last_update',
+        ),
+        migrations.AddField(
+            model_name='vehicle',
+            name='last_seen',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,9 +1,12 @@
-import geopy
-import geopy.distance
+import math
+
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
+from REST import neighbor_cache, spatial_index
+from REST.spatial import cell_of
+
 
 class Contact(models.Model):
     """
@@ -24,6 +27,29 @@ class User(AbstractUser):
     contacts = models.ManyToManyField('Contact', related_name='alert_contacts')
 
 
+def percentage_difference(value, reference):
+    """
+    Returns the difference between a value and a reference, as a percentage of the reference.
+
+    A zero reference gives 0 if the value is zero as well, infinity otherwise.
+    """
+    if reference == 0:
+        return 0.0 if value == 0 else math.inf
+    return abs((value - reference) / reference) * 100
+
+
+class VehicleQuerySet(models.QuerySet):
+    def active(self, ttl=None):
+        """
+        Returns the vehicles seen within the liveness TTL.
+
+        Args:
+            ttl (float, optional): TTL in seconds, VEHICLE_TTL by default. A TTL of None or 0 keeps every vehicle.
+        """
+        since = spatial_index.active_since(ttl)
+        return self if since is None else self.filter(last_seen__gte=since)
+
+
 class Vehicle(models.Model):
     """
     Model to store vehicle information.
@@ -34,14 +60,70 @@ class Vehicle(models.Model):
         longitude (FloatField): Longitude coordinate of the vehicle.
         smoke (FloatField): Smoke level detected by the vehicle.
         temperature (FloatField): Temperature recorded by the vehicle.
+        last_seen (DateTimeField): When the vehicle last sent its state or moved, indexed to select the active
+            fleet and the rows to sync into the spatial index.
+        cell (IntegerField): Grid cell of the position, indexed to find nearby vehicles (see spatial.py).
     """
     id = models.IntegerField(primary_key=True)
     latitude = models.FloatField(default=0)
     longitude = models.FloatField(default=0)
     smoke = models.FloatField(default=0)
     temperature = models.FloatField(default=0)
-    last_update = models.TimeField(default=timezone.now)
+    last_seen = models.DateTimeField(default=timezone.now, db_index=True)
     humidity = models.FloatField(default=0)
+    cell = models.IntegerField(default=0, db_index=True)
+
+    objects = VehicleQuerySet.as_manager()
+
+    # Fields written by a state update
+    STATE_FIELDS = ['latitude', 'longitude', 'smoke', 'temperature', 'humidity']
+
+    @classmethod
+    def bulk_upsert(cls, states):
+        """
+        Creates or updates many vehicles with a single query.
+
+        Args:
+            states (iterable): Validated vehicle states, dictionaries with `id` and the STATE_FIELDS.
+                If an ID appears more than once, its last state wins.
+
+        Returns:
+            int: The number of vehicles written.
+        """
+        now = timezone.now()
+        latest = {state['id']: state for state in states}
+        vehicles = [cls(last_seen=now, cell=cell_of(state['latitude'], state['longitude']), **state)
+                    for state in latest.values()]
+        cls.objects.bulk_create(vehicles, update_conflicts=True, unique_fields=['id'],
+                                update_fields=cls.STATE_FIELDS + ['last_seen', 'cell'])
+        saved = [(vehicle.id, vehicle.latitude, vehicle.longitude, now) for vehicle in vehicles]
+        spatial_index.record_changes(saved=saved)
+        neighbor_cache.record_changes(saved=saved)
+        return len(vehicles)
+
+    def save(self, *args, **kwargs):
+        self.cell = cell_of(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        moved = update_fields is None or not {'latitude', 'longitude'}.isdisjoint(update_fields)
+        indexed = moved or 'last_seen' in update_fields
+        if moved:
+            # The spatial indexes of other processes find the moved vehicles by their last_seen
+            self.last_seen = timezone.now()
+        if update_fields is not None and indexed:
+            kwargs['update_fields'] = set(update_fields) | {'cell', 'last_seen'}
+        super().save(*args, **kwargs)
+        if indexed:
+            saved = [(self.id, self.latitude, self.longitude, self.last_seen)]
+            spatial_index.record_changes(saved=saved)
+            neighbor_cache.record_changes(saved=saved)
+
+    def delete(self, *args, **kwargs):
+        vehicle_id = self.id
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            spatial_index.record_changes(deleted=[vehicle_id])
+            neighbor_cache.record_changes(deleted=[vehicle_id])
+        return result
 
     def get_vehicles_in_range(self, radius):
         """
@@ -54,14 +136,14 @@ class Vehicle(models.Model):
             list: A list containing the vehicles within the specified radius.
         """
 
-        vehicles_in_range = []
-        for vehicle in Vehicle.objects.exclude(pk=self.id):
-            vehicle_point = (vehicle.latitude, vehicle.longitude)
-            distance = geopy.distance.geodesic((self.latitude, self.longitude), vehicle_point).kilometers
-            if distance <= radius:
-                vehicles_in_range.append(vehicle)
+        neighbors = spatial_index.neighbors(self.latitude, self.longitude, radius, exclude=self.id)
+        return Vehicle.in_order([vehicle_id for vehicle_id, vehicle_distance in neighbors])
 
-        return vehicles_in_range
+    @classmethod
+    def in_order(cls, ids):
+        """Returns the vehicles with the given IDs, in the same order, skipping the missing ones."""
+        vehicles = cls.objects.in_bulk(ids) if ids else {}
+        return [vehicles[vehicle_id] for vehicle_id in ids if vehicle_id in vehicles]
 
 
 class Alert(models.Model):
@@ -92,6 +174,34 @@ class Alert(models.Model):
     t = models.BooleanField(default=0)
     u = models.BooleanField(default=0)
 
+    def evaluate_neighborhood(self, radius, threshold_percentage=0):
+        """
+        Finds the vehicles around the alert and decides whether it is suppressed, in one pass.
+
+        The neighbors are searched once and only their readings are loaded. The alert is suppressed
+        when a neighbor has a temperature or smoke value similar to the alert's.
+
+        Args:
+            radius (float): The radius within which to search for neighboring vehicles (in kilometers).
+            threshold_percentage (float): The percentage threshold for similarity comparison.
+
+        Returns:
+            tuple: (True if neighboring vehicles have similar values, IDs of the vehicles in range, nearest first)
+        """
+        neighbors = spatial_index.neighbors(self.latitude, self.longitude, radius, exclude=self.sender_id)
+        vehicle_ids = [vehicle_id for vehicle_id, vehicle_distance in neighbors]
+        if not vehicle_ids:
+            return False, []
+        readings = Vehicle.objects.filter(pk__in=vehicle_ids).values_list('id', 'temperature', 'smoke')
+        present = set()
+        for vehicle_id, temperature, smoke in readings:
+            if (percentage_difference(temperature, self.temperature) <= threshold_percentage
+                    or percentage_difference(smoke, self.smoke) <= threshold_percentage):
+                return True, vehicle_ids
+            present.add(vehicle_id)
+        # A vehicle deleted since the index was synced is not a receiver
+        return False, [vehicle_id for vehicle_id in vehicle_ids if vehicle_id in present]
+
     def check_neighboring_vehicles(self, radius, threshold_percentage=0):
         """
         Check neighboring vehicles for similar temperature and smoke values.
@@ -103,18 +213,7 @@ class Alert(models.Model):
         Returns:
             bool: True if neighboring vehicles have similar values, False otherwise.
         """
-        alert_point = (self.latitude, self.longitude)
-
-        for vehicle in Vehicle.objects.exclude(pk=self.sender.id):
-            vehicle_point = (vehicle.latitude, vehicle.longitude)
-            distance = geopy.distance.geodesic(alert_point, vehicle_point).kilometers
-            if distance <= radius:
-                temperature_difference = abs((vehicle.temperature - self.temperature) / self.temperature) * 100
-                smoke_difference = abs((vehicle.smoke - self.smoke) / self.smoke) * 100
-                if temperature_difference <= threshold_percentage or smoke_difference <= threshold_percentage:
-                    return True
-
-        return False
+        return self.evaluate_neighborhood(radius, threshold_percentage)[0]
 
     def get_vehicles_in_range(self, radius):
         """
@@ -127,11 +226,18 @@ class Alert(models.Model):
             list: A list containing the vehicles within the specified radius.
         """
 
-        vehicles_in_range = []
-        for vehicle in Vehicle.objects.exclude(pk=self.sender.id):
-            vehicle_point = (vehicle.latitude, vehicle.longitude)
-            distance = geopy.distance.geodesic((self.latitude, self.longitude), vehicle_point).kilometers
-            if distance <= radius:
-                vehicles_in_range.append(vehicle)
+        neighbors = spatial_index.neighbors(self.latitude, self.longitude, radius, exclude=self.sender_id)
+        return Vehicle.in_order([vehicle_id for vehicle_id, vehicle_distance in neighbors])
+
 
-        return vehicles_in_range
+class VehicleTombstone(models.Model):
+    """
+    Deletion of a vehicle, kept for a while so that the spatial index of every process can
+    drop the vehicle at its next sync (see spatial_index.py).
+
+    Attributes:
+        vehicle_id (IntegerField): ID of the deleted vehicle.
+        deleted_at (DateTimeField): When the vehicle was deleted, indexed for the syncs.
+    """
+    vehicle_id = models.IntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
@@ -0,0 +1,235 @@
+import math
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from REST import spatial_index
+from REST.spatial import KM_PER_DEGREE, bounding_box, cell_of, cells_in_box
+
+# Sides of the cells whose generations invalidate the cached neighbor sets, in degrees, from the
+# finest (about 5.5 km) to the coarsest: a move updates its cells at every level, and a set uses
+# the finest level whose cells around it are at most MAX_GENERATION_CELLS
+GENERATION_CELL_SIZES = (0.05, 0.4, 3.2)
+# Above this many cells at the coarsest level (a radius over about 1000 km) a set is not cached
+MAX_GENERATION_CELLS = 64
+
+KEY_PREFIX = 'neighbors'
+COUNTERS = ('hits', 'misses', 'invalidations')
+# Seconds during which a process adds up its counters before writing them to the cache
+COUNTERS_FLUSH_INTERVAL = 1.0
+
+_pending_counts = Counter()
+_pending_lock = threading.Lock()
+_flushed_at = 0.0
+
+
+def get_cache():
+    """Returns the cache of the neighbor sets, or None if NEIGHBOR_CACHE is not set."""
+    return caches[settings.NEIGHBOR_CACHE] if settings.NEIGHBOR_CACHE else None
+
+
+def moved(position, other, epsilon):
+    """Tells whether two (latitude, longitude) positions are more than epsilon km apart."""
+    delta_longitude = (other[1] - position[1] + 180) % 360 - 180
+    x = delta_longitude * math.cos(math.radians((position[0] + other[0]) / 2))
+    return math.hypot(other[0] - position[0], x) * KM_PER_DEGREE > epsilon
+
+
+def _generation_key(level, cell):
+    return f'{KEY_PREFIX}:generation:{level}:{cell}'
+
+
+def _generation_keys(latitude, longitude, radius):
+    box = bounding_box(latitude, longitude, radius + settings.NEIGHBOR_CACHE_EPSILON)
+    for level, cell_size in enumerate(GENERATION_CELL_SIZES):
+        cells = cells_in_box(box, cell_size, MAX_GENERATION_CELLS)
+        if cells is not None:
+            return [_generation_key(level, cell) for cell in cells]
+    return None
+
+
+def _generations(cache, keys):
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # A generation is the time of the last move in its cell, unknown once evicted
+            cache.add(key, time.time(), timeout=None)
+            generations[key] = cache.get(key)
+    return generations
+
+
+def _timeout(generations):
+    """Returns how long to keep a neighbor set computed after the moves of these generations."""
+    if not settings.SPATIAL_INDEX:
+        # The neighbors were read from the database
+        return settings.NEIGHBOR_CACHE_TIMEOUT
+    synced = spatial_index.get_index().synced
+    # The margin covers the clock skew between processes, as the overlap of the index syncs does
+    if synced is not None and max(generations.values()) < synced.timestamp() - spatial_index.SYNC_OVERLAP:
+        return settings.NEIGHBOR_CACHE_TIMEOUT
+    # A move of another process may be missing from the index until its next sync
+    return min(settings.NEIGHBOR_CACHE_TIMEOUT, settings.SPATIAL_INDEX_SYNC_INTERVAL)
+
+
+def _count(cache, counter, amount=1):
+    with _pending_lock:
+        _pending_counts[counter] += amount
+    if time.monotonic() - _flushed_at >= COUNTERS_FLUSH_INTERVAL:
+        _flush_counts(cache)
+
+
+def _flush_counts(cache):
+    """Adds the counts of this process to the counters of the cache, a write per counter."""
+    global _flushed_at
+    with _pending_lock:
+        counts = dict(_pending_counts)
+        _pending_counts.clear()
+        _flushed_at = time.monotonic()
+    for counter, amount in counts.items():
+        key = f'{KEY_PREFIX}:{counter}'
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            if not cache.add(key, amount, timeout=None):
+                cache.incr(key, amount)
+
+
+def neighbors(vehicle_id, latitude, longitude, radius):
+    """
+    Finds the active vehicles within a radius of a vehicle, from the cache when possible.
+
+    A cached neighbor set holds the position it was computed from and the generations of the
+    cells around it (the radius plus NEIGHBOR_CACHE_EPSILON). It is reused as long as the vehicle
+    is within NEIGHBOR_CACHE_EPSILON of that position and no vehicle moved in those cells, see
+    `record_changes`; so the set is the exact one for positions off by at most the epsilon.
+    Vehicles that become inactive may stay in a set for NEIGHBOR_CACHE_TIMEOUT seconds.
+
+    The spatial index of this process catches up with the writes of other processes only every
+    SPATIAL_INDEX_SYNC_INTERVAL, so a set computed while a move around it may be missing from
+    the index is kept for that interval only, and is never staler than an uncached search.
+
+    Args:
+        vehicle_id (int): ID of the vehicle, left out of its neighbors.
+        latitude (float): Current latitude of the vehicle in degrees.
+        longitude (float): Current longitude of the vehicle in degrees.
+        radius (float): Radius in kilometers.
+
+    Returns:
+        list: (vehicle ID, distance in kilometers) tuples, nearest first.
+    """
+    cache = get_cache()
+    if cache is None:
+        return spatial_index.neighbors(latitude, longitude, radius, exclude=vehicle_id)
+    key = f'{KEY_PREFIX}:{vehicle_id}:{radius}'
+    entry = cache.get(key)
+    if entry is not None:
+        position, generations, found = entry
+        if (not moved(position, (latitude, longitude), settings.NEIGHBOR_CACHE_EPSILON)
+                and cache.get_many(list(generations)) == generations):
+            _count(cache, 'hits')
+            return found
+    _count(cache, 'misses')
+    keys = _generation_keys(latitude, longitude, radius)
+    # The generations are read before the neighbors: a move in between makes the entry stale
+    generations = _generations(cache, keys) if keys is not None else None
+    found = spatial_index.neighbors(latitude, longitude, radius, exclude=vehicle_id)
+    if generations is not None:
+        cache.set(key, ((latitude, longitude), generations, found), timeout=_timeout(generations))
+    return found
+
+
+def record_changes(saved=(), deleted=()):
+    """
+    Invalidates the neighbor sets around the vehicles that moved, once the write commits.
+
+    Every vehicle has an anchor, the position at which it last invalidated the cache. When a
+    write moves it more than NEIGHBOR_CACHE_EPSILON away from its anchor, or it has none (a new
+    vehicle, or one that was inactive for VEHICLE_TTL), the generations of the cells of the
+    anchor and of the new position, at every level, are set to the current time and the anchor
+    moves to the new position. Vehicles parked or moving within the epsilon invalidate nothing.
+    Setting rather than incrementing keeps the generations exact on backends where `incr` is
+    not atomic, such as the file-based cache shared by the worker processes. All the vehicles
+    of a write, such as a batch upsert, are handled together: one read of their anchors and one
+    write of the anchors and one of the generations.
+
+    The write is committed when the cache is updated, so a cache error is printed instead of
+    failing the request; the sets around the write may then be stale for NEIGHBOR_CACHE_TIMEOUT.
+
+    Args:
+        saved (list): (vehicle ID, latitude, longitude, last seen) of the written vehicles.
+        deleted (list): IDs of the deleted vehicles.
+    """
+    cache = get_cache()
+    if cache is None:
+        return
+
+    def invalidate():
+        try:
+            _invalidate(cache, saved, deleted)
+        except Exception as e:
+            print(f"Neighbor cache invalidation failed: {e}")
+
+    transaction.on_commit(invalidate)
+
+
+def _invalidate(cache, saved, deleted):
+    anchor_keys = {vehicle_id: f'{KEY_PREFIX}:anchor:{vehicle_id}' for vehicle_id, *_ in saved}
+    anchor_keys.update((vehicle_id, f'{KEY_PREFIX}:anchor:{vehicle_id}') for vehicle_id in deleted)
+    anchors = cache.get_many(list(anchor_keys.values()))
+    epsilon = settings.NEIGHBOR_CACHE_EPSILON
+    now = time.time()
+    # An anchor, (latitude, longitude, when it was written), is rewritten once half of VEHICLE_TTL
+    # old so that it expires no later than the vehicle; in between a parked vehicle writes nothing
+    refresh_before = now - settings.VEHICLE_TTL / 2 if settings.VEHICLE_TTL else None
+    cells = set()
+    updated = {}
+    invalidations = 0
+    for vehicle_id, latitude, longitude, _ in saved:
+        anchor = anchors.get(anchor_keys[vehicle_id])
+        if anchor is None or moved(anchor, (latitude, longitude), epsilon):
+            if anchor is not None:
+                cells.update(_cells_of(anchor[0], anchor[1]))
+            cells.update(_cells_of(latitude, longitude))
+            updated[anchor_keys[vehicle_id]] = (latitude, longitude, now)
+            invalidations += 1
+        elif refresh_before is not None and anchor[2] < refresh_before:
+            updated[anchor_keys[vehicle_id]] = (anchor[0], anchor[1], now)
+    for vehicle_id in deleted:
+        anchor = anchors.get(anchor_keys[vehicle_id])
+        if anchor is not None:
+            cells.update(_cells_of(anchor[0], anchor[1]))
+            invalidations += 1
+    if updated:
+        cache.set_many(updated, timeout=settings.VEHICLE_TTL or None)
+    if deleted:
+        cache.delete_many([anchor_keys[vehicle_id] for vehicle_id in deleted])
+    if cells:
+        cache.set_many({_generation_key(level, cell): now for level, cell in cells}, timeout=None)
+    if invalidations:
+        _count(cache, 'invalidations', invalidations)
+
+
+def _cells_of(latitude, longitude):
+    return [(level, cell_of(latitude, longitude, cell_size))
+            for level, cell_size in enumerate(GENERATION_CELL_SIZES)]
+
+
+def stats():
+    """
+    Returns the hit, miss and invalidation counters of the cache, and its hit rate.
+
+    Every process writes its counts at most every COUNTERS_FLUSH_INTERVAL seconds, and they are
+    approximate when the backend's `incr` is not atomic across processes, as with the file backend.
+    """
+    cache = get_cache()
+    if cache is None:
+        return {"enabled": False}
+    _flush_counts(cache)
+    counters = cache.get_many([f'{KEY_PREFIX}:{counter}' for counter in COUNTERS])
+    result = {counter: counters.get(f'{KEY_PREFIX}:{counter}', 0) for counter in COUNTERS}
+    lookups = result['hits'] + result['misses']
+    return {"enabled": True, **result, "hit_rate": result['hits'] / lookups if lookups else None}
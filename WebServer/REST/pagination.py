@@ -0,0 +1,104 @@
+import json
+
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from rest_framework import status
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Rows fetched per query while streaming
+STREAM_CHUNK_SIZE = 500
+
+
+def wants_pagination(request):
+    """Tell whether a list request asks for a page or a stream instead of the whole table.
+
+    Args:
+        request: The request object.
+
+    Returns:
+        bool: True if `cursor`, `limit` or `stream` is in the query string.
+    """
+    return any(param in request.GET for param in ('cursor', 'limit', 'stream'))
+
+
+def parse_int(value, default):
+    """Parse a non-negative integer query parameter, or raise ValueError."""
+    if value is None or value == '':
+        return default
+    number = int(value)
+    if number < 0:
+        raise ValueError(value)
+    return number
+
+
+def parse_cursor(value):
+    """Parse the `cursor` query parameter, any integer key, or raise ValueError."""
+    if value is None or value == '':
+        return None
+    return int(value)
+
+
+def keyset_chunks(queryset, fields, cursor, limit):
+    """Yield rows in primary key order, one query per chunk.
+
+    Each query starts after the last primary key seen (keyset pagination), so the cost of a
+    chunk does not depend on its position in the table and no database cursor stays open.
+
+    Args:
+        queryset: Rows to list.
+        fields (list): Fields of each row, as in the serializer.
+        cursor (int, optional): Primary key after which to start, None to start from the first row.
+        limit (int, optional): Maximum number of rows, None for all.
+
+    Yields:
+        tuple: (primary key, dict of fields) for every row.
+    """
+    sent = 0
+    while limit is None or sent < limit:
+        size = STREAM_CHUNK_SIZE if limit is None else min(STREAM_CHUNK_SIZE, limit - sent)
+        chunk = queryset if cursor is None else queryset.filter(pk__gt=cursor)
+        rows = list(chunk.order_by('pk').values('pk', *fields)[:size])
+        for row in rows:
+            cursor = row.pop('pk')
+            yield cursor, row
+        sent += len(rows)
+        if len(rows) < size:
+            return
+
+
+def paginated_response(request, queryset, fields):
+    """Build a page or a JSON-lines stream of a list endpoint.
+
+    `?cursor=<key>&limit=<n>` returns `{"results": [...], "next": <key or null>}`, where `next`
+    is the cursor of the following page. `?stream=1` returns every row after `cursor` as
+    `application/x-ndjson`, one JSON object per line, with constant memory on the server.
+
+    Args:
+        request: The request object.
+        queryset: Rows to list.
+        fields (list): Fields of each row, as in the serializer.
+
+    Returns:
+        HttpResponse: The page, the stream, or 400 if a parameter is invalid.
+    """
+    try:
+        cursor = parse_cursor(request.GET.get('cursor'))
+        limit = min(max(parse_int(request.GET.get('limit'), PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return HttpResponse(status=status.HTTP_400_BAD_REQUEST)
+
+    if request.GET.get('stream') in ('1', 'true', 'yes'):
+        lines = (json.dumps(row) + '\n' for key, row in keyset_chunks(queryset, fields, cursor, None))
+        return StreamingHttpResponse(lines, content_type='application/x-ndjson', status=status.HTTP_200_OK)
+
+    results = []
+    next_cursor = None
+    for key, row in keyset_chunks(queryset, fields, cursor, limit + 1):
+        if len(results) == limit:
+            # A row after the page exists: the page ends at the previous key
+            break
+        results.append(row)
+        next_cursor = key
+    else:
+        next_cursor = None
+    return JsonResponse({"results": results, "next": next_cursor}, status=status.HTTP_200_OK)
@@ -0,0 +1,146 @@
+import json
+import queue
+import random
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+from django.conf import settings
+from django.db import transaction
+
+
+class AlertPublisher:
+    """
+    Publishes alerts to MQTT from a background thread.
+
+    Requests only enqueue the alert, so they never wait for the broker. The thread keeps one
+    connection open (paho reconnects it on its own) and publishes the alert once on the topic
+    of every receiver, `<topic>/<vehicle ID>`. While the broker is unreachable the alerts wait
+    in the queue and are retried with jittered exponential backoff; when the queue is full new
+    alerts are dropped and counted.
+    """
+
+    def __init__(self, host, port, topic, queue_size=10000, max_backoff=30.0):
+        """
+        Initializes the publisher.
+
+        Args:
+            host (str): MQTT broker address.
+            port (int): MQTT broker port.
+            topic (str): Prefix of the alert topics.
+            queue_size (int): Maximum number of alerts waiting to be published.
+            max_backoff (float): Upper bound, in seconds, of the retry delay.
+        """
+        self.host = host
+        self.port = port
+        self.topic = topic
+        self.max_backoff = max_backoff
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.connected = threading.Event()
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.thread = None
+        self.published = 0
+        self.retries = 0
+        self.dropped = 0
+
+    def on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if not reason_code.is_failure:
+            self.connected.set()
+
+    def on_disconnect(self, client, userdata, flags, reason_code, properties=None):
+        self.connected.clear()
+
+    def start(self):
+        """Connects to the broker in the background and starts the publishing thread."""
+        self.client.connect_async(self.host, self.port, 60)
+        self.client.loop_start()
+        self.thread = threading.Thread(target=self.run, daemon=True, name="alert-publisher")
+        self.thread.start()
+
+    def enqueue(self, receivers, message):
+        """
+        Queues an alert for publication.
+
+        Args:
+            receivers (list): IDs of the vehicles to alarm.
+            message (dict): Alert metadata, sent as JSON.
+        """
+        try:
+            self.queue.put_nowait((receivers, message))
+        except queue.Full:
+            self.dropped += 1
+            print("Alert publisher queue full: alert dropped")
+
+    def publish(self, receivers, payload):
+        """
+        Publishes a payload on the topic of every receiver.
+
+        Returns:
+            list: The receivers whose message could not be handed to the client.
+        """
+        failed = []
+        for vehicle_id in receivers:
+            info = self.client.publish(f"{self.topic}/{vehicle_id}", payload, qos=1)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                failed.append(vehicle_id)
+        return failed
+
+    def run(self):
+        """Publishing thread body."""
+        while True:
+            receivers, message = self.queue.get()
+            payload = json.dumps(message).encode()
+            backoff = 0.1
+            while True:
+                if self.connected.wait(timeout=backoff):
+                    receivers = self.publish(receivers, payload)
+                    if not receivers:
+                        break
+                self.retries += 1
+                time.sleep(random.uniform(0, backoff))
+                backoff = min(backoff * 2, self.max_backoff)
+            self.published += 1
+            self.queue.task_done()
+
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def get_publisher():
+    """Returns the publisher of the process, started on first use."""
+    global _publisher
+    with _publisher_lock:
+        if _publisher is None:
+            _publisher = AlertPublisher(settings.MQTT_SERVER, settings.MQTT_PORT, settings.ALERT_TOPIC)
+            _publisher.start()
+        return _publisher
+
+
+def publish_alert(alert, receiver_ids):
+    """
+    Schedules the publication of an alert to its receivers once the current transaction commits.
+
+    Args:
+        alert (Alert): The alert, already saved.
+        receiver_ids (list): IDs of the vehicles receiving the alert.
+    """
+    if not settings.ALERT_FANOUT or not receiver_ids:
+        return
+    receiver_ids = list(receiver_ids)
+    message = {
+        "alert": alert.id,
+        "sender": alert.sender_id,
+        "latitude": alert.latitude,
+        "longitude": alert.longitude,
+        "smoke": alert.smoke,
+        "temperature": alert.temperature,
+        "humidity": alert.humidity,
+        "s": alert.s,
+        "t": alert.t,
+        "u": alert.u,
+        "date": alert.date.isoformat(),
+    }
+    transaction.on_commit(lambda: get_publisher().enqueue(receiver_ids, message))
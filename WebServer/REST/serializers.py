@@ -13,6 +13,19 @@ class VehicleSerializer(serializers.ModelSerializer):
         fields = ['id', 'latitude', 'longitude', 'smoke', 'temperature', "humidity"]
 
 
+class VehicleBatchSerializer(VehicleSerializer):
+    """
+    Serializer for the vehicle states of a batch upsert.
+
+    Every field is required, since a state overwrites the whole row, and the uniqueness check
+    of the id is dropped: existing vehicles are updated, not rejected.
+    """
+
+    class Meta(VehicleSerializer.Meta):
+        extra_kwargs = {field: {'required': True} for field in VehicleSerializer.Meta.fields}
+        extra_kwargs['id'] = {'validators': []}
+
+
 class AlertSerializer(serializers.ModelSerializer):
     """
     Serializer for the Alert model.
@@ -22,3 +35,13 @@ class AlertSerializer(serializers.ModelSerializer):
         model = Alert
         fields = ['sender', 'latitude', 'longitude', 'smoke', 'temperature', "s", "t", "u", "humidity"]
         # Include only the specified fields of the Alert model
+
+
+class ReportAlertSerializer(AlertSerializer):
+    """
+    Serializer for the alert of a report, whose sender is the reporting vehicle `id`.
+    """
+    id = serializers.PrimaryKeyRelatedField(source='sender', queryset=Vehicle.objects.all())
+
+    class Meta(AlertSerializer.Meta):
+        fields = ['id'] + [field for field in AlertSerializer.Meta.fields if field != 'sender']
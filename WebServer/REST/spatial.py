@@ -0,0 +1,137 @@
+import math
+
+from django.db.models import Q
+
+from REST import distance
+
+# Side of a grid cell, in degrees (about 11 km of latitude)
+CELL_SIZE = 0.1
+# Above this many cells the bounding box alone is used, a long IN list costs more than it saves
+MAX_CELLS = 400
+KM_PER_DEGREE = 111.32
+# Margin on the bounding box, so that the geodesic never falls outside of it
+BOX_MARGIN = 1.01
+
+
+def cell_row(latitude, cell_size=CELL_SIZE):
+    return min(max(math.floor((latitude + 90) / cell_size), 0), round(180 / cell_size) - 1)
+
+
+def cell_column(longitude, cell_size=CELL_SIZE):
+    columns = round(360 / cell_size)
+    return math.floor(((longitude + 180) % 360) / cell_size) % columns
+
+
+def cell_of(latitude, longitude, cell_size=CELL_SIZE):
+    """Return the grid cell containing a point.
+
+    The grid splits the globe in cell_size x cell_size degree cells, numbered row by row
+    from the south pole and the antimeridian.
+
+    Args:
+        latitude (float): Latitude in degrees.
+        longitude (float): Longitude in degrees.
+        cell_size (float): Side of a cell in degrees, CELL_SIZE for the `cell` column.
+
+    Returns:
+        int: The cell number.
+    """
+    return cell_row(latitude, cell_size) * round(360 / cell_size) + cell_column(longitude, cell_size)
+
+
+def bounding_box(latitude, longitude, radius):
+    """Return the latitude/longitude box containing a circle.
+
+    A degree of longitude shrinks with the cosine of the latitude, so the box is wider (in
+    degrees) away from the equator. The width is taken at the latitude of the box closest to
+    the pole; when the circle reaches a pole the box covers every longitude.
+
+    Args:
+        latitude (float): Latitude of the centre in degrees.
+        longitude (float): Longitude of the centre in degrees.
+        radius (float): Radius in kilometers.
+
+    Returns:
+        tuple: (min latitude, max latitude, min longitude, max longitude). The longitudes are
+            not wrapped, so min longitude may be below -180 and max longitude above 180.
+    """
+    delta_latitude = radius * BOX_MARGIN / KM_PER_DEGREE
+    min_latitude, max_latitude = latitude - delta_latitude, latitude + delta_latitude
+    if min_latitude <= -90 or max_latitude >= 90:
+        return max(min_latitude, -90), min(max_latitude, 90), -180, 180
+    widest = math.cos(math.radians(max(abs(min_latitude), abs(max_latitude))))
+    delta_longitude = radius * BOX_MARGIN / (KM_PER_DEGREE * widest)
+    if delta_longitude >= 180:
+        return min_latitude, max_latitude, -180, 180
+    return min_latitude, max_latitude, longitude - delta_longitude, longitude + delta_longitude
+
+
+def cells_in_box(box, cell_size=CELL_SIZE, max_cells=MAX_CELLS):
+    """Return the cells overlapping a bounding box, or None if there are more than `max_cells`."""
+    min_latitude, max_latitude, min_longitude, max_longitude = box
+    columns_count = round(360 / cell_size)
+    rows = range(cell_row(min_latitude, cell_size), cell_row(max_latitude, cell_size) + 1)
+    if max_longitude - min_longitude >= 360 - cell_size:
+        columns = range(columns_count)
+    else:
+        first = math.floor((min_longitude + 180) / cell_size)
+        last = math.floor((max_longitude + 180) / cell_size)
+        columns = [column % columns_count for column in range(first, last + 1)]
+    if max_cells is not None and len(rows) * len(columns) > max_cells:
+        return None
+    return [row * columns_count + column for row in rows for column in columns]
+
+
+def box_filter(box):
+    """Return the Q object selecting the points of a bounding box, across the antimeridian too."""
+    min_latitude, max_latitude, min_longitude, max_longitude = box
+    query = Q(latitude__gte=min_latitude, latitude__lte=max_latitude)
+    if min_longitude <= -180 and max_longitude >= 180:
+        return query
+    if min_longitude < -180:
+        return query & (Q(longitude__gte=min_longitude + 360) | Q(longitude__lte=max_longitude))
+    if max_longitude > 180:
+        return query & (Q(longitude__gte=min_longitude) | Q(longitude__lte=max_longitude - 360))
+    return query & Q(longitude__gte=min_longitude, longitude__lte=max_longitude)
+
+
+def candidates(queryset, latitude, longitude, radius):
+    """Restrict a queryset of located rows to those that may be within a radius.
+
+    The rows are selected through the indexed `cell` column and the bounding box of the
+    circle, so only a few of them are loaded whatever the size of the table.
+
+    Args:
+        queryset: Rows with `cell`, `latitude` and `longitude` fields.
+        latitude (float): Latitude of the centre in degrees.
+        longitude (float): Longitude of the centre in degrees.
+        radius (float): Radius in kilometers.
+
+    Returns:
+        QuerySet: A superset of the rows within the radius.
+    """
+    box = bounding_box(latitude, longitude, radius)
+    cells = cells_in_box(box)
+    if cells is not None:
+        queryset = queryset.filter(cell__in=cells)
+    return queryset.filter(box_filter(box))
+
+
+def distances_within(queryset, latitude, longitude, radius):
+    """Return the primary keys and distances of the rows within a geodesic radius of a point.
+
+    Only the coordinates of the candidate rows are loaded, and their distances are computed
+    in one vectorized call (see distance.py).
+
+    Args:
+        queryset: Rows with `cell`, `latitude` and `longitude` fields.
+        latitude (float): Latitude of the centre in degrees.
+        longitude (float): Longitude of the centre in degrees.
+        radius (float): Radius in kilometers.
+
+    Returns:
+        list: (primary key, distance in kilometers) tuples, nearest first.
+    """
+    rows = list(candidates(queryset, latitude, longitude, radius).values_list('pk', 'latitude', 'longitude'))
+    return sorted(distance.within(rows, latitude, longitude, radius), key=lambda row: row[1])
+
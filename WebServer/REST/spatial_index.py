@@ -0,0 +1,433 @@
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from REST import distance
+from REST.spatial import bounding_box, cell_of, cells_in_box, distances_within
+
+# Side of a cell of the in-memory grid, in degrees (about 2 km of latitude)
+INDEX_CELL_SIZE = 0.02
+# First radius of a k-nearest search, in kilometers; it doubles until k vehicles are found
+NEAREST_START_RADIUS = 1.0
+# Half the circumference of the Earth, in kilometers: no two points are farther apart
+MAX_DISTANCE = 20040.0
+# Seconds a catch-up re-reads before the previous sync: covers transactions committed after the
+# rows they wrote were stamped, and the clock skew between processes
+SYNC_OVERLAP = 5.0
+# Seconds deletion tombstones are kept; an index not synced for longer reloads instead
+TOMBSTONE_RETENTION = 3600.0
+# Rows applied per acquisition of the lock during a catch-up
+CATCH_UP_CHUNK = 2000
+
+
+class SpatialIndex:
+    """
+    Process-local grid index of the vehicle positions.
+
+    Vehicles are bucketed by grid cell; a radius query visits only the cells overlapping the
+    bounding box of the circle and computes the distances of their vehicles in one vectorized
+    call, so it never reads the database.
+
+    Only the active fleet is indexed: vehicles seen within VEHICLE_TTL are loaded, queries skip
+    the ones that expired since, and the expired ones are dropped at every sync. A vehicle that
+    reports again is added back by its write.
+
+    The index is loaded from the database on first use and updated in place when a write of
+    this process commits. The writes of other processes are caught up incrementally at most
+    once per `sync_interval` seconds: every position write stamps `last_seen`, so the index
+    reads only the rows stamped since its previous sync (minus SYNC_OVERLAP) and the deletion
+    tombstones (VehicleTombstone) of that period, and applies them a chunk at a time so queries
+    keep being answered meanwhile. It is reloaded in full only when never loaded, or not synced
+    for TOMBSTONE_RETENTION seconds; the new content is then built before being swapped in.
+    """
+
+    def __init__(self, cell_size=INDEX_CELL_SIZE, sync_interval=1.0):
+        """
+        Initializes an empty index.
+
+        Args:
+            cell_size (float): Side of a grid cell in degrees.
+            sync_interval (float): Seconds between two catch-ups with the database.
+        """
+        self.cell_size = cell_size
+        self.sync_interval = sync_interval
+        self.lock = threading.RLock()
+        # Held by the thread syncing, the others keep querying the current content meanwhile
+        self.sync_lock = threading.Lock()
+        # vehicle ID -> cell
+        self.positions = {}
+        # cell -> {vehicle ID: (vehicle ID, latitude, longitude)} for the vehicles in the cell
+        self.cells = defaultdict(dict)
+        # vehicle ID -> timestamp of its last_seen
+        self.seen = {}
+        # Time of the last sync with the database, None until loaded
+        self.synced = None
+        self.next_check = 0.0
+        self.reloads = 0
+        self.catch_ups = 0
+        self.queries = 0
+
+    def load(self, rows, synced):
+        """
+        Replaces the content of the index.
+
+        Args:
+            rows (iterable): (vehicle ID, latitude, longitude, last seen datetime) tuples.
+            synced (datetime): Time at which the rows started being read.
+        """
+        positions = {}
+        cells = defaultdict(dict)
+        seen = {}
+        for vehicle_id, latitude, longitude, last_seen in rows:
+            cell = cell_of(latitude, longitude, self.cell_size)
+            positions[vehicle_id] = cell
+            cells[cell][vehicle_id] = (vehicle_id, latitude, longitude)
+            seen[vehicle_id] = last_seen.timestamp()
+        with self.lock:
+            self.positions, self.cells, self.seen, self.synced = positions, cells, seen, synced
+            self.reloads += 1
+
+    def update(self, vehicle_id, latitude, longitude, last_seen):
+        """Adds a vehicle or moves it to a new position."""
+        cell = cell_of(latitude, longitude, self.cell_size)
+        with self.lock:
+            previous = self.positions.get(vehicle_id)
+            if previous is not None and previous != cell:
+                self._leave(vehicle_id, previous)
+            self.positions[vehicle_id] = cell
+            self.cells[cell][vehicle_id] = (vehicle_id, latitude, longitude)
+            self.seen[vehicle_id] = last_seen.timestamp()
+
+    def remove(self, vehicle_id):
+        """Removes a vehicle, if present."""
+        with self.lock:
+            previous = self.positions.pop(vehicle_id, None)
+            if previous is not None:
+                self._leave(vehicle_id, previous)
+                del self.seen[vehicle_id]
+
+    def _leave(self, vehicle_id, cell):
+        members = self.cells[cell]
+        members.pop(vehicle_id, None)
+        if not members:
+            del self.cells[cell]
+
+    def position(self, vehicle_id):
+        """Returns the (latitude, longitude) of a vehicle, or None if it is not indexed."""
+        with self.lock:
+            cell = self.positions.get(vehicle_id)
+            return None if cell is None else self.cells[cell][vehicle_id][1:]
+
+    def expire(self, since):
+        """Drops the vehicles not seen since a datetime."""
+        since = since.timestamp()
+        with self.lock:
+            for vehicle_id in [vehicle_id for vehicle_id, seen in self.seen.items() if seen < since]:
+                self.remove(vehicle_id)
+
+    def within(self, latitude, longitude, radius, exclude=None, since=None):
+        """
+        Finds the vehicles within a geodesic radius of a point.
+
+        Args:
+            latitude (float): Latitude of the centre in degrees.
+            longitude (float): Longitude of the centre in degrees.
+            radius (float): Radius in kilometers.
+            exclude (int, optional): ID of a vehicle to leave out, e.g. the sender.
+            since (datetime, optional): Leave out the vehicles not seen since then.
+
+        Returns:
+            list: (vehicle ID, distance in kilometers) tuples, nearest first.
+        """
+        box = bounding_box(latitude, longitude, radius)
+        with self.lock:
+            self.queries += 1
+            cells = cells_in_box(box, self.cell_size, max_cells=len(self.cells))
+            if cells is None:
+                # The box covers more cells than are occupied: scanning every vehicle is cheaper
+                cells = self.cells
+            rows = [row for cell in cells if cell in self.cells for row in self.cells[cell].values()]
+            if since is not None:
+                since, seen = since.timestamp(), self.seen
+                rows = [row for row in rows if seen[row[0]] >= since]
+        if exclude is not None:
+            rows = [row for row in rows if row[0] != exclude]
+        return sorted(distance.within(rows, latitude, longitude, radius), key=lambda row: row[1])
+
+    def nearest(self, latitude, longitude, k, exclude=None, max_radius=MAX_DISTANCE, since=None):
+        """
+        Finds the k vehicles nearest to a point.
+
+        The search radius starts at NEAREST_START_RADIUS and doubles until k vehicles are in it.
+
+        Args:
+            latitude (float): Latitude of the point in degrees.
+            longitude (float): Longitude of the point in degrees.
+            k (int): Number of vehicles wanted.
+            exclude (int, optional): ID of a vehicle to leave out.
+            max_radius (float): Farthest distance considered, in kilometers.
+            since (datetime, optional): Leave out the vehicles not seen since then.
+
+        Returns:
+            list: Up to k (vehicle ID, distance in kilometers) tuples, nearest first.
+        """
+        return expanding_search(lambda radius: self.within(latitude, longitude, radius, exclude, since), k, max_radius)
+
+    def reload(self):
+        """Loads the positions of the active fleet from the database."""
+        Vehicle = apps.get_model('REST', 'Vehicle')
+        synced = timezone.now()
+        rows = Vehicle.objects.active().values_list('id', 'latitude', 'longitude', 'last_seen')
+        self.load(rows.iterator(chunk_size=2000), synced)
+
+    def catch_up(self):
+        """Applies the vehicles written and deleted by any process since the last sync."""
+        Vehicle = apps.get_model('REST', 'Vehicle')
+        VehicleTombstone = apps.get_model('REST', 'VehicleTombstone')
+        synced = timezone.now()
+        since = self.synced - timedelta(seconds=SYNC_OVERLAP)
+        # Deletions first: a vehicle deleted then created again is in the rows below
+        deleted = list(VehicleTombstone.objects.filter(deleted_at__gte=since).values_list('vehicle_id', flat=True))
+        self.applied(deleted=deleted)
+        rows = Vehicle.objects.filter(last_seen__gte=since).values_list('id', 'latitude', 'longitude', 'last_seen')
+        chunk = []
+        for row in rows.iterator(chunk_size=CATCH_UP_CHUNK):
+            chunk.append(row)
+            if len(chunk) == CATCH_UP_CHUNK:
+                self.applied(saved=chunk)
+                chunk = []
+        self.applied(saved=chunk)
+        with self.lock:
+            self.synced = synced
+            self.catch_ups += 1
+
+    def sync(self, force=False):
+        """
+        Loads the index if it was never loaded (or `force`), otherwise starts a catch-up with the
+        database in the background if `sync_interval` elapsed since the last one.
+
+        Queries never wait for a catch-up: they are answered from the current content meanwhile.
+        """
+        now = time.monotonic()
+        if not force and self.synced is not None and now < self.next_check:
+            return
+        if force or self.synced is None:
+            with self.sync_lock:
+                if force or self.synced is None:
+                    self.next_check = now + self.sync_interval
+                    self.reload()
+            return
+        if self.sync_lock.acquire(blocking=False):
+            self.next_check = now + self.sync_interval
+            threading.Thread(target=self._sync_in_background, daemon=True).start()
+
+    def _sync_in_background(self):
+        try:
+            if timezone.now() - self.synced > timedelta(seconds=TOMBSTONE_RETENTION):
+                # The tombstones of that period may be gone
+                self.reload()
+            else:
+                self.catch_up()
+            since = active_since()
+            if since is not None:
+                self.expire(since)
+        except Exception as e:
+            print(f"Spatial index sync failed: {e}")
+        finally:
+            # The connection of this thread
+            connection.close()
+            self.sync_lock.release()
+
+    def applied(self, saved=(), deleted=()):
+        """
+        Applies written and deleted vehicles.
+
+        Args:
+            saved (iterable): (vehicle ID, latitude, longitude, last seen) of the written vehicles.
+            deleted (iterable): IDs of the deleted vehicles.
+        """
+        with self.lock:
+            for vehicle_id, latitude, longitude, last_seen in saved:
+                self.update(vehicle_id, latitude, longitude, last_seen)
+            for vehicle_id in deleted:
+                self.remove(vehicle_id)
+
+    def verify(self, repair=False):
+        """
+        Compares the index with the active fleet in the database.
+
+        Args:
+            repair (bool): Reload the index if it differs.
+
+        Returns:
+            dict: IDs `missing` from the index, `extra` in the index only and `moved` (indexed at
+            another position). All lists are empty when the index is consistent.
+        """
+        Vehicle = apps.get_model('REST', 'Vehicle')
+        since = active_since()
+        rows = Vehicle.objects.values_list('id', 'latitude', 'longitude')
+        if since is not None:
+            rows = rows.filter(last_seen__gte=since)
+        stored = {vehicle_id: (latitude, longitude) for vehicle_id, latitude, longitude in rows}
+        with self.lock:
+            indexed = {row[0]: row[1:] for members in self.cells.values() for row in members.values()
+                       if since is None or self.seen[row[0]] >= since.timestamp()}
+        report = {
+            "missing": sorted(stored.keys() - indexed.keys()),
+            "extra": sorted(indexed.keys() - stored.keys()),
+            "moved": sorted(vehicle_id for vehicle_id in stored.keys() & indexed.keys()
+                            if stored[vehicle_id] != indexed[vehicle_id]),
+        }
+        if repair and any(report.values()):
+            self.reload()
+        return report
+
+    def stats(self):
+        """Returns the size and counters of the index."""
+        with self.lock:
+            return {
+                "vehicles": len(self.positions),
+                "cells": len(self.cells),
+                "synced": self.synced,
+                "reloads": self.reloads,
+                "catch_ups": self.catch_ups,
+                "queries": self.queries,
+            }
+
+
+def expanding_search(search, k, max_radius):
+    """
+    Finds the k nearest results of a radius search, doubling the radius from NEAREST_START_RADIUS
+    until k results are in it or it reaches max_radius.
+
+    Args:
+        search (callable): Takes a radius in kilometers and returns (key, distance) tuples, nearest first.
+        k (int): Number of results wanted.
+        max_radius (float): Farthest distance considered, in kilometers.
+
+    Returns:
+        list: Up to k (key, distance in kilometers) tuples, nearest first.
+    """
+    radius = min(NEAREST_START_RADIUS, max_radius)
+    while True:
+        found = search(radius)
+        if len(found) >= k or radius >= max_radius:
+            return found[:k]
+        radius = min(radius * 2, max_radius)
+
+
+def active_since(ttl=None):
+    """
+    Returns the oldest last_seen of an active vehicle.
+
+    Args:
+        ttl (float, optional): Liveness TTL in seconds, VEHICLE_TTL by default.
+
+    Returns:
+        datetime: now minus the TTL, or None if the TTL is None or 0 (every vehicle is active).
+    """
+    ttl = settings.VEHICLE_TTL if ttl is None else ttl
+    return timezone.now() - timedelta(seconds=ttl) if ttl else None
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Returns the index of the process, loaded on first use and synced with the database."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SpatialIndex(sync_interval=settings.SPATIAL_INDEX_SYNC_INTERVAL)
+        index = _index
+    index.sync()
+    return index
+
+
+def record_changes(saved=(), deleted=()):
+    """
+    Signals a write of vehicle positions to the index of every process.
+
+    Must be called in the transaction of the write. The index of this process is updated once
+    it commits; the other processes find the written rows by their `last_seen`, and the deleted
+    vehicles by the tombstones written here.
+
+    Args:
+        saved (list): (vehicle ID, latitude, longitude, last seen) of the written vehicles.
+        deleted (list): IDs of the deleted vehicles.
+    """
+    if not settings.SPATIAL_INDEX:
+        return
+    if deleted:
+        VehicleTombstone = apps.get_model('REST', 'VehicleTombstone')
+        now = timezone.now()
+        VehicleTombstone.objects.filter(deleted_at__lt=now - timedelta(seconds=TOMBSTONE_RETENTION)).delete()
+        VehicleTombstone.objects.bulk_create([VehicleTombstone(vehicle_id=vehicle_id, deleted_at=now)
+                                              for vehicle_id in deleted])
+    if _index is not None:
+        transaction.on_commit(lambda: _index.applied(saved, deleted))
+
+
+def neighbors(latitude, longitude, radius, exclude=None):
+    """
+    Finds the active vehicles within a radius of a point, from the index when SPATIAL_INDEX is
+    set, from the database otherwise.
+
+    Args:
+        latitude (float): Latitude of the centre in degrees.
+        longitude (float): Longitude of the centre in degrees.
+        radius (float): Radius in kilometers.
+        exclude (int, optional): ID of a vehicle to leave out.
+
+    Returns:
+        list: (vehicle ID, distance in kilometers) tuples, nearest first.
+    """
+    since = active_since()
+    if settings.SPATIAL_INDEX:
+        return get_index().within(latitude, longitude, radius, exclude, since)
+    Vehicle = apps.get_model('REST', 'Vehicle')
+    return distances_within(Vehicle.objects.active().exclude(pk=exclude), latitude, longitude, radius)
+
+
+def nearest(latitude, longitude, k, exclude=None, max_radius=MAX_DISTANCE):
+    """
+    Finds the k active vehicles nearest to a point, from the index when SPATIAL_INDEX is set,
+    from the database otherwise.
+
+    Both search a small radius first and widen it only while fewer than k vehicles are found,
+    so the distances of the vehicles far away are never computed.
+
+    Args:
+        latitude (float): Latitude of the point in degrees.
+        longitude (float): Longitude of the point in degrees.
+        k (int): Number of vehicles wanted.
+        exclude (int, optional): ID of a vehicle to leave out.
+        max_radius (float): Farthest distance considered, in kilometers.
+
+    Returns:
+        list: Up to k (vehicle ID, distance in kilometers) tuples, nearest first.
+    """
+    since = active_since()
+    if settings.SPATIAL_INDEX:
+        return get_index().nearest(latitude, longitude, k, exclude, max_radius, since)
+    Vehicle = apps.get_model('REST', 'Vehicle')
+    queryset = Vehicle.objects.active().exclude(pk=exclude)
+    return expanding_search(lambda radius: distances_within(queryset, latitude, longitude, radius), k, max_radius)
+
+
+def vehicle_position(vehicle_id):
+    """Returns the (latitude, longitude) of a vehicle, or None if it does not exist."""
+    if settings.SPATIAL_INDEX:
+        position = get_index().position(vehicle_id)
+        if position is not None:
+            return position
+    # Not indexed yet, e.g. created by another process since the last sync
+    Vehicle = apps.get_model('REST', 'Vehicle')
+    return Vehicle.objects.filter(pk=vehicle_id).values_list('latitude', 'longitude').first()
@@ -0,0 +1,133 @@
+import json
+import threading
+import time
+from collections import deque
+
+from django.db import close_old_connections, transaction
+
+from REST.models import Vehicle
+from REST.serializers import VehicleBatchSerializer
+
+
+class TelemetryConsumer:
+    """
+    Writes vehicle telemetry received over MQTT to the database in micro-batches.
+
+    `on_message` is the paho callback: it validates a message and queues it. `run` writes the
+    queued states with one bulk upsert per batch, whenever `batch_size` states are waiting or
+    `interval` seconds after the previous batch. Only the latest state of a vehicle in a batch
+    is written.
+
+    Lag is measured on every message as the time between its `sent` timestamp, set by the
+    Bridge, and the commit of its batch. The backlog is the number of queued messages.
+    """
+
+    def __init__(self, batch_size=500, interval=0.2):
+        """
+        Initializes the consumer.
+
+        Args:
+            batch_size (int): Maximum number of messages written per batch.
+            interval (float): Maximum seconds between two batches.
+        """
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = deque()
+        self.ready = threading.Condition()
+        self.received = 0
+        self.invalid = 0
+        self.written = 0
+        self.batches = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def on_message(self, client, userdata, message):
+        """Paho callback: validates a telemetry message and queues it."""
+        try:
+            data = json.loads(message.payload)
+        except ValueError:
+            self.invalid += 1
+            return
+        if not isinstance(data, dict):
+            self.invalid += 1
+            return
+        serializer = VehicleBatchSerializer(data=data)
+        if not serializer.is_valid():
+            self.invalid += 1
+            return
+        sent = data.get('sent')
+        with self.ready:
+            self.received += 1
+            self.queue.append((dict(serializer.validated_data), sent if isinstance(sent, (int, float)) else None))
+            if len(self.queue) >= self.batch_size:
+                self.ready.notify()
+
+    def flush(self):
+        """
+        Writes up to `batch_size` queued states in one transaction.
+
+        Returns:
+            int: The number of messages consumed.
+        """
+        with self.ready:
+            count = min(len(self.queue), self.batch_size)
+            batch = [self.queue.popleft() for _ in range(count)]
+        if not batch:
+            return 0
+        with transaction.atomic():
+            Vehicle.bulk_upsert(state for state, sent in batch)
+        now = time.time()
+        lags = [now - sent for state, sent in batch if sent is not None]
+        self.written += len(batch)
+        self.batches += 1
+        if lags:
+            self.last_lag = max(lags)
+            self.max_lag = max(self.max_lag, self.last_lag)
+        return len(batch)
+
+    def backlog(self):
+        """Returns the number of queued messages."""
+        with self.ready:
+            return len(self.queue)
+
+    def stats(self):
+        """
+        Returns the counters of the consumer.
+
+        Returns:
+            dict: received, invalid, written, batches, backlog, last_lag and max_lag (seconds).
+        """
+        return {
+            "received": self.received,
+            "invalid": self.invalid,
+            "written": self.written,
+            "batches": self.batches,
+            "backlog": self.backlog(),
+            "last_lag": self.last_lag,
+            "max_lag": self.max_lag,
+        }
+
+    def run(self, report_every=None, stop=None):
+        """
+        Writes batches until `stop` is set.
+
+        Args:
+            report_every (float, optional): Seconds between two printed stats lines.
+            stop (threading.Event, optional): Ends the loop once set, after the queue is written.
+        """
+        stop = stop or threading.Event()
+        next_report = time.monotonic() + report_every if report_every else None
+        while not stop.is_set():
+            with self.ready:
+                if len(self.queue) < self.batch_size:
+                    self.ready.wait(self.interval)
+            close_old_connections()
+            while self.flush() == self.batch_size:
+                # Catching up: keep writing full batches without waiting
+                pass
+            if next_report and time.monotonic() >= next_report:
+                print(" ".join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+                               for key, value in self.stats().items()))
+                next_report += report_every
+        while self.flush():
+            pass
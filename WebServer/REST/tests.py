@@ -1,3 +1,368 @@
-from django.test import TestCase
+import json
+import random
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from geopy.distance import geodesic
+
+from REST import distance, pagination, spatial_index
+from REST.models import Alert, Vehicle, VehicleTombstone
+
+# In-memory caches, so that the tests never write the neighbor cache directory
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+    'neighbors': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'neighbors'},
+}
+
+
+def state(vehicle_id, latitude=44.6, longitude=10.9, smoke=100.0, temperature=20.0, humidity=40.0):
+    return {"id": vehicle_id, "latitude": latitude, "longitude": longitude, "smoke": smoke,
+            "temperature": temperature, "humidity": humidity}
+
+
+def report(vehicle_id, s=0, t=0, u=0, **values):
+    return {**state(vehicle_id, **values), "s": s, "t": t, "u": u}
+
+
+@override_settings(CACHES=TEST_CACHES, SPATIAL_INDEX=False)
+class VehicleBatchAPITest(TestCase):
+    url = '/api/vehicles/batch/'
+
+    def post(self, body):
+        return self.client.post(self.url, json.dumps(body), content_type='application/json')
+
+    def test_batch_creates_and_updates_vehicles(self):
+        Vehicle.objects.create(**state(1, temperature=10.0))
+        response = self.post([state(1, temperature=30.0), state(2, latitude=45.0)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"count": 2})
+        self.assertEqual(Vehicle.objects.get(id=1).temperature, 30.0)
+        self.assertEqual(Vehicle.objects.get(id=2).latitude, 45.0)
+
+    def test_last_state_of_a_vehicle_wins(self):
+        response = self.post([state(1, temperature=21.0), state(2), state(1, temperature=22.0)])
+        self.assertEqual(response.json(), {"count": 2})
+        self.assertEqual(Vehicle.objects.get(id=1).temperature, 22.0)
+
+    def test_batch_stamps_last_seen_and_cell(self):
+        Vehicle.objects.create(**state(1))
+        before = Vehicle.objects.get(id=1)
+        self.post([state(1, latitude=-33.9, longitude=151.2)])
+        after = Vehicle.objects.get(id=1)
+        self.assertGreaterEqual(after.last_seen, before.last_seen)
+        self.assertNotEqual(after.cell, before.cell)
+
+    def test_invalid_state_writes_nothing(self):
+        incomplete = state(2)
+        del incomplete["humidity"]
+        response = self.post([state(1), incomplete])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Vehicle.objects.exists())
+
+    def test_body_must_be_a_list(self):
+        self.assertEqual(self.post(state(1)).status_code, 400)
+
+
+@override_settings(CACHES=TEST_CACHES, SPATIAL_INDEX=False, ALERT_RADIUS=5)
+class ReportAPITest(TestCase):
+    url = '/api/report/'
+
+    def post(self, body):
+        return self.client.post(self.url, json.dumps(body), content_type='application/json')
+
+    def test_report_without_flags_only_writes_the_vehicle(self):
+        response = self.post(report(1))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"alert": "none", "receivers": []})
+        self.assertTrue(Vehicle.objects.filter(id=1, temperature=20.0).exists())
+        self.assertFalse(Alert.objects.exists())
+
+    def test_alert_is_created_with_its_receivers(self):
+        Vehicle.objects.create(**state(2, latitude=44.61, temperature=25.0, smoke=50.0))
+        Vehicle.objects.create(**state(3, latitude=46.0))
+        response = self.post(report(1, t=1, temperature=80.0))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"alert": "created", "receivers": [2]})
+        alert = Alert.objects.get()
+        self.assertEqual((alert.sender_id, alert.t, alert.temperature), (1, True, 80.0))
+        self.assertEqual(list(alert.receivers.values_list('id', flat=True)), [2])
+
+    def test_repeated_report_is_replayed(self):
+        Vehicle.objects.create(**state(2, latitude=44.61, temperature=25.0, smoke=50.0))
+        first = self.post(report(1, t=1, temperature=80.0))
+        # The receiver moves away: a retry still returns the receivers of the alert already created
+        Vehicle.objects.filter(id=2).update(latitude=50.0)
+        retry = self.post(report(1, t=1, temperature=80.0))
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json(), {"alert": "replayed", "receivers": [2]})
+        self.assertEqual(Alert.objects.count(), 1)
+
+    def test_report_with_other_values_is_a_new_alert(self):
+        self.post(report(1, t=1, temperature=80.0))
+        response = self.post(report(1, t=1, temperature=85.0))
+        self.assertEqual(response.json()["alert"], "created")
+        self.assertEqual(Alert.objects.count(), 2)
+
+    @override_settings(REPORT_REPLAY_WINDOW=0)
+    def test_report_outside_the_window_is_a_new_alert(self):
+        self.post(report(1, s=1))
+        self.assertEqual(self.post(report(1, s=1)).json()["alert"], "created")
+        self.assertEqual(Alert.objects.count(), 2)
+
+    def test_alert_is_suppressed_by_a_neighbor_with_similar_values(self):
+        Vehicle.objects.create(**state(2, latitude=44.61, temperature=80.0))
+        response = self.post(report(1, t=1, temperature=80.0))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"alert": "suppressed", "receivers": []})
+        self.assertFalse(Alert.objects.exists())
+
+    def test_invalid_report_writes_nothing(self):
+        invalid = report(1, t=1)
+        invalid["t"] = "maybe"
+        self.assertEqual(self.post(invalid).status_code, 400)
+        self.assertFalse(Vehicle.objects.exists())
+        incomplete = report(1)
+        del incomplete["latitude"]
+        self.assertEqual(self.post(incomplete).status_code, 400)
+
+    def test_body_must_be_an_object(self):
+        self.assertEqual(self.post([report(1)]).status_code, 400)
+        self.assertEqual(self.post(1).status_code, 400)
+        self.assertFalse(Vehicle.objects.exists())
+
+
+@override_settings(CACHES=TEST_CACHES, SPATIAL_INDEX=False)
+class PaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Vehicle.objects.bulk_create([Vehicle(**state(vehicle_id)) for vehicle_id in range(-5, 20)])
+
+    def ids(self, rows):
+        return [row["id"] for row in rows]
+
+    def test_pages_follow_the_cursor(self):
+        ids, cursor = [], ''
+        for _ in range(10):
+            page = self.client.get('/api/vehicles/', {'cursor': cursor, 'limit': 10}).json()
+            self.assertLessEqual(len(page["results"]), 10)
+            ids += self.ids(page["results"])
+            if page["next"] is None:
+                break
+            cursor = page["next"]
+        self.assertEqual(ids, list(range(-5, 20)))
+
+    def test_cursor_is_exclusive_and_may_be_negative(self):
+        page = self.client.get('/api/vehicles/', {'cursor': -3, 'limit': 2}).json()
+        self.assertEqual(self.ids(page["results"]), [-2, -1])
+        self.assertEqual(page["next"], -1)
+
+    def test_last_page_has_no_next(self):
+        page = self.client.get('/api/vehicles/', {'cursor': 15, 'limit': 10}).json()
+        self.assertEqual(self.ids(page["results"]), [16, 17, 18, 19])
+        self.assertIsNone(page["next"])
+
+    def test_page_rows_match_the_serializer(self):
+        row = self.client.get('/api/vehicles/', {'cursor': -1, 'limit': 1}).json()["results"][0]
+        self.assertEqual(row, self.client.get('/api/vehicles/0/').json())
+
+    def test_invalid_parameters(self):
+        for params in ({'cursor': 'x'}, {'limit': -1}, {'limit': 'ten'}):
+            self.assertEqual(self.client.get('/api/vehicles/', params).status_code, 400)
+
+    def test_without_parameters_the_whole_table_is_returned(self):
+        self.assertEqual(len(self.client.get('/api/vehicles/').json()), 25)
+
+    def test_stream_returns_every_row_as_json_lines(self):
+        response = self.client.get('/api/vehicles/', {'stream': 1, 'cursor': 0})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(self.ids(json.loads(line) for line in lines), list(range(1, 20)))
+
+    def test_stream_spans_several_chunks(self):
+        with mock.patch.object(pagination, 'STREAM_CHUNK_SIZE', 4):
+            response = self.client.get('/api/vehicles/', {'stream': 1})
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(self.ids(json.loads(line) for line in lines), list(range(-5, 20)))
+
+    def test_alerts_are_paginated(self):
+        Alert.objects.bulk_create([Alert(sender_id=1, temperature=index) for index in range(3)])
+        page = self.client.get('/api/alerts/', {'limit': 2}).json()
+        self.assertEqual([row["temperature"] for row in page["results"]], [0, 1])
+        rest = self.client.get('/api/alerts/', {'cursor': page["next"]}).json()
+        self.assertEqual([row["temperature"] for row in rest["results"]], [2])
+        self.assertIsNone(rest["next"])
+
+
+@override_settings(CACHES=TEST_CACHES, SPATIAL_INDEX=True, VEHICLE_TTL=300)
+class SpatialIndexTest(TestCase):
+    def setUp(self):
+        generator = random.Random(20)
+        # A dense fleet around Modena, a few vehicles across the date line and near the pole
+        states = [state(vehicle_id, generator.uniform(44.3, 44.9), generator.uniform(10.6, 11.3))
+                  for vehicle_id in range(1, 301)]
+        states += [state(vehicle_id, generator.uniform(-0.2, 0.2),
+                         generator.choice((-1, 1)) * generator.uniform(179.9, 180)) for vehicle_id in range(301, 331)]
+        states += [state(vehicle_id, generator.uniform(89.9, 90), generator.uniform(-180, 180))
+                   for vehicle_id in range(331, 341)]
+        Vehicle.bulk_upsert(states)
+        self.generator = generator
+        self.index = self.use_index(spatial_index.SpatialIndex(sync_interval=3600))
+
+    def use_index(self, index):
+        """Makes `index` the index of the process, loaded now so that no query syncs it in the background."""
+        patcher = mock.patch.object(spatial_index, '_index', index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        index.sync(force=True)
+        return index
+
+    def baseline(self, latitude, longitude, radius, exclude=None):
+        """The active vehicles within the radius, by geopy's geodesic over the whole table."""
+        rows = Vehicle.objects.active().exclude(pk=exclude).values_list('id', 'latitude', 'longitude')
+        distances = [(vehicle_id, geodesic((latitude, longitude), (vehicle_latitude, vehicle_longitude)).km)
+                     for vehicle_id, vehicle_latitude, vehicle_longitude in rows]
+        return sorted((row for row in distances if row[1] <= radius), key=lambda row: row[1])
+
+    def assertMatchesBaseline(self, latitude, longitude, radius, exclude=None):
+        expected = self.baseline(latitude, longitude, radius, exclude)
+        found = spatial_index.neighbors(latitude, longitude, radius, exclude)
+        self.assertEqual(sorted(row[0] for row in found), sorted(row[0] for row in expected))
+        expected = dict(expected)
+        for vehicle_id, vehicle_distance in found:
+            self.assertAlmostEqual(vehicle_distance, expected[vehicle_id],
+                                   delta=expected[vehicle_id] * distance.MAX_RELATIVE_ERROR + 1e-9)
+        return found
+
+    def neighbor_ids(self, vehicle_id, radius=5):
+        response = self.client.get(f'/api/neighboring-vehicles/{vehicle_id}/', {'radius': radius})
+        return response.json()["neighboring_vehicle_ids"]
+
+    def test_neighbors_match_the_geodesic_baseline(self):
+        centres = [(self.generator.uniform(44.3, 44.9), self.generator.uniform(10.6, 11.3)) for _ in range(20)]
+        centres += [(0.0, 180.0), (0.1, -179.95), (89.95, 0.0), (90.0, 0.0)]
+        for latitude, longitude in centres:
+            for radius in (0.5, 5, 20, 100):
+                with self.subTest(latitude=latitude, longitude=longitude, radius=radius):
+                    found = self.assertMatchesBaseline(latitude, longitude, radius)
+                    self.assertEqual(found, sorted(found, key=lambda row: row[1]))
+        self.assertTrue(self.assertMatchesBaseline(0.0, 180.0, 50))
+        self.assertTrue(self.assertMatchesBaseline(90.0, 0.0, 20))
+
+    def test_index_and_database_give_the_same_neighbors(self):
+        for _ in range(10):
+            latitude, longitude = self.generator.uniform(44.3, 44.9), self.generator.uniform(10.6, 11.3)
+            from_index = spatial_index.neighbors(latitude, longitude, 10, exclude=1)
+            with self.settings(SPATIAL_INDEX=False):
+                from_database = spatial_index.neighbors(latitude, longitude, 10, exclude=1)
+            self.assertEqual([row[0] for row in from_index], [row[0] for row in from_database])
+
+    def test_nearest_are_the_first_of_the_baseline(self):
+        for k in (1, 10, 50):
+            found = spatial_index.nearest(44.6, 10.9, k, exclude=1, max_radius=200)
+            self.assertEqual([row[0] for row in found], [row[0] for row in self.baseline(44.6, 10.9, 200, 1)[:k]])
+
+    def test_writes_of_this_process_apply_on_commit(self):
+        Vehicle.objects.create(**state(1000, latitude=10.0, longitude=10.0))
+        Vehicle.objects.create(**state(1001, latitude=10.01, longitude=10.0))
+        # Not committed: the index does not know them yet
+        self.assertEqual(spatial_index.neighbors(10.0, 10.0, 5), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/vehicles/', json.dumps(state(1002, latitude=10.02, longitude=10.0)),
+                             content_type='application/json')
+            Vehicle.objects.get(id=1000).save()
+        self.assertEqual(self.neighbor_ids(1000), [1002])
+
+        # 1002 drives away, 1001 reports its position
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put('/api/vehicles/1002/', json.dumps(state(1002, latitude=20.0, longitude=20.0)),
+                            content_type='application/json')
+            Vehicle.bulk_upsert([state(1001, latitude=10.01, longitude=10.0)])
+        self.assertEqual(self.neighbor_ids(1000), [1001])
+        self.assertEqual(self.neighbor_ids(1002), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete('/api/vehicles/1001/')
+        self.assertEqual(self.neighbor_ids(1000), [])
+        self.assertMatchesBaseline(10.0, 10.0, 50)
+        self.assertEqual(self.index.verify(), {"missing": [], "extra": [], "moved": []})
+
+    def test_catch_up_applies_the_writes_of_other_processes(self):
+        # Written by another process: the on-commit updates of this process never run
+        Vehicle.objects.create(**state(1000, latitude=10.0, longitude=10.0))
+        moved = Vehicle.objects.get(id=2)
+        moved.latitude, moved.longitude = 10.01, 10.0
+        moved.save(update_fields=['latitude', 'longitude'])
+        Vehicle.bulk_upsert([state(3, latitude=10.02, longitude=10.0), state(1001, latitude=10.0, longitude=10.01)])
+        Vehicle.objects.get(id=4).delete()
+        self.assertEqual(self.index.verify(), {"missing": [1000, 1001], "extra": [4], "moved": [2, 3]})
+
+        self.index.catch_up()
+        self.assertEqual(self.index.verify(), {"missing": [], "extra": [], "moved": []})
+        self.assertEqual([row[0] for row in self.assertMatchesBaseline(10.0, 10.0, 5, exclude=1000)], [1001, 2, 3])
+        self.assertIsNone(self.index.position(4))
+        self.assertEqual(self.index.stats()["catch_ups"], 1)
+
+    def test_catch_up_overlaps_the_previous_sync(self):
+        # Stamped just before the index synced, but committed after: the overlap still reads it
+        stamped = self.index.synced - timedelta(seconds=spatial_index.SYNC_OVERLAP / 2)
+        Vehicle.objects.filter(id=5).update(latitude=10.0, longitude=10.0, last_seen=stamped)
+        self.index.catch_up()
+        self.assertEqual(self.index.position(5), (10.0, 10.0))
+
+    def test_verify_repairs_a_write_missed_by_the_catch_up(self):
+        Vehicle.objects.create(**state(1000, latitude=10.0, longitude=10.0))
+        # A write that does not stamp last_seen cannot be found by a catch-up
+        old = timezone.now() - timedelta(seconds=spatial_index.SYNC_OVERLAP + 60)
+        Vehicle.objects.filter(id=5).update(latitude=10.0, longitude=10.0, last_seen=old)
+        self.index.catch_up()
+        self.assertIsNotNone(self.index.position(1000))
+        self.assertEqual(self.index.verify(repair=True), {"missing": [], "extra": [], "moved": [5]})
+        self.assertEqual(self.index.position(5), (10.0, 10.0))
+        self.assertEqual(self.index.verify(), {"missing": [], "extra": [], "moved": []})
+        self.assertEqual(self.index.stats()["reloads"], 2)
+
+    def test_vehicle_deleted_then_created_again_is_indexed(self):
+        Vehicle.objects.get(id=6).delete()
+        Vehicle.objects.create(**state(6, latitude=10.0, longitude=10.0))
+        self.index.catch_up()
+        self.assertEqual(self.index.position(6), (10.0, 10.0))
+        self.assertEqual(self.assertMatchesBaseline(10.0, 10.0, 1), [(6, 0.0)])
+
+    def test_deletions_leave_tombstones_and_prune_the_old_ones(self):
+        expired = timezone.now() - timedelta(seconds=spatial_index.TOMBSTONE_RETENTION + 1)
+        VehicleTombstone.objects.create(vehicle_id=999, deleted_at=expired)
+        Vehicle.objects.get(id=7).delete()
+        self.assertEqual(list(VehicleTombstone.objects.values_list('vehicle_id', flat=True)), [7])
+
+        # An index loaded before the deletion drops the vehicle at its next catch-up
+        self.index.catch_up()
+        self.assertIsNone(self.index.position(7))
+        self.assertNotIn(7, [row[0] for row in self.assertMatchesBaseline(44.6, 10.9, 100)])
+
+    def test_no_tombstones_without_the_index(self):
+        with self.settings(SPATIAL_INDEX=False):
+            Vehicle.objects.get(id=8).delete()
+        self.assertFalse(VehicleTombstone.objects.exists())
+
+    def test_inactive_vehicles_are_left_out_until_they_report(self):
+        inactive = timezone.now() - timedelta(seconds=600)
+        Vehicle.objects.create(**state(1000, latitude=10.0, longitude=10.0))
+        Vehicle.objects.filter(id=1000).update(last_seen=inactive)
+        index = self.use_index(spatial_index.SpatialIndex(sync_interval=3600))
+        self.assertIsNone(index.position(1000))
+        self.assertEqual(spatial_index.neighbors(10.0, 10.0, 5), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Vehicle.objects.get(id=1000).save()
+        self.assertEqual(self.assertMatchesBaseline(10.0, 10.0, 5), [(1000, 0.0)])
+
+        # Expired since it was loaded: queries skip it, the next sync drops it
+        index.applied(saved=[(1000, 10.0, 10.0, inactive)])
+        self.assertEqual(spatial_index.neighbors(10.0, 10.0, 5), [])
+        index.expire(spatial_index.active_since())
+        self.assertIsNone(index.position(1000))
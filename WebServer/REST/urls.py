@@ -5,12 +5,18 @@ from REST.views import *
 urlpatterns = [
     path('vehicles/', VehiclesAPI.as_view(), name='vehicle-api'),
     # Endpoint to get all vehicles or create a new one
+    path('vehicles/batch/', VehicleBatchAPI.as_view(), name='vehicle-batch-api'),
+    # Endpoint to create or update many vehicles in one request
     path('vehicles/<int:vehicle_id>/', VehiclesAPI.as_view(), name='vehicle-api-id'),
     # Endpoint to get, update or delete a specific vehicle by its ID
     path('alerts/', AlertsAPI.as_view(), name='alert-api'),
     # Endpoint to get all alerts or create a new one
+    path('report/', ReportAPI.as_view(), name='report-api'),
+    # Endpoint to upsert a vehicle, evaluate its alert and get the receivers in one request
     path('contacts/<int:vehicle_id>', UserAPI.as_view()),
     # Endpoint to get contacts related to a specific vehicle
     path('neighboring-vehicles/<int:vehicle_id>/', NeighboringVehiclesAPI.as_view(), name='neighboring-vehicles-api'),
     # Endpoint to get neighboring vehicles given a vehicle ID
+    path('neighboring-vehicles/stats/', NeighborCacheStatsAPI.as_view(), name='neighbor-cache-stats-api'),
+    # Endpoint to get the hit, miss and invalidation counters of the neighbor cache
 ]
@@ -1,11 +1,18 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
 from django.http import Http404, HttpResponse
 from django.http import JsonResponse
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.views import APIView
 
+from REST import neighbor_cache, spatial_index
 from REST.models import Vehicle, Alert
-from REST.serializers import VehicleSerializer, AlertSerializer
+from REST.pagination import paginated_response, wants_pagination
+from REST.publisher import publish_alert
+from REST.serializers import VehicleSerializer, VehicleBatchSerializer, AlertSerializer, ReportAlertSerializer
 
 
 def get_vehicle_object(vehicle_id):
@@ -26,12 +33,42 @@ def get_vehicle_object(vehicle_id):
         raise Http404
 
 
+def evaluate_alert(alert):
+    """Decide whether an unsaved alert is kept, and if so save it with its receivers.
+
+    Suppression and receivers come from a single evaluation of the neighborhood, before anything
+    is written: a suppressed alert costs no write at all. A kept alert and its receiver rows are
+    inserted in one transaction, the receivers with a single bulk insert into the through table,
+    and the alert is published to them over MQTT once the transaction commits.
+
+    Args:
+        alert (Alert): The alert, not saved yet.
+
+    Returns:
+        list: The IDs of the vehicles receiving the alert, or None if neighboring vehicles with
+        similar values were found, in which case the alert is not saved.
+    """
+    suppressed, receiver_ids = alert.evaluate_neighborhood(radius=settings.ALERT_RADIUS)
+    if suppressed:
+        return None
+    Receiver = Alert.receivers.through
+    with transaction.atomic(savepoint=False):
+        alert.save()
+        Receiver.objects.bulk_create([Receiver(alert_id=alert.id, vehicle_id=vehicle_id)
+                                      for vehicle_id in receiver_ids])
+        publish_alert(alert, receiver_ids)
+    return receiver_ids
+
+
 class VehiclesAPI(APIView):
     """API endpoint for handling vehicle instances."""
 
     def get(self, request, vehicle_id=None):
         """Handle GET requests.
 
+        The list accepts `?cursor=&limit=` for keyset pagination and `?stream=1` for a
+        JSON-lines stream; without them the whole table is returned.
+
         Args:
             request: The request object.
             vehicle_id (int, optional): The ID of the vehicle to retrieve.
@@ -43,6 +80,8 @@ class VehiclesAPI(APIView):
             vehicle = get_vehicle_object(vehicle_id)
             serializer = VehicleSerializer(vehicle)
             return JsonResponse(serializer.data, safe=False, status=status.HTTP_200_OK)
+        elif wants_pagination(request):
+            return paginated_response(request, Vehicle.objects.all(), VehicleSerializer.Meta.fields)
         else:
             vehicles = Vehicle.objects.all()
             serializer = VehicleSerializer(vehicles, many=True)
@@ -61,8 +100,7 @@ class VehiclesAPI(APIView):
         vehicle = get_vehicle_object(vehicle_id)
         serializer = VehicleSerializer(vehicle, data=request.data)
         if serializer.is_valid():
-            serializer.save()
-            vehicle.last_update = timezone.now()
+            serializer.save(last_seen=timezone.now())
             return HttpResponse(status=status.HTTP_200_OK)
         return HttpResponse(status=status.HTTP_400_BAD_REQUEST)
 
@@ -99,18 +137,48 @@ class VehiclesAPI(APIView):
         return HttpResponse(status=status.HTTP_400_BAD_REQUEST)
 
 
+class VehicleBatchAPI(APIView):
+    """API endpoint for creating or updating many vehicles in one request."""
+
+    def post(self, request):
+        """Handle POST requests.
+
+        The body is a list of vehicle states. They are validated together and applied with one
+        bulk upsert in a single transaction: unknown vehicles are created, known ones updated.
+        If a vehicle appears more than once, its last state wins.
+
+        Args:
+            request: The request object.
+
+        Returns:
+            JsonResponse: JSON response with the number of vehicles written, or HttpResponse 400
+            if any state is invalid (nothing is written in that case).
+        """
+        serializer = VehicleBatchSerializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return HttpResponse(status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            count = Vehicle.bulk_upsert(serializer.validated_data)
+        return JsonResponse({"count": count}, status=status.HTTP_200_OK)
+
+
 class AlertsAPI(APIView):
 
     def get(self, request):
         """Handle GET requests.
 
+        Accepts `?cursor=&limit=` for keyset pagination and `?stream=1` for a JSON-lines
+        stream; without them every alert is returned.
+
         Args:
             request: The request object.
 
         Returns:
             JsonResponse: JSON response containing alerts data.
         """
-
+        if wants_pagination(request):
+            return paginated_response(request, Alert.objects.all(), AlertSerializer.Meta.fields)
         vehicles = Alert.objects.all()
         serializer = AlertSerializer(vehicles, many=True)
         return JsonResponse(serializer.data, safe=False, status=status.HTTP_200_OK)
@@ -119,18 +187,63 @@ class AlertsAPI(APIView):
         """Handle POST requests."""
         serializer = AlertSerializer(data=request.data)
         if serializer.is_valid():
-            alert = serializer.save()
-            if not alert.check_neighboring_vehicles(radius=5):
-                vehicles_in_range = alert.get_vehicles_in_range(radius=5)
-                alert.receivers.set(vehicles_in_range)
+            if evaluate_alert(Alert(**serializer.validated_data)) is not None:
                 return HttpResponse(status=status.HTTP_201_CREATED)
             else:
-                alert.delete()
                 return HttpResponse("Neighboring vehicles with similar values found. Alert not created.",
                                     status=status.HTTP_200_OK)
         return HttpResponse(status=status.HTTP_400_BAD_REQUEST)
 
 
+class ReportAPI(APIView):
+    """API endpoint receiving a full frame of a vehicle in a single round trip."""
+
+    def post(self, request):
+        """Handle POST requests.
+
+        The body is a vehicle state plus the alert flags `s`, `t` and `u`. The vehicle is created
+        or updated and, if a flag is set, the alert is evaluated. A report repeated within
+        REPORT_REPLAY_WINDOW seconds with the same values returns the alert already created,
+        so the request can be retried safely.
+
+        Args:
+            request: The request object.
+
+        Returns:
+            JsonResponse: `alert` is "none", "created", "suppressed" or "replayed", and `receivers`
+            lists the IDs of the vehicles to warn. Status 201 if an alert was created, 200 otherwise,
+            400 if the report is invalid or not a JSON object.
+        """
+        if not isinstance(request.data, dict):
+            return HttpResponse(status=status.HTTP_400_BAD_REQUEST)
+        vehicle_serializer = VehicleBatchSerializer(data=request.data)
+        alert_serializer = ReportAlertSerializer(data=request.data)
+        if not vehicle_serializer.is_valid():
+            return HttpResponse(status=status.HTTP_400_BAD_REQUEST)
+
+        state = dict(vehicle_serializer.validated_data)
+        vehicle_id = state.pop('id')
+        with transaction.atomic():
+            Vehicle.objects.update_or_create(id=vehicle_id, defaults={**state, 'last_seen': timezone.now()})
+            if not alert_serializer.is_valid():
+                transaction.set_rollback(True)
+                return HttpResponse(status=status.HTTP_400_BAD_REQUEST)
+            flags = {flag: alert_serializer.validated_data.get(flag, False) for flag in ('s', 't', 'u')}
+            if not any(flags.values()):
+                return JsonResponse({"alert": "none", "receivers": []}, status=status.HTTP_200_OK)
+
+            since = timezone.now() - timedelta(seconds=settings.REPORT_REPLAY_WINDOW)
+            previous = Alert.objects.filter(sender_id=vehicle_id, date__gte=since, **state, **flags).first()
+            if previous is not None:
+                receivers = list(previous.receivers.values_list('id', flat=True))
+                return JsonResponse({"alert": "replayed", "receivers": receivers}, status=status.HTTP_200_OK)
+
+            receivers = evaluate_alert(Alert(**alert_serializer.validated_data))
+        if receivers is None:
+            return JsonResponse({"alert": "suppressed", "receivers": []}, status=status.HTTP_200_OK)
+        return JsonResponse({"alert": "created", "receivers": receivers}, status=status.HTTP_201_CREATED)
+
+
 class UserAPI(APIView):
     def get(self, request, vehicle_id):
         """Handle GET requests.
@@ -155,24 +268,67 @@ class UserAPI(APIView):
             return JsonResponse({"error": "No user found for the given vehicle."}, status=status.HTTP_404_NOT_FOUND)
 
 
+def parse_positive(value, cast, default, maximum):
+    """Parse a positive query parameter no greater than `maximum`, or raise ValueError."""
+    if value is None or value == '':
+        return default
+    number = cast(value)
+    if not 0 < number <= maximum:
+        raise ValueError(value)
+    return number
+
+
 class NeighboringVehiclesAPI(APIView):
     def get(self, request, vehicle_id):
         """
-        Retrieve the IDs of neighboring vehicles given a vehicle ID.
+        Retrieve the neighboring vehicles of a vehicle and their distances, nearest first.
+
+        Accepts `?radius=` for the radius in kilometers (ALERT_RADIUS by default), and `?k=` for
+        the k nearest vehicles only: that search widens from a small radius and stops as soon as
+        k vehicles are found, up to `?max=` kilometers away (NEIGHBOR_MAX_DISTANCE by default),
+        or up to the radius if one is given.
 
         Args:
             request: The request object.
             vehicle_id (int): The ID of the vehicle.
 
         Returns:
-            JsonResponse: JSON response containing the IDs of neighboring vehicles.
+            JsonResponse: JSON response containing the IDs of the neighboring vehicles and
+                their distances in kilometers.
         """
         try:
-            vehicle = Vehicle.objects.get(pk=vehicle_id)
-        except Vehicle.DoesNotExist:
+            radius = parse_positive(request.GET.get('radius'), float, None, spatial_index.MAX_DISTANCE)
+            k = parse_positive(request.GET.get('k'), int, None, settings.NEIGHBOR_MAX_K)
+            max_radius = parse_positive(request.GET.get('max'), float, settings.NEIGHBOR_MAX_DISTANCE,
+                                        spatial_index.MAX_DISTANCE)
+        except ValueError:
+            return JsonResponse({"error": "radius, k and max must be positive numbers."}, status=400)
+
+        position = spatial_index.vehicle_position(vehicle_id)
+        if position is None:
             return JsonResponse({"error": "Vehicle does not exist."}, status=404)
 
-        vehicles_in_range = vehicle.get_vehicles_in_range(radius=5)
-        neighboring_vehicle_ids = [v.id for v in vehicles_in_range]
+        if k is not None:
+            neighbors = spatial_index.nearest(*position, k, exclude=vehicle_id,
+                                              max_radius=max_radius if radius is None else radius)
+        else:
+            neighbors = neighbor_cache.neighbors(vehicle_id, *position, radius=radius or settings.ALERT_RADIUS)
+
+        return JsonResponse({
+            "neighboring_vehicle_ids": [neighbor_id for neighbor_id, neighbor_distance in neighbors],
+            "distances": [round(neighbor_distance, 4) for neighbor_id, neighbor_distance in neighbors],
+        }, status=200)
+
+
+class NeighborCacheStatsAPI(APIView):
+    def get(self, request):
+        """
+        Retrieve the hit, miss and invalidation counters of the neighbor cache.
 
-        return JsonResponse({"neighboring_vehicle_ids": neighboring_vehicle_ids}, status=200)
+        Args:
+            request: The request object.
+
+        Returns:
+            JsonResponse: JSON response containing the counters and the hit rate.
+        """
+        return JsonResponse(neighbor_cache.stats(), status=200)
@@ -115,3 +115,62 @@ AUTH_USER_MODEL = 'REST.User'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# AutoGuardian
+
+# Radius in kilometres within which vehicles are compared with an alert and receive it
+ALERT_RADIUS = 5
+
+# Defaults and limits of the neighboring-vehicles endpoint: farthest distance in kilometres of a
+# k-nearest search (?k=&max=) and largest k accepted
+NEIGHBOR_MAX_DISTANCE = 50
+NEIGHBOR_MAX_K = 1000
+
+# Answer neighbor searches from an in-memory index of the vehicle positions (REST/spatial_index.py)
+# instead of the database. Each process catches up, in the background and at most every
+# SPATIAL_INDEX_SYNC_INTERVAL seconds, with the positions written and the vehicles deleted since.
+SPATIAL_INDEX = True
+SPATIAL_INDEX_SYNC_INTERVAL = 1.0
+
+# Seconds after its last report during which a vehicle is part of the active fleet: only active
+# vehicles are alert neighbors and receivers. None or 0 keeps every vehicle active.
+VEHICLE_TTL = 300
+
+# Cache of the neighbor sets of the neighboring-vehicles endpoint (REST/neighbor_cache.py), by
+# alias in CACHES; None disables it. A set is kept until the vehicle, or a vehicle around it,
+# moves more than NEIGHBOR_CACHE_EPSILON kilometres, or for NEIGHBOR_CACHE_TIMEOUT seconds.
+# The cache must be shared by every process writing vehicles (the web workers and
+# consume_telemetry), or their moves would not invalidate the sets of the others: the file
+# backend shares it on one host, use e.g. Redis across hosts.
+NEIGHBOR_CACHE = 'neighbors'
+NEIGHBOR_CACHE_EPSILON = 0.05
+NEIGHBOR_CACHE_TIMEOUT = 30
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'neighbors': {
+        'BACKEND': 'REST.cache.SharedFileCache',
+        'LOCATION': os.path.join(BASE_DIR, 'neighbor_cache'),
+        'OPTIONS': {'MAX_ENTRIES': 300000},
+    },
+}
+
+# Seconds during which a repeated report of an identical alert returns the alert already
+# created instead of a new one, so that the Bridge can safely retry a report
+REPORT_REPLAY_WINDOW = 60
+
+# MQTT broker used by the consume_telemetry command
+MQTT_SERVER = 'localhost'
+MQTT_PORT = 1883
+
+# Prefix of the topics on which the Bridges publish telemetry, one per vehicle: <prefix>/<vehicle ID>
+TELEMETRY_TOPIC = 'telemetry'
+
+# Publish every created alert to its receivers on <ALERT_TOPIC>/<vehicle ID>, right after commit.
+# Must match [MQTT] Topic and SERVER_FANOUT of the Bridges: nothing checks it, and with
+# ALERT_FANOUT = False and SERVER_FANOUT = yes no alert is ever published, while with
+# ALERT_FANOUT = True and SERVER_FANOUT = no every alert is published twice.
+ALERT_FANOUT = False
+ALERT_TOPIC = 'alerts'
@@ -0,0 +1,68 @@
+# distance_benchmark.py
+"""
+Benchmark of the neighbor distance computation at 1k/10k/100k vehicles.
+
+Vehicles are spread uniformly over a square of `--area` km around Modena. For every fleet
+size the benchmark times one neighbor search at the alert radius: the legacy loop calling
+geopy's geodesic on every vehicle, and REST.distance.within on the same (key, latitude,
+longitude) rows, as returned by values_list. It also checks that both select the same
+vehicles. The geodesic loop is timed on at most `--geodesic-rows` rows and scaled.
+
+Usage (from the WebServer directory):
+    python -m benchmarks.distance_benchmark [--sizes 1000 10000 100000] [--radius 5] [--area 50]
+"""
+
+import argparse
+import random
+import time
+
+import geopy.distance
+
+from REST import distance
+
+KM_PER_DEGREE = 111.32
+
+
+def fleet(size, area, rng):
+    return [(i, 44.6 + rng.uniform(0, area) / KM_PER_DEGREE, 10.9 + rng.uniform(0, area) / (KM_PER_DEGREE * 0.71))
+            for i in range(size)]
+
+
+def legacy(rows, latitude, longitude, radius):
+    return [key for key, row_latitude, row_longitude in rows
+            if geopy.distance.geodesic((latitude, longitude), (row_latitude, row_longitude)).kilometers <= radius]
+
+
+def timed(function, *args, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function(*args)
+    return (time.perf_counter() - started) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--radius", type=float, default=5)
+    parser.add_argument("--area", type=float, default=50, help="side in km of the square the fleet is in")
+    parser.add_argument("--geodesic-rows", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"backend: {'numpy' if distance.np is not None else 'python'}, radius {args.radius} km")
+    rng = random.Random(args.seed)
+    for size in args.sizes:
+        rows = fleet(size, args.area, rng)
+        key, latitude, longitude = rows[0]
+        sample = rows[:args.geodesic_rows]
+        legacy_time, legacy_keys = timed(legacy, sample, latitude, longitude, args.radius)
+        legacy_time *= size / len(sample)
+        fast_time, fast_rows = timed(distance.within, rows, latitude, longitude, args.radius, repeat=5)
+        if len(sample) == size:
+            assert sorted(legacy_keys) == sorted(key for key, row_distance in fast_rows), "results differ"
+        print(f"{size:>7} vehicles  geodesic={legacy_time * 1000:>9.1f} ms  vectorized={fast_time * 1000:>7.2f} ms"
+              f"  speedup={legacy_time / fast_time:>6.0f}x  neighbors={len(fast_rows)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# spatial_index_benchmark.py
+"""
+Benchmark of the in-memory spatial index (REST.spatial_index.SpatialIndex).
+
+The index is loaded with `--vehicles` positions spread uniformly over a square of `--area`
+km, then answers `--queries` radius searches at `--radius` km and k-nearest searches around
+random vehicles. The benchmark reports the load time, the mean and p99 latency of both
+searches, the mean number of neighbors, and the cost of moving a vehicle.
+
+Usage (from the WebServer directory):
+    python -m benchmarks.spatial_index_benchmark [--vehicles 100000] [--area 300] [--radius 5] [--k 10]
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from REST.spatial_index import SpatialIndex
+
+KM_PER_DEGREE = 111.32
+
+
+def timed_queries(function, centres):
+    latencies = []
+    sizes = 0
+    for centre in centres:
+        started = time.perf_counter()
+        result = function(*centre)
+        latencies.append(time.perf_counter() - started)
+        sizes += len(result)
+    latencies.sort()
+    return (sum(latencies) / len(latencies) * 1e6, latencies[int(len(latencies) * 0.99)] * 1e6,
+            sizes / len(centres))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vehicles", type=int, default=100000)
+    parser.add_argument("--area", type=float, default=300, help="side in km of the square the fleet is in")
+    parser.add_argument("--radius", type=float, default=5)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc)
+    rows = [(i, 44.6 + rng.uniform(0, args.area) / KM_PER_DEGREE,
+             10.9 + rng.uniform(0, args.area) / (KM_PER_DEGREE * 0.71), now) for i in range(args.vehicles)]
+    # Queries restricted to the active fleet, as the views make them
+    since = now - timedelta(seconds=300)
+    index = SpatialIndex()
+    started = time.perf_counter()
+    index.load(rows, now)
+    print(f"{args.vehicles} vehicles over {args.area:.0f}x{args.area:.0f} km, loaded in "
+          f"{(time.perf_counter() - started) * 1000:.0f} ms")
+
+    centres = [rows[rng.randrange(len(rows))] for _ in range(args.queries)]
+    mean, p99, size = timed_queries(lambda key, latitude, longitude, _:
+                                    index.within(latitude, longitude, args.radius, key, since), centres)
+    print(f"radius {args.radius} km   mean={mean:7.1f} us  p99={p99:7.1f} us  neighbors={size:.1f}")
+    mean, p99, size = timed_queries(lambda key, latitude, longitude, _:
+                                    index.nearest(latitude, longitude, args.k, key, since=since), centres)
+    print(f"{args.k}-nearest      mean={mean:7.1f} us  p99={p99:7.1f} us  found={size:.1f}")
+
+    started = time.perf_counter()
+    for key, latitude, longitude, seen in centres:
+        index.update(key, latitude + 0.001, longitude + 0.001, seen)
+    print(f"update        mean={(time.perf_counter() - started) / len(centres) * 1e6:7.1f} us")
+
+
+if __name__ == '__main__':
+    main()